@@ -0,0 +1,64 @@
+"""Tree.act_many against one Tree.act call per game
+
+Plays a batch of concurrent c4 games to the end in a single tree, one
+move per game per step, either calling act for each game in turn or
+act_many for all of them at once.
+Run with ``python -m benchmarks.act_many``.
+"""
+
+import argparse
+import random
+import time
+import numpy as np
+import c4.bitboard
+from mcts.tree import Tree
+
+
+def play_games(batched: bool, games: int, iterations: int) -> tuple[float, int]:
+    """Seconds to play every game out, and the number of moves made"""
+    tree = Tree(
+        None,
+        c4.bitboard.BitboardState,
+        c4.bitboard.BitboardGame,
+        c4.bitboard.BitboardGame().state,
+        iterations,
+    )
+    # Pay for JIT compilation up front
+    tree.act(c4.bitboard.BitboardGame().state)
+    tree.new_root(c4.bitboard.BitboardGame().state)
+    playing = [c4.bitboard.BitboardGame() for _ in range(games)]
+    # Random openings, so the games spread out over the tree
+    for game in playing:
+        for _ in range(random.randrange(4)):
+            game.act(random.choice(game.state.permitted_actions))
+    moves = 0
+    started = time.perf_counter()
+    while playing:
+        if batched:
+            actions = tree.act_many([game.state for game in playing])
+        else:
+            actions = [tree.act(game.state) for game in playing]
+        for game, action in zip(playing, actions):
+            game.act(action)
+        moves += len(playing)
+        playing = [game for game in playing if game.state.winner == -1]
+    return time.perf_counter() - started, moves
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-g", "--games", type=int, default=64)
+    parser.add_argument("-i", "--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    print("mode        seconds  moves  moves/s")
+    for batched in (False, True):
+        random.seed(0)
+        np.random.seed(0)
+        elapsed, moves = play_games(batched, args.games, args.iterations)
+        mode = "act_many" if batched else "sequential"
+        print(f"{mode:10s}  {elapsed:7.2f}  {moves:5d}  {moves / elapsed:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Micro-benchmark: back propagation cost against branching factor
+
+Back propagation used to look up each node's slot by scanning its parent's
+children, so it grew with branching factor. Run with
+``python -m benchmarks.backprop`` - times should be flat across the rows.
+"""
+
+import argparse
+import random
+import timeit
+import c4.game
+from mcts.node import Node, NodeStore
+
+
+def build_path(branching: int, depth: int) -> tuple[NodeStore, list[int]]:
+    store = NodeStore(c4.game.Game, c4.game.Game().state)
+    path = [store.root]
+    for _ in range(depth):
+        store.add_children(path[-1], list(range(branching)), False)
+        path.append(random.choice(store.children(path[-1])))
+    # Only player ids are needed for back propagation; skip building states
+    store.player_id[path] = [ix % 2 for ix in range(len(path))]
+    return store, path
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--depth", type=int, default=40)
+    parser.add_argument("-n", "--number", type=int, default=10000)
+    parser.add_argument(
+        "-b", "--branching", type=int, nargs="+", default=[2, 8, 16, 33]
+    )
+    args = parser.parse_args()
+
+    random.seed(0)
+    print(f"depth {args.depth}, {args.number} repetitions")
+    print("branching  back_propogate (us)  action_index (us)")
+    for branching in args.branching:
+        store, path = build_path(branching, args.depth)
+        reward = [1.0, -1.0]
+        backprop = timeit.timeit(
+            lambda: store.back_propogate(path, reward), number=args.number
+        )
+        nodes = [Node(store, index) for index in path[1:]]
+        action_index = timeit.timeit(
+            lambda: [node.action_index for node in nodes], number=args.number
+        )
+        print(
+            f"{branching:9d}  {backprop / args.number * 1e6:19.2f}"
+            f"  {action_index / args.number * 1e6:17.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Sampled chance nodes against a child per outcome, on NT
+
+Searches the same NT positions with every draw expanded up front, with
+draws sampled as search reaches them, and with sampled draws capped per
+node, reporting iterations per second and the nodes each search made.
+Run with ``python -m benchmarks.chance``.
+"""
+
+import argparse
+import random
+import time
+import numpy as np
+import nt.game
+from mcts.tree import Tree
+
+
+def positions(count: int) -> list[nt.game.NtState]:
+    """States a player acts in, from a random game"""
+    game = nt.game.NtGame()
+    states = []
+    while game.state.winner == -1 and len(states) < count:
+        game.non_player_act()
+        states.append(game.state.copy())
+        game.act(random.choice(game.state.permitted_actions))
+    return states
+
+
+def search(states, iterations: int, **kwargs) -> dict:
+    elapsed = 0.0
+    nodes = 0
+    for state in states:
+        tree = Tree(
+            None,
+            nt.game.NtState,
+            nt.game.NtGame,
+            state,
+            iterations,
+            reward_model=nt.game.NtGame.reward_model,
+            **kwargs,
+        )
+        started = time.perf_counter()
+        tree.act(state)
+        elapsed += time.perf_counter() - started
+        nodes += tree.node_count()
+    return {
+        "iterations/s": iterations * len(states) / elapsed,
+        "nodes": nodes / len(states),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--iterations", type=int, default=5000)
+    parser.add_argument("-n", "--positions", type=int, default=10)
+    parser.add_argument("-m", "--max-outcomes", type=int, default=4)
+    args = parser.parse_args()
+
+    random.seed(0)
+    np.random.seed(0)
+    states = positions(args.positions)
+    # Pay for JIT compilation up front
+    search(states[:1], 100)
+    modes = {
+        "every outcome": {},
+        "sampled": {"sample_chance": True},
+        f"max {args.max_outcomes} outcomes": {
+            "sample_chance": True,
+            "max_outcomes": args.max_outcomes,
+        },
+    }
+    print(f"{'mode':18s}  {'iterations/s':>12s}  {'nodes':>8s}")
+    for name, kwargs in modes.items():
+        result = search(states, args.iterations, **kwargs)
+        print(f"{name:18s}  {result['iterations/s']:12.0f}  {result['nodes']:8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Early stopping: iterations saved, and how often the chosen move changes
+
+Searches positions from random c4 openings with the full iteration budget
+and again with each early stopping rule, from the same seed. Each rule
+picks its move by the measure it protects, so the full search's move is
+taken by that same measure.
+Run with ``python -m benchmarks.early_stop``.
+"""
+
+import argparse
+import random
+import c4.bitboard
+from mcts.tree import EARLY_STOP_RULES, Tree
+
+
+def make_tree(state, iterations: int, early_stop) -> Tree:
+    return Tree(
+        None,
+        c4.bitboard.BitboardState,
+        c4.bitboard.BitboardGame,
+        state,
+        iterations,
+        early_stop=early_stop,
+    )
+
+
+def search(state, iterations: int, early_stop, seed: int) -> tuple[int, int]:
+    random.seed(seed)
+    tree = make_tree(state, iterations, early_stop)
+    action = tree.act(state)
+    return action, tree.last_iterations
+
+
+def full_search(state, iterations: int, seed: int) -> dict:
+    """Full budget search, then the move each rule would pick from it"""
+    random.seed(seed)
+    tree = make_tree(state, iterations, None)
+    tree.act(state)
+    moves = {}
+    for rule in EARLY_STOP_RULES:
+        tree.early_stop = rule
+        moves[rule] = state.permitted_actions[tree.settled_child(tree.root)]
+    return moves, tree.last_iterations
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--iterations", type=int, default=2000)
+    parser.add_argument("-p", "--positions", type=int, default=30)
+    parser.add_argument("-o", "--opening", type=int, default=8, help="Max random moves")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    positions = []
+    while len(positions) < args.positions:
+        game = c4.bitboard.BitboardGame()
+        for _ in range(rng.randint(0, args.opening)):
+            if game.state.winner != -1:
+                break
+            game.act(rng.choice(game.state.permitted_actions))
+        if game.state.winner == -1:
+            positions.append(game.state)
+
+    full = [
+        full_search(state, args.iterations, seed) for seed, state in enumerate(positions)
+    ]
+    print("rule        iterations used  same move")
+    for rule in EARLY_STOP_RULES:
+        stopped = [
+            search(state, args.iterations, rule, seed)
+            for seed, state in enumerate(positions)
+        ]
+        used = sum(result[1] for result in stopped) / sum(result[1] for result in full)
+        same = sum(a[0][rule] == b[0] for a, b in zip(full, stopped)) / len(positions)
+        print(f"{rule:10s}  {used:15.1%}  {same:9.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""MultiTree act latency over shared-memory channels against pickled queues
+
+Plays whole nt games (whose states carry numpy arrays and a growing
+action history) with a single iteration per worker, so act latency is
+almost all communication overhead.
+Run with ``python -m benchmarks.ipc``.
+"""
+
+import argparse
+import random
+import time
+import numpy as np
+import nt.game
+from mcts.multi_tree import IPC_MODES, MultiTree
+
+
+def act_latencies(ipc: str, jobs: int, games: int) -> list[float]:
+    multi_tree = MultiTree(
+        None,
+        nt.game.NtState,
+        nt.game.NtGame,
+        nt.game.NtGame().state,
+        1,
+        reward_model=nt.game.NtGame.reward_model,
+        jobs=jobs,
+        ipc=ipc,
+    )
+    latencies = []
+    try:
+        for _ in range(games):
+            game = nt.game.NtGame()
+            while game.state.winner == -1:
+                game.non_player_act()
+                started = time.perf_counter()
+                action = multi_tree.act(game.state)
+                latencies.append(time.perf_counter() - started)
+                game.act(action)
+    finally:
+        multi_tree.close()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-j", "--jobs", type=int, nargs="+", default=[8, 16])
+    parser.add_argument("-g", "--games", type=int, default=3)
+    args = parser.parse_args()
+
+    print("jobs  ipc     mean ms  p90 ms")
+    for jobs in args.jobs:
+        for ipc in IPC_MODES:
+            random.seed(0)
+            np.random.seed(0)
+            latencies = np.array(act_latencies(ipc, jobs, args.games)) * 1000
+            print(
+                f"{jobs:4d}  {ipc:6s}  {latencies.mean():7.2f}  "
+                f"{np.percentile(latencies, 90):6.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Compiled NT rollouts against the Python playout loop
+
+Times single rollouts, batched rollouts of many states, and whole
+searches of the NT opening with and without the compiled playout.
+Run with ``python -m benchmarks.nt_rollout``.
+"""
+
+import argparse
+import random
+import time
+import numpy as np
+import nt.game
+from mcts.tree import Tree
+
+
+class PythonPlayoutGame(nt.game.NtGame):
+    # Leaves Tree to play out in Python, as it did before the kernel
+    random_play_out = None
+
+
+def opening() -> nt.game.NtState:
+    game = nt.game.NtGame()
+    game.non_player_act()
+    return game.state
+
+
+def make_tree(game_class, iterations: int) -> Tree:
+    return Tree(
+        None,
+        nt.game.NtState,
+        game_class,
+        game_class().state,
+        iterations,
+        reward_model=nt.game.NtGame.reward_model,
+    )
+
+
+def rollouts_per_second(play, count: int) -> float:
+    started = time.perf_counter()
+    play()
+    return count / (time.perf_counter() - started)
+
+
+def iterations_per_second(game_class, iterations: int) -> float:
+    tree = make_tree(game_class, iterations)
+    # Pay for JIT compilation up front
+    tree.act(opening())
+    tree.new_root(opening())
+    started = time.perf_counter()
+    tree.act(opening())
+    return iterations / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-p", "--playouts", type=int, default=500)
+    parser.add_argument("-b", "--batch", type=int, default=64)
+    parser.add_argument("-i", "--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    np.random.seed(0)
+    state = opening()
+    tree = make_tree(PythonPlayoutGame, 1)
+    nt.game.NtGame.random_play_out(state)
+    python = rollouts_per_second(
+        lambda: [tree.random_play_out(state.copy()) for _ in range(args.playouts)],
+        args.playouts,
+    )
+    compiled = rollouts_per_second(
+        lambda: [nt.game.NtGame.random_play_out(state) for _ in range(args.playouts)],
+        args.playouts,
+    )
+    states = [opening() for _ in range(args.batch)]
+    batched = rollouts_per_second(
+        lambda: nt.game.NtGame.random_play_out_batch(states, args.playouts),
+        args.batch * args.playouts,
+    )
+
+    print(f"python rollouts/s          {python:10.0f}")
+    print(f"compiled rollouts/s        {compiled:10.0f}")
+    print(f"batched rollouts/s         {batched:10.0f}")
+    for name, game_class in (
+        ("python", PythonPlayoutGame),
+        ("compiled", nt.game.NtGame),
+    ):
+        rate = iterations_per_second(game_class, args.iterations)
+        print(f"{name:8s} tree iterations/s  {rate:10.0f}")
+
+
+if __name__ == "__main__":
+    main()
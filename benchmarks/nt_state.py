@@ -0,0 +1,86 @@
+"""NtState memory per stored state, copy cost, and Python rollout speed
+
+Memory is measured with tracemalloc over a tree's worth of states, each
+one move on from the last, as NodeStore keeps them.
+Run with ``python -m benchmarks.nt_state``.
+"""
+
+import argparse
+import random
+import time
+import timeit
+import tracemalloc
+import numpy as np
+import nt.game
+from mcts.tree import Tree
+
+
+def mid_game_state() -> nt.game.NtState:
+    game = nt.game.NtGame()
+    for _ in range(40):
+        _, state = game.non_player_act()
+        game.act(random.choice(state.permitted_actions))
+    game.non_player_act()
+    return game.state
+
+
+def bytes_per_state(count: int) -> float:
+    state = mid_game_state()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    states = []
+    for _ in range(count):
+        game = nt.game.NtGame.from_state(state)
+        states.append(game.act(nt.game.ACTION_TAKE))
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / len(states)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--number", type=int, default=20000)
+    parser.add_argument("-p", "--playouts", type=int, default=300)
+    args = parser.parse_args()
+
+    random.seed(0)
+    np.random.seed(0)
+    state = mid_game_state()
+    copy = timeit.timeit(state.copy, number=args.number) / args.number
+    from_state = (
+        timeit.timeit(lambda: nt.game.NtGame.from_state(state), number=args.number)
+        / args.number
+    )
+    # About to draw, so every card left in the deck is an action
+    drawing = nt.game.NtGame.from_state(state).act(nt.game.ACTION_TAKE)
+    permitted = (
+        timeit.timeit(lambda: drawing.permitted_actions, number=args.number)
+        / args.number
+    )
+    tree = Tree(
+        None,
+        nt.game.NtState,
+        nt.game.NtGame,
+        nt.game.NtGame().state,
+        1,
+        reward_model=nt.game.NtGame.reward_model,
+    )
+    opening = nt.game.NtGame()
+    opening.non_player_act()
+    # Best of a few runs, as rollouts are long enough to catch noise
+    rollouts = 0.0
+    for _ in range(5):
+        started = time.perf_counter()
+        for _ in range(args.playouts):
+            tree.random_play_out(opening.state.copy())
+        rollouts = max(rollouts, args.playouts / (time.perf_counter() - started))
+
+    print(f"bytes per stored state  {bytes_per_state(args.number // 10):9.0f}")
+    print(f"copy (us)               {copy * 1e6:9.2f}")
+    print(f"from_state (us)         {from_state * 1e6:9.2f}")
+    print(f"permitted_actions (us)  {permitted * 1e6:9.2f}")
+    print(f"rollouts/s              {rollouts:9.0f}")
+
+
+if __name__ == "__main__":
+    main()
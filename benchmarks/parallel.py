@@ -0,0 +1,98 @@
+"""Root parallel (MultiTree) against tree parallel (SharedMultiTree) search
+
+For each job count, measures iterations/second from the c4 opening, then
+plays root parallel against tree parallel with iteration budgets scaled so
+both take about the same wall-clock time per move.
+Run with ``python -m benchmarks.parallel``.
+"""
+
+import argparse
+import random
+import time
+import c4.bitboard
+from mcts.multi_tree import MultiTree, SharedMultiTree
+
+SEARCHERS = {"root": MultiTree, "tree": SharedMultiTree}
+
+
+def make_searcher(mode: str, jobs: int, iterations: int):
+    game = c4.bitboard.BitboardGame()
+    return SEARCHERS[mode](
+        None,
+        c4.bitboard.BitboardState,
+        c4.bitboard.BitboardGame,
+        game.state,
+        iterations,
+        jobs=jobs,
+    )
+
+
+def iterations_per_second(mode: str, jobs: int, iterations: int, moves: int) -> float:
+    searcher = make_searcher(mode, jobs, iterations)
+    try:
+        game = c4.bitboard.BitboardGame()
+        # First move pays for JIT compilation in every worker
+        searcher.act(game.state)
+        start_iterations = searcher.total_iterations
+        start = time.perf_counter()
+        for _ in range(moves):
+            searcher.act(game.state)
+        elapsed = time.perf_counter() - start
+        return (searcher.total_iterations - start_iterations) / elapsed
+    finally:
+        searcher.close()
+
+
+def play_match(searchers: dict, games: int) -> dict:
+    wins = {mode: 0 for mode in searchers}
+    modes = list(searchers)
+    for game_no in range(games):
+        # Alternate who moves first
+        order = modes if game_no % 2 == 0 else modes[::-1]
+        game = c4.bitboard.BitboardGame()
+        for searcher in searchers.values():
+            searcher.new_root(game.state)
+        while game.state.winner == -1:
+            # c4 player ids start at 1
+            mode = order[(game.state.next_player_id + 1) % 2]
+            game.act(searchers[mode].act(game.state))
+        if game.state.winner >= 0:
+            wins[order[(game.state.winner + 1) % 2]] += 1
+    return wins
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-j", "--jobs", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("-i", "--iterations", type=int, default=1000)
+    parser.add_argument("-m", "--moves", type=int, default=5)
+    parser.add_argument("-g", "--games", type=int, default=10)
+    parser.add_argument(
+        "-t", "--move-time", type=float, default=0.5, help="Seconds per move"
+    )
+    args = parser.parse_args()
+
+    random.seed(0)
+    print("jobs  mode  iterations/s  wins")
+    for jobs in args.jobs:
+        speeds = {
+            mode: iterations_per_second(mode, jobs, args.iterations, args.moves)
+            for mode in SEARCHERS
+        }
+        searchers = {
+            mode: make_searcher(
+                mode, jobs, max(1, int(speed * args.move_time / jobs))
+            )
+            for mode, speed in speeds.items()
+        }
+        try:
+            wins = play_match(searchers, args.games)
+        finally:
+            for searcher in searchers.values():
+                searcher.close()
+        for mode in SEARCHERS:
+            print(f"{jobs:4d}  {mode:4s}  {speeds[mode]:12.0f}  {wins[mode]}/{args.games}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Reply latency with and without pondering
+
+Plays c4 against a stand-in human: a separate, weaker tree that takes
+a fixed time over each move. It sleeps out that time, which releases
+the GIL just as waiting on input() does, so pondering gets the same
+time it would against a person.
+Run with ``python -m benchmarks.ponder``.
+"""
+
+import argparse
+import random
+import time
+import numpy as np
+import c4.bitboard
+from mcts.ponder import Ponderer
+from mcts.tree import Tree
+
+
+def reply_latencies(
+    ponder: bool, games: int, iterations: int, think_time: float
+) -> tuple[list[float], int]:
+    """Seconds the tree took for each reply, and the iterations reused"""
+    game = c4.bitboard.BitboardGame()
+    tree = Tree(
+        None, c4.bitboard.BitboardState, c4.bitboard.BitboardGame, game.state, iterations
+    )
+    # Pay for JIT compilation up front
+    tree.act(game.state, iterations=10)
+    human = Tree(
+        None, c4.bitboard.BitboardState, c4.bitboard.BitboardGame, game.state, 1000
+    )
+    ponderer = Ponderer(tree)
+    latencies = []
+    for _ in range(games):
+        game = c4.bitboard.BitboardGame()
+        tree.new_root(game.state)
+        human.new_root(game.state)
+        while game.state.winner == -1:
+            if game.state.next_player_id == 0:
+                if ponder:
+                    ponderer.start(game.state)
+                started = time.perf_counter()
+                action = human.act(game.state)
+                time.sleep(max(think_time - (time.perf_counter() - started), 0))
+                game.act(action)
+            else:
+                started = time.perf_counter()
+                game.act(ponderer.act(game.state))
+                latencies.append(time.perf_counter() - started)
+    ponderer.stop()
+    return latencies, ponderer.total_reused
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-g", "--games", type=int, default=3)
+    parser.add_argument("-i", "--iterations", type=int, default=5000)
+    parser.add_argument(
+        "-t", "--think-time", type=float, default=1.0, help="Seconds per human move"
+    )
+    args = parser.parse_args()
+
+    print("ponder  mean ms  p50 ms  reused iterations")
+    for ponder in (False, True):
+        random.seed(0)
+        np.random.seed(0)
+        latencies, reused = reply_latencies(
+            ponder, args.games, args.iterations, args.think_time
+        )
+        latencies = np.array(latencies) * 1000
+        print(
+            f"{str(ponder):6s}  {latencies.mean():7.1f}  "
+            f"{np.median(latencies):6.1f}  {reused}"
+        )
+
+
+if __name__ == "__main__":
+    main()
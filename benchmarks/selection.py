@@ -0,0 +1,69 @@
+"""Micro-benchmark: child selection cost per iteration against depth
+
+Times one selection descent through a line of fully visited c4 sized
+blocks: picking each child by argsort ranking as selection used to, one
+NodeStore.select_child call per level, or a single select_path call for
+the whole descent. Run with ``python -m benchmarks.selection``.
+"""
+
+import argparse
+import math
+import random
+import timeit
+import numpy as np
+import c4.game
+from mcts.node import NodeStore
+
+BRANCHING = 8
+
+
+def build_line(depth: int) -> tuple[NodeStore, list[int]]:
+    store = NodeStore(c4.game.Game, c4.game.Game().state)
+    store.visits[store.root] = 1000 * depth
+    line = [store.root]
+    for _ in range(depth):
+        store.add_children(line[-1], list(range(BRANCHING)), False)
+        children = np.array(store.children(line[-1]))
+        store.visits[children] = np.random.randint(1, 100, BRANCHING)
+        store.value[children] = np.random.uniform(-1, 1, BRANCHING) * store.visits[
+            children
+        ]
+        line.append(random.choice(children))
+    return store, line[:-1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--depth", type=int, nargs="+", default=[10, 20, 30, 40])
+    parser.add_argument("-n", "--number", type=int, default=2000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    np.random.seed(0)
+    constant = math.sqrt(2)
+    print(f"{args.number} repetitions, branching {BRANCHING}")
+    print("depth  argsort (us)  select_child (us)  select_path (us)")
+    for depth in args.depth:
+        store, line = build_line(depth)
+        # Pay for JIT compilation up front
+        store.select_path(line[0], constant, depth)
+        ranked = timeit.timeit(
+            lambda: [int(store.ranked_children(node, constant)[0]) for node in line],
+            number=args.number,
+        )
+        selected = timeit.timeit(
+            lambda: [store.select_child(node, constant) for node in line],
+            number=args.number,
+        )
+        path = timeit.timeit(
+            lambda: store.select_path(line[0], constant, depth), number=args.number
+        )
+        print(
+            f"{depth:5d}  {ranked / args.number * 1e6:12.1f}"
+            f"  {selected / args.number * 1e6:17.1f}"
+            f"  {path / args.number * 1e6:15.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""MCTS-Solver on c4 endgames: search time and iterations saved
+
+Takes positions a few moves before the end of random c4 games that end
+in a win, and searches each with and without the solver at the same
+iteration budget, reporting time per move, the iterations actually run
+and how many roots the solver proved.
+Run with ``python -m benchmarks.solver``.
+"""
+
+import argparse
+import random
+import time
+import numpy as np
+import c4.bitboard
+from mcts.tree import Tree
+
+
+def endgames(count: int, moves_left: int) -> list[c4.bitboard.BitboardState]:
+    """Positions moves_left moves before a random game is won"""
+    states = []
+    while len(states) < count:
+        game = c4.bitboard.BitboardGame()
+        line = [game.state.copy()]
+        while game.state.winner == -1:
+            game.act(random.choice(game.state.permitted_actions))
+            line.append(game.state.copy())
+        if game.state.winner >= 0 and len(line) > moves_left:
+            states.append(line[-1 - moves_left])
+    return states
+
+
+def search(states, iterations: int, solver: bool) -> dict:
+    elapsed = 0.0
+    searched = 0
+    proven = 0
+    for seed, state in enumerate(states):
+        random.seed(seed)
+        tree = Tree(
+            None,
+            c4.bitboard.BitboardState,
+            c4.bitboard.BitboardGame,
+            state,
+            iterations,
+            solver=solver,
+        )
+        started = time.perf_counter()
+        tree.act(state)
+        elapsed += time.perf_counter() - started
+        searched += tree.last_iterations
+        proven += tree.node_store.is_proven(tree.root)
+    return {
+        "ms/move": 1000 * elapsed / len(states),
+        "iterations": searched / len(states),
+        "proven": proven / len(states),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--iterations", type=int, default=5000)
+    parser.add_argument("-n", "--positions", type=int, default=20)
+    parser.add_argument(
+        "-m", "--moves-left", type=int, nargs="+", default=[2, 4, 6, 8]
+    )
+    args = parser.parse_args()
+
+    random.seed(0)
+    np.random.seed(0)
+    # Compile the playout kernel before anything is timed
+    c4.bitboard.BitboardGame.random_play_out(c4.bitboard.BitboardGame().state)
+    print("moves left  solver  ms/move  iterations  proven")
+    for moves_left in args.moves_left:
+        states = endgames(args.positions, moves_left)
+        for solver in (False, True):
+            result = search(states, args.iterations, solver)
+            print(
+                f"{moves_left:10d}  {str(solver):6s}  {result['ms/move']:7.1f}  "
+                f"{result['iterations']:10.0f}  {result['proven']:6.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""Timings of the MCTS hot paths, for comparing one commit against another
+
+Every case is set up from a fixed seed, then timed as the best of several
+repeats, so runs on the same machine are comparable. Results are written
+as JSON; give a previous run's file to --compare and the run fails if any
+case got slower than the threshold allows.
+
+    python -m benchmarks.suite -o before.json
+    # ... change things ...
+    python -m benchmarks.suite -o after.json --compare before.json
+"""
+
+import argparse
+from collections import deque
+import json
+import platform
+import random
+import subprocess
+import sys
+import timeit
+from typing import Callable, NamedTuple, Optional
+import numba
+import numpy as np
+import c4.game
+import nt.game
+from mcts.node import Node
+from mcts.tree import Tree
+
+SEED = 0
+# Iterations searched before timing the per-iteration steps
+WARM_ITERATIONS = 2000
+
+
+class Case(NamedTuple):
+    # Returns the function to time; runs once per case, after seeding
+    setup: Callable[[], Callable[[], object]]
+    # Calls per repeat
+    number: int
+    description: str
+
+
+def c4_tree(iterations: int = 1000) -> Tree:
+    game = c4.game.Game()
+    return Tree(None, c4.game.GameState, c4.game.Game, game.state, iterations)
+
+
+def searched_c4_tree() -> Tree:
+    tree = c4_tree(WARM_ITERATIONS)
+    tree.act(tree.node_store.state(tree.root))
+    return tree
+
+
+def setup_selection():
+    tree = searched_c4_tree()
+    return lambda: tree.selection(tree.root)
+
+
+def setup_expansion():
+    tree = searched_c4_tree()
+    store = tree.node_store
+    leaves = deque(
+        node
+        for node in range(store.size)
+        if not store.is_expanded(node) and store.child_count[node] == 0
+    )
+
+    def expand():
+        # Children of each leaf expanded are leaves in turn, so there are
+        # always more, whatever the scale and number of repeats
+        leaf = leaves.popleft()
+        tree.expansion(leaf)
+        leaves.extend(store.children(leaf))
+
+    return expand
+
+
+def setup_play_out():
+    tree = searched_c4_tree()
+    path = tree.selection(tree.root)
+    tree.expansion(path[-1])
+    return lambda: tree.play_out(path)
+
+
+def setup_back_propogate():
+    tree = searched_c4_tree()
+    path = tree.selection(tree.root)
+    node = Node(tree.node_store, path[-1])
+    reward = [1.0, -1.0]
+    return lambda: node.back_propogate(path, reward)
+
+
+def random_c4_game() -> list[int]:
+    game = c4.game.Game()
+    actions = []
+    while game.state.winner == -1:
+        actions.append(random.choice(game.state.permitted_actions))
+        game.act(actions[-1])
+    return actions
+
+
+def setup_c4_act():
+    actions = random_c4_game()
+
+    def play():
+        game = c4.game.Game()
+        for action in actions:
+            game.act(action)
+
+    return play
+
+
+def setup_check_for_win():
+    game = c4.game.Game()
+    # Stop short of the end, so every line has to be checked
+    for action in random_c4_game()[:-1]:
+        game.act(action)
+    board = game.state.board
+    return lambda: c4.game.check_for_win(board)
+
+
+def random_nt_game() -> list[tuple[bool, object]]:
+    """Each act of a random game, and whether it was a non-player act"""
+    game = nt.game.NtGame()
+    acts = []
+    while game.state.winner == -1:
+        drawn, state = game.non_player_act()
+        if drawn:
+            acts.append((True, drawn))
+        action = random.choice(state.permitted_actions)
+        game.act(action)
+        acts.append((False, action))
+    return acts
+
+
+def setup_nt_act():
+    acts = random_nt_game()
+
+    def play():
+        game = nt.game.NtGame()
+        for non_player, action in acts:
+            if non_player:
+                game.apply_non_player_acts(action)
+            else:
+                game.act(action)
+
+    return play
+
+
+def setup_nt_copy():
+    game = nt.game.NtGame()
+    acts = random_nt_game()
+    for non_player, action in acts[: len(acts) // 2]:
+        if non_player:
+            game.apply_non_player_acts(action)
+        else:
+            game.act(action)
+    state = game.state
+    return state.copy
+
+
+def setup_tree_act():
+    tree = c4_tree(1000)
+    state = c4.game.Game().state
+
+    def act():
+        # The same search every call
+        random.seed(SEED)
+        tree.new_root(state)
+        tree.act(state)
+
+    return act
+
+
+CASES = {
+    "tree.selection": Case(setup_selection, 2000, "One selection from the root"),
+    "tree.expansion": Case(setup_expansion, 500, "Expanding one c4 leaf"),
+    "tree.play_out": Case(setup_play_out, 500, "One c4 playout and backup"),
+    "node.back_propogate": Case(
+        setup_back_propogate, 5000, "Backing up one selected path"
+    ),
+    "c4.game.act": Case(setup_c4_act, 200, "Replaying a random c4 game"),
+    "c4.check_for_win": Case(setup_check_for_win, 5000, "A nearly full c4 board"),
+    "nt.game.act": Case(setup_nt_act, 100, "Replaying a random nt game"),
+    "nt.state.copy": Case(setup_nt_copy, 5000, "Copying a mid game nt state"),
+    "tree.act": Case(setup_tree_act, 3, "A 1000 iteration c4 opening move"),
+}
+
+
+def run_case(case: Case, repeat: int, scale: float) -> dict:
+    random.seed(SEED)
+    np.random.seed(SEED)
+    function = case.setup()
+    # Untimed call pays for JIT compilation and lazily built state
+    function()
+    number = max(1, int(case.number * scale))
+    times = timeit.repeat(function, number=number, repeat=repeat)
+    return {
+        "seconds": min(times) / number,
+        "median_seconds": float(np.median(times)) / number,
+        "number": number,
+        "repeat": repeat,
+        "description": case.description,
+    }
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "numba": numba.__version__,
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+    }
+
+
+def regressions(results: dict, baseline: dict, threshold: float) -> dict[str, float]:
+    """Cases more than threshold slower than in baseline, with their ratios"""
+    slower = {}
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        ratio = result["seconds"] / baseline[name]["seconds"]
+        if ratio > 1 + threshold:
+            slower[name] = ratio
+    return slower
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-o", "--output", help="Write results to this JSON file")
+    parser.add_argument(
+        "--compare", help="JSON file from an earlier run to check for slowdowns"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Fail if any case is this fraction slower than --compare (default: 0.25)",
+    )
+    parser.add_argument(
+        "-k", "--cases", nargs="+", choices=CASES, help="Only run these cases"
+    )
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="Multiply every case's call count, to trade precision for time",
+    )
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    print(f"{'case':20s}  {'us/call':>10s}  {'baseline':>10s}  ratio")
+    for name in args.cases or CASES:
+        result = run_case(CASES[name], args.repeat, args.scale)
+        results[name] = result
+        line = f"{name:20s}  {result['seconds'] * 1e6:10.2f}"
+        if baseline and name in baseline:
+            before = baseline[name]["seconds"]
+            line += f"  {before * 1e6:10.2f}  {result['seconds'] / before:5.2f}"
+        print(line)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(
+                {"environment": environment(), "results": results}, f, indent=2
+            )
+
+    if baseline:
+        slower = regressions(results, baseline, args.threshold)
+        for name, ratio in slower.items():
+            print(f"{name} is {ratio:.2f}x its baseline", file=sys.stderr)
+        if slower:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
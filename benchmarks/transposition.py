@@ -0,0 +1,87 @@
+"""Transposition table: nodes saved, speed, and playing strength
+
+Plays c4 self-play games with and without a transposition table from the
+same seeds, comparing node counts and iterations/second, then plays the
+two against each other at the same iteration budget.
+Run with ``python -m benchmarks.transposition``.
+"""
+
+import argparse
+import random
+import time
+import c4.bitboard
+from mcts.tree import Tree
+
+
+def make_tree(iterations: int, transposition_size: int) -> Tree:
+    game = c4.bitboard.BitboardGame()
+    return Tree(
+        None,
+        c4.bitboard.BitboardState,
+        c4.bitboard.BitboardGame,
+        game.state,
+        iterations,
+        transposition_size=transposition_size,
+    )
+
+
+def self_play(iterations: int, transposition_size: int, games: int) -> tuple:
+    """Mean nodes per game, iterations/second and table hits over the games"""
+    nodes = 0
+    hits = 0
+    elapsed = 0.0
+    searched = 0
+    for seed in range(games):
+        random.seed(seed)
+        tree = make_tree(iterations, transposition_size)
+        game = c4.bitboard.BitboardGame()
+        start = time.perf_counter()
+        while game.state.winner == -1:
+            game.act(tree.act(game.state))
+        elapsed += time.perf_counter() - start
+        searched += tree.total_iterations
+        nodes += tree.node_count()
+        if tree.transpositions is not None:
+            hits += tree.transpositions.hits
+    return nodes / games, searched / elapsed, hits / games
+
+
+def play_match(iterations: int, transposition_size: int, games: int) -> dict:
+    wins = {"table": 0, "plain": 0}
+    for game_no in range(games):
+        random.seed(1000 + game_no)
+        trees = {
+            "table": make_tree(iterations, transposition_size),
+            "plain": make_tree(iterations, 0),
+        }
+        # Alternate who moves first; c4 player ids start at 1
+        order = ["table", "plain"] if game_no % 2 == 0 else ["plain", "table"]
+        game = c4.bitboard.BitboardGame()
+        while game.state.winner == -1:
+            name = order[(game.state.next_player_id + 1) % 2]
+            game.act(trees[name].act(game.state))
+        if game.state.winner >= 0:
+            wins[order[(game.state.winner + 1) % 2]] += 1
+    return wins
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--iterations", type=int, default=1000)
+    parser.add_argument("-g", "--games", type=int, default=4)
+    parser.add_argument("-m", "--match-games", type=int, default=10)
+    parser.add_argument("-s", "--size", type=int, default=1 << 16, help="Table entries")
+    args = parser.parse_args()
+
+    # Compile the playout kernel before anything is timed
+    c4.bitboard.BitboardGame.random_play_out(c4.bitboard.BitboardGame().state)
+    print("table    nodes/game  iterations/s  hits/game")
+    for size in (0, args.size):
+        nodes, speed, hits = self_play(args.iterations, size, args.games)
+        print(f"{size:8d}  {nodes:10.0f}  {speed:12.0f}  {hits:9.0f}")
+    wins = play_match(args.iterations, args.size, args.match_games)
+    print(f"Match over {args.match_games} games: {wins}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""Connect 4 on a pair of 64 bit bitboards
+
+Drop-in alternative to c4.game. Bit ``8 * column + row`` is a cell, with
+row 0 at the bottom, so each column is one byte of the board.
+"""
+
+from typing import Optional
+import random
+import numpy as np
+from numba import jit
+import game.game
+import game.game_state
+from c4.game import MIRROR, UNCOUNTED_MOVES, ZOBRIST_KEYS
+
+COLUMNS = 8
+ROWS = 8
+FULL_BOARD = (1 << (COLUMNS * ROWS)) - 1
+TOP_ROW = sum(1 << (column * ROWS + ROWS - 1) for column in range(COLUMNS))
+# Heights are packed 4 bits per column into a single int
+HEIGHT_BITS = 4
+
+
+def _window_starts(column_range, row_range) -> int:
+    return sum(
+        1 << (column * ROWS + row) for column in column_range for row in row_range
+    )
+
+
+# Shift to the next cell in a line, and the cells a line of four can start on
+# without running off the board
+WIN_DIRECTIONS = (
+    # Vertical
+    (1, _window_starts(range(COLUMNS), range(ROWS - 3))),
+    # Horizontal
+    (ROWS, _window_starts(range(COLUMNS - 3), range(ROWS))),
+    # Diagonal /
+    (ROWS + 1, _window_starts(range(COLUMNS - 3), range(ROWS - 3))),
+    # Diagonal \
+    (ROWS - 1, _window_starts(range(COLUMNS - 3), range(3, ROWS))),
+)
+
+
+def _permitted_actions_for(full_columns: int) -> tuple[int, ...]:
+    return tuple(
+        column
+        for column in range(COLUMNS)
+        if not full_columns & (1 << (column * ROWS + ROWS - 1))
+    )
+
+
+# Permitted actions only depend on which columns are full, so build them all once
+PERMITTED_ACTIONS = {
+    full_columns: _permitted_actions_for(full_columns)
+    for full_columns in (
+        sum(
+            1 << (column * ROWS + ROWS - 1)
+            for column in range(COLUMNS)
+            if combination & (1 << column)
+        )
+        for combination in range(1 << COLUMNS)
+    )
+}
+
+
+def has_four(board: int) -> bool:
+    for shift, starts in WIN_DIRECTIONS:
+        if (
+            board
+            & (board >> shift)
+            & (board >> (2 * shift))
+            & (board >> (3 * shift))
+            & starts
+        ):
+            return True
+    return False
+
+
+WIN_SHIFTS = np.array([shift for shift, _ in WIN_DIRECTIONS], dtype=np.uint64)
+WIN_STARTS = np.array([starts for _, starts in WIN_DIRECTIONS], dtype=np.uint64)
+
+
+@jit(cache=True)
+def jit_has_four(board):
+    for ix in range(WIN_SHIFTS.size):
+        shift = WIN_SHIFTS[ix]
+        if (
+            board
+            & (board >> shift)
+            & (board >> (np.uint64(2) * shift))
+            & (board >> (np.uint64(3) * shift))
+            & WIN_STARTS[ix]
+        ):
+            return True
+    return False
+
+
+@jit(cache=True)
+def random_play_outs(board_0, board_1, heights, next_player_id, playouts, seed, moves):
+    # Whole random games in one call, returning the mean binary reward and
+    # adding the moves played to moves[0]
+    np.random.seed(seed)
+    rewards = np.zeros(2)
+    boards = np.empty(2, dtype=np.uint64)
+    column_heights = np.empty(COLUMNS, dtype=np.int64)
+    columns = np.empty(COLUMNS, dtype=np.int64)
+    for _ in range(playouts):
+        boards[0] = board_0
+        boards[1] = board_1
+        for column in range(COLUMNS):
+            column_heights[column] = (heights >> (column * HEIGHT_BITS)) & 0xF
+        player_id = next_player_id
+        winner = -2
+        while True:
+            column_count = 0
+            for column in range(COLUMNS):
+                if column_heights[column] < ROWS:
+                    columns[column_count] = column
+                    column_count += 1
+            if column_count == 0:
+                break
+            column = columns[np.random.randint(column_count)]
+            boards[player_id] |= np.uint64(1) << np.uint64(
+                column * ROWS + column_heights[column]
+            )
+            column_heights[column] += 1
+            moves[0] += 1
+            if jit_has_four(boards[player_id]):
+                winner = player_id
+                break
+            player_id = (player_id + 1) % 2
+        if winner >= 0:
+            rewards -= 1
+            rewards[winner] += 2
+    return rewards / playouts
+
+
+class BitboardState(game.game_state.GameState):
+    def __init__(
+        self,
+        next_player_id: int,
+        last_player_id: int,
+        boards: tuple[int, int],
+        heights: int,
+        winner: int,
+        previous_actions: list[int],
+        zobrist: int = 0,
+        mirror_zobrist: int = 0,
+    ):
+        self.next_player_id = next_player_id
+        self.last_player_id = last_player_id
+        self.boards = boards
+        self.heights = heights
+        self._winner = winner
+        self._previous_actions = previous_actions
+        self.zobrist = zobrist
+        # Hash of the board mirrored, kept up alongside zobrist
+        self.mirror_zobrist = mirror_zobrist
+
+    def copy(self) -> "BitboardState":
+        return BitboardState(
+            self.next_player_id,
+            self.last_player_id,
+            self.boards,
+            self.heights,
+            self._winner,
+            self._previous_actions.copy(),
+            self.zobrist,
+            self.mirror_zobrist,
+        )
+
+    def hash(self) -> int:
+        return self.zobrist
+
+    def canonical(self) -> tuple[int, int]:
+        if self.mirror_zobrist < self.zobrist:
+            return self.mirror_zobrist, MIRROR
+        return self.zobrist, 0
+
+    @property
+    def occupied(self) -> int:
+        return self.boards[0] | self.boards[1]
+
+    def height(self, column: int) -> int:
+        return (self.heights >> (column * HEIGHT_BITS)) & 0xF
+
+    @property
+    def player_id(self):
+        return self.last_player_id
+
+    @property
+    def permitted_actions(self) -> tuple[int, ...]:
+        return PERMITTED_ACTIONS[self.occupied & TOP_ROW]
+
+    @property
+    def winner(self):
+        return self._winner
+
+    @property
+    def previous_actions(self):
+        return self._previous_actions
+
+    @property
+    def board(self) -> np.ndarray:
+        """Board in the same layout as c4.game.GameState.board"""
+        board = np.zeros((ROWS, COLUMNS), dtype=np.uint8)
+        for player_id, player_board in enumerate(self.boards):
+            for column in range(COLUMNS):
+                for row in range(ROWS):
+                    if player_board & (1 << (column * ROWS + row)):
+                        board[ROWS - 1 - row][column] = player_id + 1
+        return board
+
+    def loggable(self) -> dict:
+        return {
+            "next_player_id": self.next_player_id,
+            "last_player_id": self.last_player_id,
+            "board": self.board.tolist(),
+            "winner": self.winner,
+            "permitted_actions": list(self.permitted_actions),
+        }
+
+
+class BitboardGame(game.game.Game):
+    def __init__(self, state: Optional[BitboardState] = None) -> None:
+        if not (state):
+            self.initialize_game()
+        else:
+            self.state = state.copy()
+
+    @classmethod
+    def from_state(cls, state: game.game_state.GameState) -> "BitboardGame":
+        assert isinstance(state, BitboardState)
+        return cls(state)
+
+    def initialize_game(self) -> BitboardState:
+        self.state = BitboardState(1, -1, (0, 0), 0, -1, [])
+        return self.state
+
+    @classmethod
+    def max_action_count(cls) -> int:
+        return COLUMNS
+
+    @classmethod
+    def transform_action(cls, column: int, symmetry: int) -> int:
+        return COLUMNS - 1 - column if symmetry & MIRROR else column
+
+    @classmethod
+    def random_play_out(
+        cls,
+        state: BitboardState,
+        playouts: int = 1,
+        moves: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        return random_play_outs(
+            np.uint64(state.boards[0]),
+            np.uint64(state.boards[1]),
+            state.heights,
+            state.next_player_id,
+            playouts,
+            random.getrandbits(31),
+            UNCOUNTED_MOVES if moves is None else moves,
+        )
+
+    def act(self, column) -> BitboardState:
+        state = self.state
+        state.previous_actions.append(column)
+
+        player_id = state.next_player_id
+        height = state.height(column)
+        cell = column * ROWS + height
+        move = 1 << cell
+        state.zobrist ^= ZOBRIST_KEYS[player_id][cell]
+        state.mirror_zobrist ^= ZOBRIST_KEYS[player_id][
+            (COLUMNS - 1 - column) * ROWS + height
+        ]
+        if player_id == 0:
+            state.boards = (state.boards[0] | move, state.boards[1])
+        else:
+            state.boards = (state.boards[0], state.boards[1] | move)
+        state.heights += 1 << (column * HEIGHT_BITS)
+
+        state.last_player_id = player_id
+        state.next_player_id = (player_id + 1) % 2
+
+        # Only the player who just moved can have made a line
+        if has_four(state.boards[player_id]):
+            state._winner = player_id
+        elif state.occupied == FULL_BOARD:
+            state._winner = -2
+
+        return state
+
+    def debug_print(self):
+        for row in self.state.board:
+            print("".join([str(column) if column != 0 else "." for column in row]))
+        print()
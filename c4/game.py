@@ -2,22 +2,36 @@ from hashlib import sha256
 from dataclasses import dataclass
 from typing import Optional
 import logging
+import random
 import numpy as np
 from numba import jit
 import game.game
 import game.game_state
+from game.zobrist import zobrist_keys
 
 
 LOGGER = logging.getLogger(__name__)
 
+# One key per player per cell, with cell ``8 * column + height`` counting
+# height from the bottom. c4.bitboard shares these, so both engines hash a
+# position the same.
+ZOBRIST_KEYS = zobrist_keys(4, 2, 64)
 
-@jit
+# Symmetry (see GameState.canonical) reflecting the board left to right,
+# which reverses the columns and leaves the game the same
+MIRROR = 1
+
+# Where playouts count their moves when nobody is asking
+UNCOUNTED_MOVES = np.zeros(1, dtype=np.int64)
+
+
+@jit(cache=True)
 def check_for_win(board) -> Optional[int]:
     # Board representation is 0 for empty to allow tighter memory packing
     # As a result, need to subtract one to match player ids
     # Check horizontal win
     for row in board:
-        for ix in range(0, 4):
+        for ix in range(0, 5):
             winner = row[ix] == row[ix + 1] == row[ix + 2] == row[ix + 3] != 0
             if winner:
                 return row[ix] - 1
@@ -37,7 +51,7 @@ def check_for_win(board) -> Optional[int]:
 
     # Check for \ win
     for iy in range(0, 5):
-        for ix in range(0, 4):
+        for ix in range(0, 5):
             winner = (
                 board[iy][ix]
                 == board[iy + 1][ix + 1]
@@ -50,7 +64,7 @@ def check_for_win(board) -> Optional[int]:
 
     # Check for / win
     for iy in range(0, 5):
-        for ix in range(4, 8):
+        for ix in range(3, 8):
             winner = (
                 board[iy][ix]
                 == board[iy + 1][ix - 1]
@@ -68,6 +82,38 @@ def check_for_win(board) -> Optional[int]:
     return -1
 
 
+@jit(cache=True)
+def random_play_outs(board, next_player_id, playouts, seed, moves):
+    # Whole random games in one call, returning the mean binary reward and
+    # adding the moves played to moves[0]
+    np.random.seed(seed)
+    rewards = np.zeros(2)
+    columns = np.empty(8, dtype=np.int64)
+    for _ in range(playouts):
+        scratch = board.copy()
+        player_id = next_player_id
+        while True:
+            column_count = 0
+            for ix in range(8):
+                if scratch[0][ix] == 0:
+                    columns[column_count] = ix
+                    column_count += 1
+            column = columns[np.random.randint(column_count)]
+            for iy in range(7, -1, -1):
+                if scratch[iy][column] == 0:
+                    scratch[iy][column] = player_id + 1
+                    break
+            moves[0] += 1
+            winner = check_for_win(scratch)
+            if winner != -1:
+                break
+            player_id = (player_id + 1) % 2
+        if winner >= 0:
+            rewards -= 1
+            rewards[winner] += 2
+    return rewards / playouts
+
+
 class GameState(game.game_state.GameState):
 
     def __init__(
@@ -78,6 +124,8 @@ class GameState(game.game_state.GameState):
         winner,
         permitted_actions,
         previous_actions,
+        zobrist=0,
+        mirror_zobrist=0,
     ):
         self.next_player_id = next_player_id
         self.last_player_id = last_player_id
@@ -85,6 +133,9 @@ class GameState(game.game_state.GameState):
         self._winner = winner
         self._permitted_actions = permitted_actions
         self._previous_actions = previous_actions
+        self.zobrist = zobrist
+        # Hash of the board mirrored, kept up alongside zobrist
+        self.mirror_zobrist = mirror_zobrist
 
     def copy(self) -> "GameState":
         return GameState(
@@ -96,8 +147,19 @@ class GameState(game.game_state.GameState):
             self._winner,
             [action for action in self._permitted_actions],
             [action for action in self.previous_actions],
+            self.zobrist,
+            self.mirror_zobrist,
         )
 
+    def hash(self) -> int:
+        # Side to move follows from the number of pieces, so the board is enough
+        return self.zobrist
+
+    def canonical(self) -> tuple[int, int]:
+        if self.mirror_zobrist < self.zobrist:
+            return self.mirror_zobrist, MIRROR
+        return self.zobrist, 0
+
     @property
     def player_id(self):
         return self.last_player_id
@@ -159,13 +221,35 @@ class Game(game.game.Game):
     def max_action_count(cls) -> int:
         return 8
 
+    @classmethod
+    def transform_action(cls, column: int, symmetry: int) -> int:
+        return 7 - column if symmetry & MIRROR else column
+
+    @classmethod
+    def random_play_out(
+        cls, state: GameState, playouts: int = 1, moves: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        return random_play_outs(
+            state.board,
+            state.next_player_id,
+            playouts,
+            random.getrandbits(31),
+            UNCOUNTED_MOVES if moves is None else moves,
+        )
+
     def act(self, column) -> GameState:
         self.state.previous_actions.append(column)
 
         board = self.state.board
-        for row in reversed(board):
+        for height, row in enumerate(reversed(board)):
             if row[column] == 0:
                 row[column] = self.state.next_player_id + 1
+                self.state.zobrist ^= ZOBRIST_KEYS[self.state.next_player_id][
+                    column * 8 + height
+                ]
+                self.state.mirror_zobrist ^= ZOBRIST_KEYS[
+                    self.state.next_player_id
+                ][(7 - column) * 8 + height]
                 break
 
         self.state.last_player_id = self.state.next_player_id
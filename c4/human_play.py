@@ -1,11 +1,17 @@
-def human_play(game, tree):
+from mcts.ponder import Ponderer
+
+
+def human_play(game, tree, ponder=False):
     done = False
+    ponderer = Ponderer(tree) if ponder else None
     game.debug_print()
     while not done:
         print("--------")
         print("01234567")
         if game.state.next_player_id == 0:
             action = None
+            if ponderer:
+                ponderer.start(game.state)
             while action == None:
                 try:
                     proposed_action = int(input("Enter your action: "))
@@ -15,10 +21,14 @@ def human_play(game, tree):
                         print("✖️")
                 except ValueError:
                     print("✖️")
+        elif ponderer:
+            action = ponderer.act(game.state)
         else:
             action = tree.act(game.state)
         next_state = game.act(action)
         state = next_state
         game.debug_print()
         done = next_state.winner != -1
+    if ponderer:
+        ponderer.stop()
     tree.to_disk()
@@ -5,6 +5,14 @@ from game.game_state import GameState
 
 
 class Game(ABC):
+    # Optional compiled playout: a classmethod taking (state, playouts,
+    # moves=None) that plays random games to the end and returns the mean
+    # reward per player, adding the moves played to moves[0] if given.
+    # Tree uses it in place of its own Python playout loop when set, as long
+    # as it searches with the game's own reward_model (or the binary one,
+    # for games without) that the compiled playout scores games with.
+    random_play_out: Optional[typing.Callable] = None
+
     @abstractmethod
     def act(self, action) -> "GameState":
         pass
@@ -28,6 +36,22 @@ class Game(ABC):
         else:
             raise NotImplementedError
 
+    @classmethod
+    def transform_action(cls, action: Hashable, symmetry: int) -> Hashable:
+        """action as played in the position symmetry maps to
+
+        See GameState.canonical.
+        """
+        return action
+
+    @classmethod
+    def sample_non_player_act(cls, state: GameState) -> Hashable:
+        """A non-player act drawn as non_player_act would, leaving state as is
+
+        Games can override this with something cheaper than acting on a copy.
+        """
+        return cls.from_state(state).non_player_act()[0]
+
     def apply_non_player_acts(self, actions: Hashable) -> "GameState":
         """
         Apply a sequence of non-player actions to the current state
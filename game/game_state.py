@@ -6,11 +6,26 @@ import typing
 
 
 class GameState(ABC):
-    def hash(self) -> str:
+    # Lets subclasses drop __dict__ with __slots__ of their own
+    __slots__ = ()
+
+    def hash(self) -> typing.Union[str, int]:
+        # Keyed on the action history, so no two move orders share a hash.
+        # Games with transpositions override this with an int Zobrist hash.
         hash_object = sha256()
         hash_object.update(str(tuple(self.previous_actions)).encode())
         return hash_object.hexdigest()
 
+    def canonical(self) -> tuple[typing.Union[str, int], int]:
+        """Hash shared by this position and its symmetric images, and the
+        symmetry taking this position to the one the hash is of
+
+        Symmetries are bit flags, 0 for none, each its own inverse, combined
+        with xor; Game.transform_action applies them to actions. Games
+        with symmetries override this, along with transform_action.
+        """
+        return self.hash(), 0
+
     @abstractproperty
     def player_id(self) -> int:
         pass
@@ -0,0 +1,85 @@
+from typing import Hashable, Iterable, Iterator, Optional
+
+
+class ActionHistory:
+    """Immutable sequence of actions, linked back through its prefixes
+
+    Extending a history makes one new link that points at the old one, so
+    states copied from each other share everything they have in common
+    and copying costs nothing. Reads that walk the whole sequence are
+    linear; the tail (as ``history[start:]``) only walks the part asked
+    for.
+    """
+
+    __slots__ = ("action", "parent", "length")
+
+    def __init__(
+        self, action: Hashable = None, parent: Optional["ActionHistory"] = None
+    ):
+        self.action = action
+        self.parent = parent
+        self.length = 0 if parent is None else parent.length + 1
+
+    @classmethod
+    def from_actions(cls, actions: Iterable[Hashable]) -> "ActionHistory":
+        history = cls()
+        for action in actions:
+            history = cls(action, history)
+        return history
+
+    def extended(self, action: Hashable) -> "ActionHistory":
+        return ActionHistory(action, self)
+
+    def _tail(self, count: int) -> list[Hashable]:
+        actions = []
+        link = self
+        for _ in range(count):
+            actions.append(link.action)
+            link = link.parent
+        actions.reverse()
+        return actions
+
+    def tolist(self) -> list[Hashable]:
+        return self._tail(self.length)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[Hashable]:
+        return iter(self.tolist())
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.length)
+            if stop == self.length and step == 1:
+                return self._tail(max(self.length - start, 0))
+            return self.tolist()[key]
+        if key == -1 and self.length:
+            return self.action
+        return self.tolist()[key]
+
+    def __eq__(self, other) -> bool:
+        if self is other:
+            return True
+        if isinstance(other, ActionHistory):
+            if self.length != other.length:
+                return False
+            # Only walk back to where the two histories join
+            mine, theirs = self, other
+            while mine is not theirs:
+                if mine.action != theirs.action:
+                    return False
+                mine, theirs = mine.parent, theirs.parent
+            return True
+        if isinstance(other, (list, tuple)):
+            return self.tolist() == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"ActionHistory({self.tolist()!r})"
+
+    def __reduce__(self):
+        # Flat, so long histories don't pickle as deeply nested links
+        return ActionHistory.from_actions, (self.tolist(),)
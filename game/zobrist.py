@@ -0,0 +1,14 @@
+"""Random keys for incremental Zobrist hashing
+
+A position's hash is the XOR of one key per feature it has, so a move
+updates it by XORing out the features it removes and XORing in the ones
+it adds.
+"""
+
+import numpy as np
+
+
+def zobrist_keys(seed: int, *shape: int) -> list:
+    """Nested lists of random 64 bit keys, as Python ints for cheap XOR"""
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 2**64, size=shape, dtype=np.uint64).tolist()
@@ -0,0 +1,230 @@
+import logging
+import math
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+from typing import Hashable, Optional
+import numpy as np
+from game.game import GameType
+from game.game_state import GameState
+
+LOGGER = logging.getLogger(__name__)
+
+# Seconds between warnings while waiting for a worker to take its last command
+CLAIM_TIMEOUT = 5
+# Actions that can be sent as slots before the whole state is resent
+MAX_PENDING_ACTIONS = 64
+
+# Header fields
+COMMAND = 0
+ACTION_COUNT = 1
+ITERATIONS = 2
+CHILD_COUNT = 3
+TOTAL_ITERATIONS = 4
+LAST_ITERATIONS = 5
+LAST_ITERATIONS_SAVED = 6
+HEADER_FIELDS = 7
+
+# Commands
+ACT = 1
+# Act, with the whole state waiting on the queue
+ACT_SYNC = 2
+# Any other message, waiting on the queue
+MESSAGE = 3
+
+
+def _replay(game, action: Hashable):
+    if game.state.next_automated:
+        game.apply_non_player_acts(action)
+    else:
+        game.act(action)
+
+
+class SharedChannel:
+    """One MultiTree worker's link, keeping act traffic out of pickled queues
+
+    Both ends keep a mirror of the game being played. To act, the parent
+    writes the slots (in permitted_actions) of the actions played since the
+    last act into shared memory; the worker replays them on its mirror to
+    get the state. Results come back the same way, as UCBs in
+    permitted_actions order. Events do the signalling. Whole states are
+    only queued when the game doesn't follow on from the mirror (a new
+    game, say), and other messages still go through the queue.
+
+    put/get match multiprocessing.Queue, so callers can treat a channel as
+    the worker's queue.
+    """
+
+    def __init__(self, game_class: GameType):
+        self.game_class = game_class
+        self.max_action_count = game_class.max_action_count()
+        self._shared_memory = shared_memory.SharedMemory(
+            create=True, size=self._nbytes(self.max_action_count)
+        )
+        self._owner = True
+        self.queue = multiprocessing.Queue()
+        # Set by the parent when a command is ready, and by the worker once
+        # it has read it, and its result
+        self.command_ready = multiprocessing.Event()
+        self.command_taken = multiprocessing.Event()
+        self.command_taken.set()
+        self.result_ready = multiprocessing.Event()
+        self._attach()
+
+    @staticmethod
+    def _nbytes(max_action_count: int) -> int:
+        # Header, move time, action slots, then UCBs, visits and values
+        return 8 * (HEADER_FIELDS + 1 + MAX_PENDING_ACTIONS + 3 * max_action_count)
+
+    def _attach(self):
+        buffer = self._shared_memory.buf
+        self.header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=buffer)
+        offset = HEADER_FIELDS * 8
+        self.move_time = np.ndarray((1,), dtype=np.float64, buffer=buffer, offset=offset)
+        offset += 8
+        self.slots = np.ndarray(
+            (MAX_PENDING_ACTIONS,), dtype=np.int64, buffer=buffer, offset=offset
+        )
+        offset += MAX_PENDING_ACTIONS * 8
+        children = np.ndarray(
+            (3, self.max_action_count), dtype=np.float64, buffer=buffer, offset=offset
+        )
+        self.ucbs, self.visits, self.values = children
+        # The game as last sent by the parent, and as last received by the
+        # worker
+        self._sent = None
+        self._received = None
+
+    def __getstate__(self):
+        # Used when worker processes are spawned rather than forked
+        state = self.__dict__.copy()
+        for name in ("_shared_memory", "header", "move_time", "slots", "ucbs", "visits", "values"):
+            del state[name]
+        state["name"] = self._shared_memory.name
+        return state
+
+    def __setstate__(self, state):
+        name = state.pop("name")
+        self.__dict__.update(state)
+        self._shared_memory = shared_memory.SharedMemory(name=name)
+        # Only the creating process should unlink the block
+        resource_tracker.unregister(self._shared_memory._name, "shared_memory")
+        self._owner = False
+        self._attach()
+
+    def _send(self, command: int):
+        self.header[COMMAND] = command
+        self.command_ready.set()
+
+    def _claim(self):
+        # The worker may not have read the last command yet, and writing
+        # now would overwrite the slots it's still to read
+        while not self.command_taken.wait(CLAIM_TIMEOUT):
+            LOGGER.warning("Worker hasn't taken its last command; still waiting")
+        self.command_taken.clear()
+
+    def put(self, item: tuple[str, object]):
+        self._claim()
+        self.queue.put(item)
+        self._send(MESSAGE)
+
+    def put_act(
+        self,
+        state: GameState,
+        iterations: Optional[int],
+        move_time: Optional[float],
+    ):
+        self._claim()
+        history = state.previous_actions
+        known = None if self._sent is None else self._sent.state.previous_actions
+        if (
+            known is None
+            or len(history) - len(known) > MAX_PENDING_ACTIONS
+            or history[: len(known)] != known
+        ):
+            self._sent = self.game_class.from_state(state)
+            self.queue.put(state)
+            command = ACT_SYNC
+        else:
+            new_actions = history[len(known) :]
+            for ix, action in enumerate(new_actions):
+                permitted = list(self._sent.state.permitted_actions)
+                self.slots[ix] = permitted.index(action)
+                _replay(self._sent, action)
+            self.header[ACTION_COUNT] = len(new_actions)
+            command = ACT
+        self.header[ITERATIONS] = -1 if iterations is None else iterations
+        self.move_time[0] = math.nan if move_time is None else move_time
+        self._send(command)
+
+    def get(self) -> tuple[str, object]:
+        self.command_ready.wait()
+        self.command_ready.clear()
+        command = self.header[COMMAND]
+        if command == MESSAGE:
+            message = self.queue.get()
+            self.command_taken.set()
+            return message
+        if command == ACT_SYNC:
+            self._received = self.game_class.from_state(self.queue.get())
+        else:
+            for slot in self.slots[: self.header[ACTION_COUNT]]:
+                _replay(self._received, self._received.state.permitted_actions[slot])
+        iterations = int(self.header[ITERATIONS])
+        move_time = float(self.move_time[0])
+        self.command_taken.set()
+        return "act", (
+            self._received.state,
+            None if iterations < 0 else iterations,
+            None if math.isnan(move_time) else move_time,
+        )
+
+    def put_result(
+        self,
+        state: GameState,
+        keys: list[Hashable],
+        ucbs: np.ndarray,
+        visits: np.ndarray,
+        values: np.ndarray,
+        total_iterations: int,
+        last_iterations: int,
+        last_iterations_saved: int,
+    ):
+        permitted = list(state.permitted_actions)
+        rows = ((self.ucbs, ucbs), (self.visits, visits), (self.values, values))
+        for out, scores in rows:
+            if keys == permitted:
+                out[: len(keys)] = scores
+            else:
+                out[: len(permitted)] = 0
+                for key, score in zip(keys, scores):
+                    out[permitted.index(key)] = score
+        self.header[CHILD_COUNT] = len(permitted)
+        self.header[TOTAL_ITERATIONS] = total_iterations
+        self.header[LAST_ITERATIONS] = last_iterations
+        self.header[LAST_ITERATIONS_SAVED] = last_iterations_saved
+        self.result_ready.set()
+
+    def get_result(
+        self,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray, int, int, int]:
+        """UCBs, visits and values in permitted_actions order, then total, last
+        and saved iterations"""
+        self.result_ready.wait()
+        self.result_ready.clear()
+        count = self.header[CHILD_COUNT]
+        return (
+            self.ucbs[:count].copy(),
+            self.visits[:count].copy(),
+            self.values[:count].copy(),
+            int(self.header[TOTAL_ITERATIONS]),
+            int(self.header[LAST_ITERATIONS]),
+            int(self.header[LAST_ITERATIONS_SAVED]),
+        )
+
+    def close(self):
+        # Views onto the buffer have to go before it can be closed
+        self.header = self.move_time = self.slots = None
+        self.ucbs = self.visits = self.values = None
+        self._shared_memory.close()
+        if self._owner:
+            self._shared_memory.unlink()
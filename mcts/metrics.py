@@ -0,0 +1,95 @@
+import json
+import logging
+import threading
+import time
+from typing import Optional
+
+LOGGER = logging.getLogger(__name__)
+
+# Phases of an iteration, each timed without the ones nested in it: state is
+# the lazy materialization of node states that expansion and playout do
+PHASES = ("selection", "expansion", "state", "playout", "backprop")
+
+
+class SearchMetrics:
+    """Cumulative time and call counts for each phase of search
+
+    A Tree made with profile=True fills one in as it searches. Reading it
+    from another thread is fine; figures may be an iteration out of step.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(PHASES, 0)
+        # Children stepped through by selection, and moves made by playouts
+        self.selection_steps = 0
+        self.playout_moves = 0
+        self.playouts = 0
+
+    def add(self, phase: str, seconds: float):
+        self.seconds[phase] += seconds
+        self.counts[phase] += 1
+
+    @property
+    def mean_selection_depth(self) -> float:
+        return self.selection_steps / max(self.counts["selection"], 1)
+
+    @property
+    def mean_playout_length(self) -> float:
+        return self.playout_moves / max(self.playouts, 1)
+
+    def as_dict(self) -> dict:
+        return {
+            "seconds": dict(self.seconds),
+            "counts": dict(self.counts),
+            "mean_selection_depth": self.mean_selection_depth,
+            "mean_playout_length": self.mean_playout_length,
+        }
+
+
+class MetricsExporter:
+    """Appends a tree's metrics to a file as a JSON line every interval
+
+    Each line also carries the time and the tree's iteration and node
+    counts. A last line is written on stop().
+    """
+
+    def __init__(self, tree, filename: str, interval: float = 10.0):
+        if tree.metrics is None:
+            raise ValueError("The tree needs profile=True for metrics to export")
+        self.tree = tree
+        self.filename = filename
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.write()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def write(self):
+        record = {
+            "time": time.time(),
+            "iterations": self.tree.total_iterations,
+            "nodes": self.tree.node_count(),
+            **self.tree.metrics.as_dict(),
+        }
+        with open(self.filename, "a") as f:
+            f.write(json.dumps(record) + "\n")
+        LOGGER.debug("Wrote search metrics to %s", self.filename)
@@ -0,0 +1,160 @@
+"""Convert node stores saved by older versions to the current format
+
+Handles the original pickled graph of Node objects, and the version 1
+pickle of flat arrays. Run with ``python -m mcts.migrate OLD NEW``.
+"""
+
+import argparse
+from collections import deque
+import logging
+import pickle
+import sys
+from typing import Optional
+from game.game import Game, GameType
+from game.game_state import GameState
+from mcts.node import NodeStore
+
+LOGGER = logging.getLogger(__name__)
+
+
+class LegacyNode:
+    """Stands in for the original Node and RootNode classes
+
+    Unpickling only sets attributes, which is all the conversion reads.
+    """
+
+
+class LegacyState:
+    """Stands in for a game state pickled in an older layout
+
+    States have since gained fields (Zobrist hashes) or changed layout
+    (NtState's byte buffer), so only the action history is read and the
+    state is rebuilt by replaying it; see rebuild_state.
+    """
+
+    state_class: type = GameState
+
+    @property
+    def previous_actions(self) -> list:
+        return self._previous_actions
+
+    @property
+    def next_automated(self) -> bool:
+        return self.__dict__.get("_next_automated", False)
+
+
+class LegacyUnpickler(pickle.Unpickler):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._legacy_states: dict[type, type] = {}
+
+    def find_class(self, module, name):
+        if module == "mcts.node" and name in ("Node", "RootNode"):
+            return LegacyNode
+        found = super().find_class(module, name)
+        if isinstance(found, type) and issubclass(found, GameState):
+            if found not in self._legacy_states:
+                self._legacy_states[found] = type(
+                    name, (LegacyState,), {"state_class": found}
+                )
+            return self._legacy_states[found]
+        return found
+
+
+def state_game_class(state: LegacyState) -> GameType:
+    """The game class defined alongside the state's class"""
+    module = sys.modules[state.state_class.__module__]
+    games = [
+        value
+        for value in vars(module).values()
+        if isinstance(value, type)
+        and issubclass(value, Game)
+        and value.__module__ == module.__name__
+    ]
+    if len(games) != 1:
+        raise ValueError(f"No single game class for {state.state_class.__name__}")
+    return games[0]
+
+
+def rebuild_state(
+    state: LegacyState, game_class: Optional[GameType] = None
+) -> GameState:
+    """Replay state's actions from a new game, giving the state as it is now"""
+    game = (game_class or state_game_class(state))()
+    for action in state.previous_actions:
+        if game.state.next_automated:
+            game.apply_non_player_acts(action)
+        else:
+            game.act(action)
+    return game.state
+
+
+def root_state(root: LegacyNode) -> GameState:
+    if root._state:
+        return rebuild_state(root._state, root.game_class)
+    # A rerooted root may only have kept its parent's state
+    state = rebuild_state(root._parent_state, root.game_class)
+    game = root.game_class.from_state(state)
+    if state.next_automated:
+        return game.apply_non_player_acts(root.action)
+    return game.act(root.action)
+
+
+def from_node_graph(root: LegacyNode) -> NodeStore:
+    store = NodeStore(root.game_class, root_state(root))
+    store.visits[store.root] = root._visit_count
+    store.value[store.root] = root._value_estimate
+    pending = deque([(root, store.root)])
+    while pending:
+        node, index = pending.popleft()
+        if not node.children:
+            continue
+        state = node._state or store.state(index)
+        store.add_children(index, list(node.children), state.next_automated)
+        children = store.children(index)
+        if node.child_visit_count is not None:
+            store.visits[children] = node.child_visit_count
+        if node.child_value is not None:
+            store.value[children] = node.child_value
+        pending.extend(zip(node.children.values(), children))
+    return store
+
+
+def from_version_1(data: dict) -> NodeStore:
+    size = len(data["arrays"]["parent"])
+    # States are never materialised, so no game class is needed
+    store = NodeStore(None, capacity=size)
+    for action in data["action_values"]:
+        store.action_id(action)
+    store._allocate(size)
+    for name in NodeStore.FIELDS:
+        getattr(store, name)[:size] = data["arrays"][name]
+    store.root = data["root"]
+    store.states[store.root] = rebuild_state(data["root_state"])
+    return store
+
+
+def load_pickled(filename: str) -> NodeStore:
+    with open(filename, "rb") as f:
+        data = LegacyUnpickler(f).load()
+    if isinstance(data, LegacyNode):
+        return from_node_graph(data)
+    if isinstance(data, dict) and data.get("version") == 1:
+        return from_version_1(data)
+    raise ValueError(f"{filename} isn't a pickled node store")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("old", help="Pickled store to read")
+    parser.add_argument("new", help="File to write the converted store to")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    store = load_pickled(args.old)
+    store.to_disk(args.new)
+    LOGGER.info("Converted %d nodes", store.count())
+
+
+if __name__ == "__main__":
+    main()
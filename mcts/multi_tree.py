@@ -1,18 +1,68 @@
 import multiprocessing
+import os
 import time
-from typing import NamedTuple, Optional
+from typing import Hashable, NamedTuple, Optional
 import logging
 
 import numpy as np
 from game.game_state import GameState
-from mcts.tree import Tree
+from mcts.channel import SharedChannel
+from mcts.node import NodeStore
+from mcts.shared_store import SharedNodeStore
+from mcts.tree import Tree, settle_scores
 
 LOGGER = logging.getLogger(__name__)
+STOP_TIMEOUT = 5
+# How MultiTree talks to its workers when acting
+IPC_MODES = ("shared", "queue")
+# Default node capacity of a SharedMultiTree
+SHARED_CAPACITY = 1 << 20
+
+
+def warm_up(tree: Tree, state: GameState) -> float:
+    """Run a throwaway playout so JIT compilation happens before the first move
+
+    Returns the seconds it took.
+    """
+    started = time.perf_counter()
+    if state.winner == -1:
+        tree.random_play_out(state)
+        if tree.compiled_play_out is not None:
+            tree.compiled_play_out(state, 1)
+    return time.perf_counter() - started
+
+
+def wait_for_workers(result_q: multiprocessing.Queue, processes: list, started: float):
+    for _ in processes:
+        _, pid, tree_seconds, warm_up_seconds = result_q.get()
+        total = time.perf_counter() - started
+        LOGGER.info(
+            "Worker %d ready after %.3fs (start %.3fs, tree %.3fs, warm up %.3fs)",
+            pid,
+            total,
+            total - tree_seconds - warm_up_seconds,
+            tree_seconds,
+            warm_up_seconds,
+        )
+
+
+def stop_workers(queues: list[multiprocessing.Queue], processes: list):
+    for q, p in zip(queues, processes):
+        # A channel waits for its worker to take the last command, which a
+        # dead worker never will
+        if p.is_alive():
+            q.put(("stop", None))
+    for p in processes:
+        p.join(STOP_TIMEOUT)
+        if p.is_alive():
+            LOGGER.warning("Worker %d didn't stop; terminating", p.pid)
+            p.terminate()
 
 
 def process_worker(
     q: multiprocessing.Queue,
     result_q: multiprocessing.Queue,
+    filename,
     game_state_class,
     game_class,
     initial_state,
@@ -21,9 +71,16 @@ def process_worker(
     reward_model,
     slow_mode,
     unload_after_play,
+    playouts,
+    move_time,
+    early_stop,
+    transposition_size,
+    max_nodes,
 ):
+    started = time.perf_counter()
+    # Every worker warm-starts from the same saved tree
     tree = Tree(
-        None,
+        filename,
         game_state_class,
         game_class,
         initial_state,
@@ -32,14 +89,45 @@ def process_worker(
         reward_model,
         slow_mode,
         unload_after_play,
+        playouts,
+        move_time,
+        early_stop,
+        transposition_size=transposition_size,
+        max_nodes=max_nodes,
     )
+    tree_seconds = time.perf_counter() - started
+    result_q.put(("ready", os.getpid(), tree_seconds, warm_up(tree, initial_state)))
     while True:
-        state = q.get(block=True)
-        node = tree.get_node(state)
-        tree._process_turn(node, state)
-        ucbs = node.child_ucb(constant)
-        keys = list(node.children.keys())
-        result_q.put((keys, ucbs, tree.total_iterations))
+        message, payload = q.get()
+        if message == "act":
+            state, iterations, move_time = payload
+            node = tree.get_node(state)
+            node = tree._process_turn(node, state, iterations, move_time)
+            store = tree.node_store
+            start = store.first_child[node]
+            end = start + store.child_count[node]
+            result = (
+                store.child_actions(node),
+                store.child_ucb(node, constant),
+                store.visits[start:end],
+                store.value[start:end],
+                tree.total_iterations,
+                tree.last_iterations,
+                tree.last_iterations_saved,
+            )
+            if isinstance(q, SharedChannel):
+                q.put_result(state, *result)
+            else:
+                result_q.put(result)
+        elif message == "new_root":
+            tree.new_root(payload)
+        elif message == "snapshot":
+            snapshot = tree.node_store.subtree(tree.root, payload)
+            # States are rebuilt on demand, so only the root's needs sending
+            snapshot.states[1:] = None
+            result_q.put(snapshot)
+        elif message == "stop":
+            break
 
 
 class MultiTree:
@@ -54,8 +142,18 @@ class MultiTree:
         reward_model: Optional[callable] = None,
         slow_mode: bool = False,
         unload_after_play: bool = False,
+        playouts: int = 1,
+        move_time: Optional[float] = None,
+        early_stop: Optional[str] = None,
+        transposition_size: int = 0,
+        max_nodes: Optional[int] = None,
+        save_depth: Optional[int] = None,
         jobs=4,
+        ipc: str = "shared",
     ):
+        if ipc not in IPC_MODES:
+            raise ValueError(f"Unknown ipc mode {ipc}")
+        self.filename = filename
         self.game_state_class = game_state_class
         self.game_class = game_class
         self.initial_state = initial_state
@@ -64,20 +162,36 @@ class MultiTree:
         self.reward_model = reward_model
         self.slow_mode = slow_mode
         self.unload_after_play = unload_after_play
+        self.playouts = playouts
+        self.move_time = move_time
+        self.early_stop = early_stop
+        self.transposition_size = transposition_size
+        self.max_nodes = max_nodes
+        # Depth of each worker's tree that gets merged and saved; all if None
+        self.save_depth = save_depth
         self.jobs = jobs
+        self.ipc = ipc
         self.total_iterations = 0
+        self.last_iterations = 0
+        self.last_iterations_saved = 0
         self.setup_processes()
 
     def setup_processes(self):
-        self.q = multiprocessing.Queue()
+        started = time.perf_counter()
+        # Channels stand in for the queues, and carry the act traffic
+        if self.ipc == "shared":
+            self.queues = [SharedChannel(self.game_class) for _ in range(self.jobs)]
+        else:
+            self.queues = [multiprocessing.Queue() for _ in range(self.jobs)]
         self.result_q = multiprocessing.Queue()
         self.processes = []
-        for _ in range(self.jobs):
+        for q in self.queues:
             p = multiprocessing.Process(
                 target=process_worker,
                 args=(
-                    self.q,
+                    q,
                     self.result_q,
+                    self.filename,
                     self.game_state_class,
                     self.game_class,
                     self.initial_state,
@@ -86,44 +200,297 @@ class MultiTree:
                     self.reward_model,
                     self.slow_mode,
                     self.unload_after_play,
+                    self.playouts,
+                    self.move_time,
+                    self.early_stop,
+                    self.transposition_size,
+                    self.max_nodes,
                 ),
             )
             p.start()
             self.processes.append(p)
+        wait_for_workers(self.result_q, self.processes, started)
 
     @staticmethod
-    def best_action(permitted_actions, process_output) -> int:
-        sums = np.zeros(len(permitted_actions))
+    def best_action(
+        permitted_actions, process_output, early_stop: Optional[str] = None
+    ) -> int:
+        # Rows of summed ucbs, visits and values, in permitted_actions order
+        sums = np.zeros((3, len(permitted_actions)))
+        action_index = {action: ix for ix, action in enumerate(permitted_actions)}
         for value_group in process_output:
-            for key, ucb in zip(value_group[0], value_group[1]):
-                array_index = permitted_actions.index(key)
-                sums[array_index] += ucb
-        LOGGER.debug("Sums of ucbs: %s", str(sums))
-        return permitted_actions[int(np.argmax(sums))]
+            rows = value_group[1:4] if early_stop else value_group[1:2]
+            for row, scores in enumerate(rows):
+                for key, score in zip(value_group[0], scores):
+                    sums[row, action_index[key]] += score
+        return permitted_actions[MultiTree._pick(*sums, early_stop)]
 
-    def act(self, state: GameState) -> int:
+    @staticmethod
+    def _pick(ucbs, visits, values, early_stop: Optional[str]) -> int:
+        # With an early stop rule the workers' merged children are ranked as
+        # Tree ranks its own, so the move is the one the rule settles on
+        if early_stop:
+            scores = settle_scores(early_stop, visits, values)
+            LOGGER.debug("Merged %s scores: %s", early_stop, str(scores))
+            return int(np.argmax(scores))
+        LOGGER.debug("Sums of ucbs: %s", str(ucbs))
+        return int(np.argmax(ucbs))
+
+    def act(
+        self,
+        state: GameState,
+        iterations: Optional[int] = None,
+        move_time: Optional[float] = None,
+    ) -> int:
         # Strategy is 'sum' voting - see p3 of
         # https://www-users.cse.umn.edu/~gini/publications/papers/Steinmetz2020TG.pdf
         # We probably want to be able to add 'majority' voting as an option
-        for _ in range(self.jobs):
-            self.q.put(state)
+        if self.ipc == "shared":
+            for channel in self.queues:
+                channel.put_act(state, iterations, move_time)
+            # Result is ucbs, visits and values in permitted_actions order,
+            # total_iterations, last_iterations, last_iterations_saved
+            results = [channel.get_result() for channel in self.queues]
+            self._count_iterations([result[3:] for result in results])
+            sums = np.sum([result[:3] for result in results], axis=0)
+            return state.permitted_actions[self._pick(*sums, self.early_stop)]
 
-        # Result is keys, ucbs, total_iterations
+        for q in self.queues:
+            q.put(("act", (state, iterations, move_time)))
+
+        # Result is keys, ucbs, visits, values, total_iterations,
+        # last_iterations, last_iterations_saved
         keys_ucbs = [self.result_q.get() for _ in range(self.jobs)]
-        self.total_iterations = sum([k[2] for k in keys_ucbs])
-        return MultiTree.best_action(state.permitted_actions, keys_ucbs)
+        self._count_iterations([k[4:] for k in keys_ucbs])
+        return MultiTree.best_action(
+            state.permitted_actions, keys_ucbs, self.early_stop
+        )
+
+    def _count_iterations(self, counts: list[tuple[int, int, int]]):
+        self.total_iterations = sum([count[0] for count in counts])
+        self.last_iterations = sum([count[1] for count in counts])
+        self.last_iterations_saved = sum([count[2] for count in counts])
 
     def new_root(self, state):
-        # We're not actually rerooting...
-        # We're just killing it and starting again
-        for p in self.processes:
-            p.terminate()
+        # Workers stay up, so their imports and JIT compilation stay warm
         self.initial_state = state
+        for q in self.queues:
+            q.put(("new_root", state))
+
+    def merged_store(self) -> NodeStore:
+        """One tree holding every worker's visits and values summed"""
+        for q in self.queues:
+            q.put(("snapshot", self.save_depth))
+        stores = [self.result_q.get() for _ in self.queues]
+        merged = stores[0]
+        for store in stores[1:]:
+            merged.merge(store)
+        return merged
+
+    def to_disk(self):
+        # Saved like a Tree, so either can load it to warm-start
+        if self.filename:
+            self.merged_store().to_disk(self.filename)
+
+    def close(self):
+        stop_workers(self.queues, self.processes)
+        if self.ipc == "shared":
+            for channel in self.queues:
+                channel.close()
+
+
+class SharedTree(Tree):
+    """Tree searching a SharedNodeStore alongside other workers"""
+
+    def __init__(
+        self, node_store: SharedNodeStore, *args, search_workers: int = 1, **kwargs
+    ):
+        super().__init__(None, *args, **kwargs)
+        self.node_store = node_store
+        self.search_workers = search_workers
+        self.expansion(self.root)
+
+    def selection(self, node: int) -> list[int]:
+        path = super().selection(node)
+        self.node_store.add_virtual_loss(path)
+        return path
+
+
+def shared_tree_worker(
+    q: multiprocessing.Queue,
+    result_q: multiprocessing.Queue,
+    node_store: SharedNodeStore,
+    game_state_class,
+    game_class,
+    initial_state,
+    iterations,
+    constant,
+    reward_model,
+    slow_mode,
+    playouts,
+    move_time,
+    early_stop,
+    search_workers,
+):
+    started = time.perf_counter()
+    tree = SharedTree(
+        node_store,
+        game_state_class,
+        game_class,
+        initial_state,
+        iterations,
+        constant,
+        reward_model,
+        slow_mode,
+        False,
+        playouts,
+        move_time,
+        early_stop,
+        search_workers=search_workers,
+    )
+    tree_seconds = time.perf_counter() - started
+    result_q.put(("ready", os.getpid(), tree_seconds, warm_up(tree, initial_state)))
+    while True:
+        message, payload = q.get(block=True)
+        if message == "act":
+            state, iterations, move_time = payload
+            node = tree.get_node(state)
+            tree._process_turn(node, state, iterations, move_time)
+            result_q.put(
+                (
+                    node,
+                    tree.total_iterations,
+                    tree.last_iterations,
+                    tree.last_iterations_saved,
+                )
+            )
+        elif message == "new_root":
+            node_store.reset_states(payload)
+        elif message == "stop":
+            break
+
+
+class SharedMultiTree:
+    """Tree parallel search - every worker searches one tree in shared memory
+
+    Unlike MultiTree, workers see each other's statistics, and memory
+    doesn't grow with the number of jobs. Virtual loss keeps workers from
+    all following the same path.
+    """
+
+    def __init__(
+        self,
+        filename,
+        game_state_class,
+        game_class,
+        initial_state,
+        iterations,
+        constant: float = 1.4142135623730951,
+        reward_model: Optional[callable] = None,
+        slow_mode: bool = False,
+        unload_after_play: bool = False,
+        playouts: int = 1,
+        move_time: Optional[float] = None,
+        early_stop: Optional[str] = None,
+        jobs=4,
+        capacity: int = SHARED_CAPACITY,
+        virtual_loss: float = 1.0,
+    ):
+        self.filename = filename
+        self.game_state_class = game_state_class
+        self.game_class = game_class
+        self.initial_state = initial_state
+        self.iterations = iterations
+        self.constant = constant
+        self.reward_model = reward_model
+        self.slow_mode = slow_mode
+        self.unload_after_play = unload_after_play
+        self.playouts = playouts
+        self.move_time = move_time
+        self.early_stop = early_stop
+        self.jobs = jobs
+        self.total_iterations = 0
+        self.last_iterations = 0
+        self.last_iterations_saved = 0
+        self.node_store = SharedNodeStore(
+            game_class, initial_state, capacity, virtual_loss
+        )
+        if filename and os.path.exists(filename):
+            # Before the workers start, so they inherit the loaded root
+            self.node_store.load(NodeStore.from_disk(filename, game_class))
         self.setup_processes()
 
+    def setup_processes(self):
+        started = time.perf_counter()
+        self.queues = [multiprocessing.Queue() for _ in range(self.jobs)]
+        self.result_q = multiprocessing.Queue()
+        self.processes = []
+        for q in self.queues:
+            p = multiprocessing.Process(
+                target=shared_tree_worker,
+                args=(
+                    q,
+                    self.result_q,
+                    self.node_store,
+                    self.game_state_class,
+                    self.game_class,
+                    self.initial_state,
+                    self.iterations,
+                    self.constant,
+                    self.reward_model,
+                    self.slow_mode,
+                    self.playouts,
+                    self.move_time,
+                    self.early_stop,
+                    self.jobs,
+                ),
+            )
+            p.start()
+            self.processes.append(p)
+        wait_for_workers(self.result_q, self.processes, started)
+
+    def act(
+        self,
+        state: GameState,
+        iterations: Optional[int] = None,
+        move_time: Optional[float] = None,
+    ) -> Hashable:
+        for q in self.queues:
+            q.put(("act", (state, iterations, move_time)))
+
+        # Result is searched node, total_iterations, last_iterations,
+        # last_iterations_saved
+        results = [self.result_q.get() for _ in range(self.jobs)]
+        self.total_iterations = sum([result[1] for result in results])
+        self.last_iterations = sum([result[2] for result in results])
+        self.last_iterations_saved = sum([result[3] for result in results])
+        store = self.node_store
+        node = results[0][0]
+        if self.early_stop:
+            start = store.first_child[node]
+            end = start + store.child_count[node]
+            scores = settle_scores(
+                self.early_stop, store.visits[start:end], store.value[start:end]
+            )
+            LOGGER.debug("Shared tree %s scores: %s", self.early_stop, str(scores))
+        else:
+            scores = store.child_ucb(node, self.constant)
+            LOGGER.debug("Shared tree ucbs: %s", str(scores))
+        return state.permitted_actions[int(np.argmax(scores))]
+
+    def node_count(self) -> int:
+        return self.node_store.count()
+
+    def new_root(self, state):
+        self.node_store.reset(state)
+        for q in self.queues:
+            q.put(("new_root", state))
+
     def to_disk(self):
-        LOGGER.warn("MultiTree to_disk not yet implemented")
+        # Saved like a Tree, so either can load it to warm-start
+        if self.filename:
+            self.node_store.to_disk(self.filename)
 
     def close(self):
-        for p in self.processes:
-            p.terminate()
+        stop_workers(self.queues, self.processes)
+        self.node_store.close()
@@ -1,194 +1,875 @@
-from contextlib import contextmanager
+from collections import OrderedDict, deque
 import logging
-from typing import Optional, OrderedDict
 import math
+from typing import Hashable, Optional
+import os
 import pickle
+import struct
 import numpy as np
+from numba import jit
 from game.game import GameType
 from game.game_state import GameState
 
 LOGGER = logging.getLogger(__name__)
 
+NO_NODE = -1
+ROOT_ACTION = 255
+
+# Node has had its children allocated (terminal nodes are expanded with none)
+FLAG_EXPANDED = 1
+# Node was reached by a non-player act, so it never gets value credited
+FLAG_CHANCE = 2
+# Node is a chance node whose outcomes are sampled by the game rather than
+# selected, and only get a child once drawn; see NodeStore.add_outcome
+FLAG_SAMPLED = 4
+# The three bits above the flags hold the symmetry (see
+# GameState.canonical) taking a node's state to the orientation of the
+# children it shares with a symmetric position; zero for nodes whose
+# children are their own
+SYMMETRY_SHIFT = 3
+SYMMETRY_MASK = 0b111 << SYMMETRY_SHIFT
+# The game from node is proven won, or lost, for the player who moved into
+# it; set by the solver (see Tree's solver option and NodeStore.solve).
+# These sit above the symmetry, so stores saved before the solver existed
+# read the same
+FLAG_PROVEN_WIN = 64
+FLAG_PROVEN_LOSS = 128
+FLAG_PROVEN = FLAG_PROVEN_WIN | FLAG_PROVEN_LOSS
+# What a node expanded afresh keeps of its flags
+UNEXPANDED_MASK = np.uint8(0xFF & ~(FLAG_EXPANDED | SYMMETRY_MASK))
+
+# Version 1 was a single pickle; mcts.migrate converts those
+STORE_VERSION = 2
+MAGIC = b"MONTYNS\x00"
+# Magic, version, header length
+PREAMBLE = struct.Struct("<8sIQ")
+# Each array starts on a boundary this many bytes apart
+ALIGNMENT = 64
+# Nodes written per call, so saving never copies a whole array
+CHUNK_NODES = 1 << 16
+
+
+@jit(cache=True, nogil=True)
+def select_child(first_child, child_count, flags, visits, value, index, constant):
+    start = first_child[index]
+    end = start + child_count[index]
+    unvisited = NO_NODE
+    lost = 0
+    for child in range(start, end):
+        # A proven win settles the node, as does every child being lost;
+        # either way there's nothing to select, and NO_NODE says so
+        if flags[child] & FLAG_PROVEN_WIN:
+            return NO_NODE
+        if flags[child] & FLAG_PROVEN_LOSS:
+            lost += 1
+        elif unvisited == NO_NODE and visits[child] == 0:
+            unvisited = child
+    if lost == end - start:
+        return NO_NODE
+    # Unvisited children come first, and need no UCB
+    if unvisited != NO_NODE:
+        return unvisited
+    # child_ucb, with the log done once for the block
+    scale = constant * math.sqrt(math.log(max(visits[index], 1)))
+    best = start
+    best_ucb = -np.inf
+    for child in range(start, end):
+        if flags[child] & FLAG_PROVEN_LOSS:
+            continue
+        count = visits[child] + 1.0
+        ucb = value[child] / count + scale / math.sqrt(count)
+        if ucb > best_ucb:
+            best = child
+            best_ucb = ucb
+    return best
+
+
+@jit(cache=True, nogil=True)
+def select_path(
+    first_child, child_count, flags, visits, value, index, constant, max_depth
+):
+    path = np.empty(max_depth + 1, dtype=np.int64)
+    path[0] = index
+    length = 1
+    node = index
+    # Sampled chance nodes are left for the caller to draw an outcome from
+    while (
+        length <= max_depth and child_count[node] > 0 and not flags[node] & FLAG_SAMPLED
+    ):
+        node = select_child(
+            first_child, child_count, flags, visits, value, node, constant
+        )
+        if node == NO_NODE:
+            # Solved by its children; the caller marks it
+            break
+        path[length] = node
+        length += 1
+        if not flags[node] & FLAG_EXPANDED:
+            break
+    return path[:length]
 
-class NodeStore:
-    def __init__(self, root: Optional["Node"] = None):
-        self.root = root
-
-    def count(self) -> int:
-        if self.root:
-            return self.root.visit_count
-        else:
-            return 0
-
-    def to_disk(self, filename: str):
-        assert self.root
-        LOGGER.info("Saving %d nodes to %s", self.root.visit_count, filename)
-        pickle.dump(self.root, open(filename, "wb"))
-        LOGGER.info("Saved")
-
-    @classmethod
-    def from_disk(cls, filename: str):
-        LOGGER.info("Loading nodes from %s", filename)
-        root = pickle.load(open(filename, "rb"))
-        LOGGER.info("Loaded")
-        return cls(root)
 
+class NodeStore:
+    """Whole tree held as flat, growable arrays indexed by node number.
+
+    Children of a node are always allocated as one contiguous block, so a
+    node's children are ``first_child[i]:first_child[i] + child_count[i]``
+    and the slot of a child in its parent's block is just its offset.
+    Actions are interned into small integer ids, and states are only
+    materialised (from the parent's state) when something asks for them.
+    """
+
+    FIELDS = {
+        "parent": np.int32,
+        "action": np.int32,
+        "first_child": np.int32,
+        "child_count": np.int16,
+        "player_id": np.int8,
+        "flags": np.uint8,
+        "visits": np.int64,
+        "value": np.float64,
+    }
 
-class Node:
     def __init__(
         self,
-        player_id: Optional[int],
-        action: int,
-        state: Optional[GameState],
         game_class: GameType,
-        parent: Optional["Node"],
-        leaf: bool,
+        root_state: Optional[GameState] = None,
+        capacity: int = 1024,
     ):
-        self.action = action
-        self.parent = parent
-        self._player_id = player_id
-        self._state = state
         self.game_class = game_class
-        self.leaf = leaf
-        self._constant = None
-        self.children: OrderedDict[int, "Node"] = OrderedDict()
-        self.child_visit_count: Optional[np.array] = None
-        self.child_value: Optional[np.array] = None
-        self._parent_state = None
-        # self._temp_visit_count = np.zeros(state.max_action_count())
-
-    def add_child(self, action: int, state: Optional[GameState] = None):
-        self.children[action] = Node(
-            player_id=state.player_id if state else None,
-            action=action,
-            state=state,
-            parent=self,
-            game_class=self.game_class,
-            leaf=True,
-        )
-        self.leaf = False
-
-    @property
-    def player_id(self):
-        if self._state:
-            return self._state.player_id
-        else:
-            raise ValueError("State not set")
+        self.size = 0
+        self.capacity = 0
+        self.root = NO_NODE
+        self.action_values: list[Hashable] = []
+        self.action_ids: dict[Hashable, int] = {}
+        self._action_array: Optional[np.ndarray] = None
+        for name, dtype in NodeStore.FIELDS.items():
+            setattr(self, name, np.empty(0, dtype=dtype))
+        self.states = np.empty(0, dtype=object)
+        # Growth stops doubling past this many nodes, if set
+        self.capacity_limit: Optional[int] = None
+        # Child blocks add_outcome moved, as (old start, count, new start)
+        self.moves: list[tuple[int, int, int]] = []
+        self._reserve(capacity)
+        if root_state is not None:
+            self.root = self._allocate(1)
+            self.parent[self.root] = NO_NODE
+            self.action[self.root] = self.action_id(ROOT_ACTION)
+            self.states[self.root] = root_state.copy()
+            self.player_id[self.root] = root_state.player_id
+            # Matches the old RootNode, which started with a single visit
+            self.visits[self.root] = 1
+
+    def _reserve(self, count: int):
+        needed = self.size + count
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, self.capacity * 2)
+        if self.capacity_limit is not None:
+            capacity = max(needed, min(capacity, self.capacity_limit))
+        for name, dtype in NodeStore.FIELDS.items():
+            grown = np.empty(capacity, dtype=dtype)
+            grown[: self.size] = getattr(self, name)[: self.size]
+            setattr(self, name, grown)
+        grown_states = np.empty(capacity, dtype=object)
+        grown_states[: self.size] = self.states[: self.size]
+        self.states = grown_states
+        self.capacity = capacity
+
+    def _allocate(self, count: int) -> int:
+        self._reserve(count)
+        start = self.size
+        end = start + count
+        self.first_child[start:end] = NO_NODE
+        self.child_count[start:end] = 0
+        self.player_id[start:end] = -1
+        self.flags[start:end] = 0
+        self.visits[start:end] = 0
+        self.value[start:end] = 0
+        self.states[start:end] = None
+        self.size = end
+        return start
+
+    def action_id(self, action: Hashable) -> int:
+        action_id = self.action_ids.get(action)
+        if action_id is None:
+            action_id = len(self.action_values)
+            self.action_ids[action] = action_id
+            self.action_values.append(action)
+            self._action_array = None
+        return action_id
 
     @property
-    def action_index(self):
-        # And I don't like this either!
-        return list(self.parent.children.keys()).index(self.action)
+    def action_array(self) -> np.ndarray:
+        """Action values as an object array, so ids map to actions in one take"""
+        if self._action_array is None:
+            # Filled one by one so tuple actions aren't unpacked into a 2d array
+            self._action_array = np.empty(len(self.action_values), dtype=object)
+            for action_id, action in enumerate(self.action_values):
+                self._action_array[action_id] = action
+        return self._action_array
 
-    @property
-    def value_estimate(self):
-        return self.parent.child_value[self.action_index]
+    def count(self) -> int:
+        return self.size
 
-    @value_estimate.setter
-    def value_estimate(self, value):
-        self.parent.child_value[self.action_index] = value
+    @staticmethod
+    def bytes_per_node() -> int:
+        """Bytes of array storage each node takes, counting the state pointer"""
+        return sum(np.dtype(dtype).itemsize for dtype in NodeStore.FIELDS.values()) + (
+            np.dtype(object).itemsize
+        )
 
-    @property
-    def visit_count(self):
-        return self.parent.child_visit_count[self.action_index]
+    def memory_usage(self) -> int:
+        """Bytes allocated for node storage, not counting materialised states"""
+        return sum(
+            getattr(self, name).nbytes for name in NodeStore.FIELDS
+        ) + self.states.nbytes
+
+    def is_expanded(self, index: int) -> bool:
+        return bool(self.flags[index] & FLAG_EXPANDED)
+
+    def children(self, index: int) -> range:
+        start = self.first_child[index]
+        return range(start, start + self.child_count[index])
+
+    def action_value(self, index: int) -> Hashable:
+        return self.action_values[self.action[index]]
+
+    def child_action_array(self, index: int) -> np.ndarray:
+        start = self.first_child[index]
+        return self.action_array[self.action[start : start + self.child_count[index]]]
+
+    def child_actions(self, index: int) -> list[Hashable]:
+        return self.child_action_array(index).tolist()
+
+    def add_children(self, index: int, actions: list[Hashable], chance: bool):
+        count = len(actions)
+        start = self._allocate(count)
+        end = start + count
+        self.parent[start:end] = index
+        self.action[start:end] = [self.action_id(action) for action in actions]
+        if chance:
+            self.flags[start:end] = FLAG_CHANCE
+        if count:
+            self.first_child[index] = start
+            self.child_count[index] = count
+        self.flags[index] |= FLAG_EXPANDED
+
+    def is_sampled(self, index: int) -> bool:
+        return bool(self.flags[index] & FLAG_SAMPLED)
+
+    def add_outcome(self, index: int, action: Hashable, room: int = 1) -> int:
+        """Add one chance outcome to the children of index, returning it
+
+        Children stay one contiguous block, so unless the block has a spare
+        slot after it, it moves to the end of the store with room for that
+        many children. Moving renumbers the other children of index, and is
+        logged in moves so node numbers held elsewhere can follow; see
+        renumber.
+        """
+        start = int(self.first_child[index])
+        count = int(self.child_count[index])
+        end = start + count
+        spare = (
+            count > 0
+            and end < self.size
+            and self.parent[end] == index
+            and self.action[end] == NO_NODE
+        )
+        if not spare:
+            room = max(room, count + 1)
+            moved = self._allocate(room)
+            # Slots past the children are marked as spare for later outcomes
+            self.parent[moved : moved + room] = index
+            self.action[moved : moved + room] = NO_NODE
+            if count:
+                old = np.arange(start, end)
+                new = np.arange(moved, moved + count)
+                for name in NodeStore.FIELDS:
+                    getattr(self, name)[new] = getattr(self, name)[old]
+                self.states[new] = self.states[old]
+                # Grandchildren follow their parents to their new numbers
+                for old_child, new_child in zip(old.tolist(), new.tolist()):
+                    first = self.first_child[new_child]
+                    if self.child_count[new_child] and self.parent[first] == old_child:
+                        self.parent[first : first + self.child_count[new_child]] = (
+                            new_child
+                        )
+                # Leave the old slots as inert leaves nothing points at
+                self.parent[old] = NO_NODE
+                self.first_child[old] = NO_NODE
+                self.child_count[old] = 0
+                self.flags[old] = 0
+                self.states[old] = None
+            self.first_child[index] = moved
+            if count:
+                self.moves.append((start, count, moved))
+            end = moved + count
+        self.action[end] = self.action_id(action)
+        self.flags[end] = FLAG_CHANCE
+        self.child_count[index] = count + 1
+        return end
+
+    def renumber(
+        self, nodes: list[int], since: int = 0, back: bool = False
+    ) -> list[int]:
+        """Numbers nodes have after the moves logged from moves[since] on
+
+        With back, numbers nodes had before those moves instead. Nodes
+        added since have no number before and are left as they are.
+        """
+        moves = self.moves[since:]
+        for old, count, new in reversed(moves) if back else moves:
+            if back:
+                old, new = new, old
+            nodes = [
+                node - old + new if old <= node < old + count else node
+                for node in nodes
+            ]
+        return nodes
+
+    def share_children(self, index: int, other: int, symmetry: int = 0):
+        """Expand index onto the children of other, a transposition of it
+
+        The tree becomes a DAG: both nodes list the same child block, whose
+        parent links keep pointing at other. If other is a symmetric image
+        of index, symmetry is the one taking index's state to other's.
+        """
+        self.first_child[index] = self.first_child[other]
+        self.child_count[index] = self.child_count[other]
+        self.flags[index] = (
+            (int(self.flags[index]) & ~SYMMETRY_MASK)
+            | FLAG_EXPANDED
+            | (symmetry << SYMMETRY_SHIFT)
+        )
 
-    @visit_count.setter
-    def visit_count(self, value):
-        self.parent.child_visit_count[self.action_index] = value
+    def is_proven(self, index: int) -> bool:
+        return bool(self.flags[index] & FLAG_PROVEN)
 
-    @property
-    def parent_node_visit_count(self):
-        if self.parent:
-            return self.parent.visit_count
-        return 1
+    def solve(self, index: int) -> bool:
+        """Mark index proven if its children settle it, returning whether
+        it is proven
 
-    @property
-    def hash(self):
-        if self._state:
-            return self._state.hash()
+        The player choosing at index wins if any child is a proven win for
+        them, and loses if every child is a proven loss. Outcomes are from
+        the view of the player who moved into a node, so this assumes two
+        players.
+        """
+        if self.flags[index] & FLAG_PROVEN:
+            return True
+        count = int(self.child_count[index])
+        if not count:
+            return False
+        start = int(self.first_child[index])
+        flags = self.flags[start : start + count]
+        won = np.flatnonzero(flags & FLAG_PROVEN_WIN)
+        if won.size:
+            chooser = self.player_id[start + won[0]]
+        elif np.all(flags & FLAG_PROVEN_LOSS):
+            chooser = self.player_id[start]
         else:
-            return None
-
-    @property
-    def state(self):
-        if self._state:
-            return self._state
+            return False
+        # Whoever moved into index won if they're the one choosing next, or
+        # if the one choosing next lost
+        if (chooser == self.player_id[index]) == bool(won.size):
+            self.flags[index] |= FLAG_PROVEN_WIN
         else:
-            # Not sure if I'm comfortable this being in a property
-            game = self.game_class.from_state(self._parent_state or self.parent.state)
-            # This is getting too complicated
-            if (self.parent and self.parent.state.next_automated) or self._parent_state:
-                self._state = game.apply_non_player_acts(self.action)
+            self.flags[index] |= FLAG_PROVEN_LOSS
+        return True
+
+    def symmetry(self, index: int) -> int:
+        """Symmetry taking index's state to the orientation of its children"""
+        return (int(self.flags[index]) & SYMMETRY_MASK) >> SYMMETRY_SHIFT
+
+    def child(self, index: int, action: Hashable) -> int:
+        action_id = self.action_ids.get(action)
+        if action_id is None or not self.is_expanded(index):
+            return NO_NODE
+        start = int(self.first_child[index])
+        end = start + int(self.child_count[index])
+        # Blocks are small, where a list search beats numpy's overheads
+        try:
+            return start + self.action[start:end].tolist().index(action_id)
+        except ValueError:
+            return NO_NODE
+
+    def state(self, index: int) -> GameState:
+        state = self.states[index]
+        if state is not None:
+            return state
+        # Walk up to the nearest materialised ancestor, then replay down
+        pending = []
+        while state is None:
+            pending.append(index)
+            index = self.parent[index]
+            state = self.states[index]
+        for index in reversed(pending):
+            game = self.game_class.from_state(state)
+            action = self.action_value(index)
+            if self.flags[index] & FLAG_CHANCE:
+                state = game.apply_non_player_acts(action)
             else:
-                self._state = game.act(self.action)
-            return self._state
-
-    def child_ucb(self, constant):
-        # q = (self.temp_visit_count + self.child_value) / (1 + self.child_visit_count)
-        q = (self.child_value) / (1 + self.child_visit_count)
-        u = np.sqrt(np.log(self.parent_node_visit_count) / (1 + self.child_visit_count))
+                state = game.act(action)
+            self.states[index] = state
+            self.player_id[index] = state.player_id
+        return state
+
+    def child_ucb(self, index: int, constant: float) -> np.ndarray:
+        start = self.first_child[index]
+        end = start + self.child_count[index]
+        child_visits = self.visits[start:end]
+        q = self.value[start:end] / (1 + child_visits)
+        u = constant * np.sqrt(np.log(max(self.visits[index], 1)) / (1 + child_visits))
         return q + u
 
-    def best_pick(self, constant) -> list[int]:
-        ucbs = self.child_ucb(constant)
+    def select_child(self, index: int, constant: float) -> int:
+        """The child selection descends to: the first unvisited one, or
+        else the best by child_ucb, passing over proven losses
+
+        NO_NODE if the children prove index won or lost; see solve.
+        """
+        return select_child(
+            self.first_child,
+            self.child_count,
+            self.flags,
+            self.visits,
+            self.value,
+            index,
+            constant,
+        )
+
+    def select_path(self, index: int, constant: float, max_depth: int) -> list[int]:
+        """Nodes from index down to the first unexpanded, terminal or
+        newly solvable node selection reaches, stopping after max_depth
+        steps"""
+        return select_path(
+            self.first_child,
+            self.child_count,
+            self.flags,
+            self.visits,
+            self.value,
+            index,
+            constant,
+            max_depth,
+        ).tolist()
+
+    def best_child(self, index: int, constant: float) -> int:
+        """The child with the highest child_ucb"""
+        return int(self.first_child[index] + self.child_ucb(index, constant).argmax())
+
+    def ranked_children(self, index: int, constant: float) -> np.ndarray:
+        ucbs = self.child_ucb(index, constant)
         LOGGER.debug("Best pick from: %s", (ucbs.tolist()))
-        # Not sure how fast this list comprehension is
-        # Child value is never set for automated turns - so this shold
-        # still work
-        best_picks = [
-            # I don't like this!
-            list(self.children.keys())[action_idx]
-            for action_idx in np.argsort(ucbs, stable=False)[::-1]
-        ]
-        return best_picks
+        return self.first_child[index] + np.argsort(ucbs, stable=False)[::-1]
 
-    def back_propogate(self, path_to_node: list["Node"], value_d: list[int]):
-        """Propogate the value
+    def back_propogate(self, path_to_node: list[int], value_d: list[float]):
+        """Propogate the value up the path
 
-        Only effects this node if the player_id matches; one tree for both
+        Value is only credited to nodes reached by a player act, and is
+        credited for the player who made that act; one tree for both
         players means that the calculation values belong only to the player
         who made the turn.
 
         Args:
-            value_d (_type_): _description_
-            player_id (_type_): _description_
+            path_to_node (list[int]): Node indices from the search start to the leaf
+            value_d (list[float]): Reward for each player
+        """
+        path = np.array(path_to_node, dtype=np.intp)
+        self.visits[path] += 1
+        credited = path[
+            ((self.flags[path] & FLAG_CHANCE) == 0) & (self.parent[path] != NO_NODE)
+        ]
+        rewards = np.asarray(value_d, dtype=np.float64)
+        self.value[credited] += rewards[self.player_id[credited]]
+
+    def back_propogate_many(
+        self, paths: list[list[int]], values: list[list[float]]
+    ):
+        """back_propogate each path with its value, in one pass
+
+        Paths may share nodes; each visit and reward still counts.
+        """
+        lengths = [len(path) for path in paths]
+        nodes = np.fromiter(
+            (node for path in paths for node in path), dtype=np.intp, count=sum(lengths)
+        )
+        owners = np.repeat(np.arange(len(paths)), lengths)
+        np.add.at(self.visits, nodes, 1)
+        credited = ((self.flags[nodes] & FLAG_CHANCE) == 0) & (
+            self.parent[nodes] != NO_NODE
+        )
+        nodes = nodes[credited]
+        rewards = np.asarray(values, dtype=np.float64)
+        np.add.at(
+            self.value, nodes, rewards[owners[credited], self.player_id[nodes]]
+        )
+
+    def prune(self, keep: int, protected: list[int]) -> tuple["NodeStore", np.ndarray]:
+        """Collapse the least visited subtrees back into leaves
+
+        Expanded nodes lose their children, least visited first, until
+        about keep nodes are left. A collapsed node keeps its own visits and
+        value, and is expanded afresh if search reaches it again. Nodes in
+        protected (say, the current position), and every node on a line
+        down to one, keep their children.
+
+        Returns the compacted store, and an array mapping old node numbers
+        to new ones (NO_NODE for nodes that went).
+        """
+        expanded = np.flatnonzero(self.child_count[: self.size] > 0)
+        expanded = expanded[~self.leading_to(protected)[expanded]]
+        # Descendants have no more visits than their ancestors, so they come
+        # first and collapsing a node frees about child_count more nodes
+        expanded = expanded[np.argsort(self.visits[expanded], kind="stable")]
+        freed = np.cumsum(self.child_count[expanded].astype(np.int64))
+        if self.size > keep:
+            collapse = expanded[: np.searchsorted(freed, self.size - keep) + 1]
+        else:
+            collapse = expanded[:0]
+        self.first_child[collapse] = NO_NODE
+        self.child_count[collapse] = 0
+        self.flags[collapse] &= UNEXPANDED_MASK
+        return self._compact(self.root)
+
+    def leading_to(self, nodes: list[int]) -> np.ndarray:
+        """Mask of nodes, and every node with a line of children down to one
+
+        Transpositions share child blocks, and parent only records the node
+        that first listed a block, so this follows the blocks instead.
+        """
+        marked = np.zeros(self.size, dtype=bool)
+        marked[nodes] = True
+        expanded = np.flatnonzero(self.child_count[: self.size] > 0)
+        while expanded.size:
+            starts = self.first_child[expanded].astype(np.intp)
+            ends = starts + self.child_count[expanded]
+            # Marked nodes before each position, to count those in a block
+            before = np.concatenate(([0], np.cumsum(marked)))
+            lists = before[ends] > before[starts]
+            if not lists.any():
+                break
+            marked[expanded[lists]] = True
+            expanded = expanded[~lists]
+        return marked
+
+    def subtree(self, index: int, max_depth: Optional[int] = None) -> "NodeStore":
+        """Copy the subtree under index into a new, compact store
+
+        The node at index becomes the root of the new store. Nodes are
+        renumbered breadth first, which keeps each child block contiguous.
+        Nodes max_depth below index are copied as unexpanded leaves.
         """
+        store, _ = self._compact(index, max_depth)
+        return store
+
+    def _compact(
+        self, index: int, max_depth: Optional[int] = None
+    ) -> tuple["NodeStore", np.ndarray]:
+        self.state(index)
+        levels = [np.array([index], dtype=np.intp)]
+        # Old index of the node each level's nodes become children of
+        owners = [np.array([NO_NODE], dtype=np.intp)]
+        copied = np.zeros(self.size, dtype=bool)
+        while max_depth is None or len(levels) <= max_depth:
+            frontier = levels[-1]
+            frontier = frontier[self.child_count[frontier] > 0]
+            starts = self.first_child[frontier].astype(np.intp)
+            # Blocks shared by transpositions are copied once, under the
+            # first node that lists them
+            starts, first = np.unique(starts, return_index=True)
+            frontier = frontier[first]
+            fresh = ~copied[starts]
+            starts = starts[fresh]
+            frontier = frontier[fresh]
+            if starts.size == 0:
+                break
+            copied[starts] = True
+            counts = self.child_count[frontier].astype(np.intp)
+            levels.append(_expand_ranges(starts, counts))
+            owners.append(np.repeat(frontier, counts))
+        order = np.concatenate(levels)
+        remap = np.full(self.size, NO_NODE, dtype=np.int32)
+        remap[order] = np.arange(order.size, dtype=np.int32)
+
+        store = NodeStore(self.game_class, capacity=order.size)
+        store.action_values = list(self.action_values)
+        store.action_ids = dict(self.action_ids)
+        store._allocate(order.size)
+        for name in NodeStore.FIELDS:
+            getattr(store, name)[: order.size] = getattr(self, name)[order]
+        store.states[: order.size] = self.states[order]
+        store.parent[1:] = remap[np.concatenate(owners)[1:]]
+        store.parent[0] = NO_NODE
+        has_children = store.first_child[: order.size] != NO_NODE
+        store.first_child[: order.size][has_children] = remap[
+            store.first_child[: order.size][has_children]
+        ]
+        # Nodes on the depth limit lose the children that weren't copied
+        cut = store.first_child[: order.size] == NO_NODE
+        store.child_count[: order.size][cut] = 0
+        store.flags[: order.size][cut & has_children] &= UNEXPANDED_MASK
+        store.root = 0
+        return store, remap
+
+    def merge(self, other: "NodeStore", weight: int = 1):
+        """Add the statistics of other, times weight, into this store
+
+        Nodes are matched by the actions on their path from the root, and
+        nodes only other has are added. Both roots must be the same position.
+        A negative weight takes out statistics other shares with this store.
+        """
+        self.visits[self.root] += weight * other.visits[other.root]
+        self.value[self.root] += weight * other.value[other.root]
+        transform = self.game_class.transform_action
+        # Child blocks of other already merged, the node they went under, and
+        # the symmetry taking their actions to that node's block
+        merged_blocks: dict[int, tuple[int, int]] = {}
+        # Each pair comes with the symmetry taking other's state to this one's,
+        # as either store may share children with symmetric positions
+        pending = deque([(self.root, other.root, 0)])
+        while pending:
+            index, other_index, symmetry = pending.popleft()
+            if other.child_count[other_index] == 0:
+                continue
+            # From other's block, through the two nodes' states
+            symmetry ^= other.symmetry(other_index)
+            start = int(other.first_child[other_index])
+            if start in merged_blocks:
+                # A transposition in other, whose statistics are already in
+                if not self.is_expanded(index):
+                    owner, owner_symmetry = merged_blocks[start]
+                    self.share_children(index, owner, owner_symmetry ^ symmetry)
+                continue
+            count = int(other.child_count[other_index])
+            actions = other.child_actions(other_index)
+            if not self.is_expanded(index):
+                chance = bool(other.flags[start] & FLAG_CHANCE)
+                if symmetry:
+                    actions = [transform(action, symmetry) for action in actions]
+                self.add_children(index, actions, chance)
+                self.flags[index] |= other.flags[other_index] & FLAG_SAMPLED
+            else:
+                symmetry ^= self.symmetry(index)
+                if symmetry:
+                    actions = [transform(action, symmetry) for action in actions]
+            merged_blocks[start] = (index, symmetry)
+            if self.is_sampled(index):
+                # Outcomes only other has drawn yet
+                for action in actions:
+                    if self.child(index, action) == NO_NODE:
+                        self.add_outcome(index, action)
+            first = int(self.first_child[index])
+            if self.child_actions(index) == actions:
+                children = np.arange(first, first + count)
+            else:
+                children = np.array([self.child(index, action) for action in actions])
+            others = np.arange(start, start + count)
+            self.visits[children] += weight * other.visits[others]
+            self.value[children] += weight * other.value[others]
+            unset = self.player_id[children] == -1
+            self.player_id[children[unset]] = other.player_id[others[unset]]
+            # Only children with children of their own need walking
+            walk = other.child_count[others] > 0
+            pending.extend(
+                (child, other_child, symmetry)
+                for child, other_child in zip(
+                    children[walk].tolist(), others[walk].tolist()
+                )
+            )
+
+    def snapshot(self) -> "NodeStore":
+        """Copy of the arrays as they are now, to save while search goes on
+
+        Only the root state is copied; the rest get materialised on demand.
+        """
+        store = NodeStore(self.game_class, capacity=0)
+        store.action_values = list(self.action_values)
+        store.action_ids = dict(self.action_ids)
+        for name in NodeStore.FIELDS:
+            setattr(store, name, getattr(self, name)[: self.size].copy())
+        store.states = np.empty(self.size, dtype=object)
+        store.size = store.capacity = self.size
+        store.root = self.root
+        store.states[store.root] = self.state(self.root).copy()
+        return store
 
-        for node in path_to_node:
-            node.visit_count += 1
-            if node.parent:
-                if not (node.parent.state.next_automated):
-                    node.value_estimate += value_d[node.player_id]
+    def to_disk(self, filename: str):
+        """Write the arrays, chunk by chunk, after a small pickled header
+
+        The file is written beside filename and renamed over it, so a store
+        memory mapped from the old file keeps working.
+        """
+        LOGGER.info("Saving %d nodes to %s", self.size, filename)
+        fields = {}
+        offset = 0
+        for name, dtype in NodeStore.FIELDS.items():
+            fields[name] = (np.dtype(dtype).str, offset)
+            offset += _aligned(self.size * np.dtype(dtype).itemsize)
+        header = pickle.dumps(
+            {
+                "size": self.size,
+                "root": self.root,
+                "root_state": self.state(self.root),
+                "action_values": self.action_values,
+                "fields": fields,
+            }
+        )
+        data_start = _aligned(PREAMBLE.size + len(header))
+        temporary = filename + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(PREAMBLE.pack(MAGIC, STORE_VERSION, len(header)))
+            f.write(header)
+            for name in NodeStore.FIELDS:
+                f.seek(data_start + fields[name][1])
+                array = getattr(self, name)
+                for start in range(0, self.size, CHUNK_NODES):
+                    f.write(array[start : min(start + CHUNK_NODES, self.size)].data)
+            f.truncate(data_start + offset)
+        os.replace(temporary, filename)
+        LOGGER.info("Saved")
 
     @classmethod
-    def init_table(Cls, node_store: NodeStore):
-        pass
+    def from_disk(cls, filename: str, game_class: GameType) -> "NodeStore":
+        """Load a store, memory mapping its arrays so pages load as touched
+
+        Maps are copy on write, so the file itself never changes.
+        """
+        LOGGER.info("Loading nodes from %s", filename)
+        with open(filename, "rb") as f:
+            preamble = f.read(PREAMBLE.size)
+            if len(preamble) < PREAMBLE.size or preamble[: len(MAGIC)] != MAGIC:
+                raise ValueError(
+                    f"{filename} isn't a node store; old pickled stores can be "
+                    "converted with python -m mcts.migrate"
+                )
+            _, version, header_length = PREAMBLE.unpack(preamble)
+            if version != STORE_VERSION:
+                raise ValueError(f"{filename} is a version {version} node store")
+            header = pickle.loads(f.read(header_length))
+        data_start = _aligned(PREAMBLE.size + header_length)
+        size = header["size"]
+        store = cls(game_class, capacity=0)
+        for action in header["action_values"]:
+            store.action_id(action)
+        for name, (dtype, offset) in header["fields"].items():
+            array = np.memmap(
+                filename,
+                dtype=np.dtype(dtype),
+                mode="c",
+                offset=data_start + offset,
+                shape=(size,),
+            )
+            setattr(store, name, array)
+        store.states = np.empty(size, dtype=object)
+        store.size = store.capacity = size
+        store.root = header["root"]
+        store.states[store.root] = header["root_state"]
+        LOGGER.info("Loaded %d nodes", size)
+        return store
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def _expand_ranges(starts: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """Concatenate range(start, start + count) for each start/count pair"""
+    offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return offsets + np.arange(counts.sum(), dtype=np.intp)
 
 
-class RootNode(Node):
-    def __init__(self, state: GameState, game_class: callable):
-        super().__init__(0, 255, state.copy(), game_class, None, True)
-        # You be very careful here - screwing around with any additional
-        # values might screw up reroot. Check first.
-        self._visit_count = 1
-        self._value_estimate = 0
+class Node:
+    """Lightweight handle onto a single node of a NodeStore"""
+
+    __slots__ = ("store", "index")
+
+    def __init__(self, store: NodeStore, index: int):
+        self.store = store
+        self.index = index
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, Node)
+            and self.store is other.store
+            and self.index == other.index
+        )
+
+    def __hash__(self):
+        return hash((id(self.store), self.index))
 
     @property
-    def visit_count(self):
-        return self._visit_count
+    def action(self) -> Hashable:
+        return self.store.action_value(self.index)
 
-    @visit_count.setter
-    def visit_count(self, value):
-        self._visit_count = value
+    @property
+    def parent(self) -> Optional["Node"]:
+        parent = self.store.parent[self.index]
+        if parent == NO_NODE:
+            return None
+        return Node(self.store, int(parent))
+
+    @property
+    def leaf(self) -> bool:
+        return not self.store.is_expanded(self.index)
+
+    @property
+    def children(self) -> "OrderedDict[Hashable, Node]":
+        return OrderedDict(
+            (action, Node(self.store, child))
+            for action, child in zip(
+                self.store.child_actions(self.index), self.store.children(self.index)
+            )
+        )
+
+    @property
+    def child_visit_count(self) -> np.ndarray:
+        start = self.store.first_child[self.index]
+        return self.store.visits[start : start + self.store.child_count[self.index]]
+
+    @property
+    def child_value(self) -> np.ndarray:
+        start = self.store.first_child[self.index]
+        return self.store.value[start : start + self.store.child_count[self.index]]
+
+    @property
+    def player_id(self) -> int:
+        return self.state.player_id
 
     @property
-    def parent_node_visit_count(self):
-        return self.visit_count
+    def action_index(self) -> int:
+        return self.index - int(self.store.first_child[self.store.parent[self.index]])
 
     @property
-    def value_estimate(self):
-        return self._value_estimate
+    def value_estimate(self) -> float:
+        return self.store.value[self.index]
 
     @value_estimate.setter
     def value_estimate(self, value):
-        self._value_estimate = value
+        self.store.value[self.index] = value
+
+    @property
+    def visit_count(self) -> int:
+        return self.store.visits[self.index]
+
+    @visit_count.setter
+    def visit_count(self, value):
+        self.store.visits[self.index] = value
+
+    @property
+    def hash(self):
+        return self.state.hash()
+
+    @property
+    def state(self) -> GameState:
+        return self.store.state(self.index)
+
+    def child_ucb(self, constant) -> np.ndarray:
+        return self.store.child_ucb(self.index, constant)
+
+    def best_pick(self, constant) -> list[Hashable]:
+        ranked = self.store.ranked_children(self.index, constant)
+        actions = self.store.child_action_array(self.index)
+        return actions[ranked - self.store.first_child[self.index]].tolist()
+
+    def back_propogate(self, path_to_node: list[int], value_d: list[float]):
+        self.store.back_propogate(path_to_node, value_d)
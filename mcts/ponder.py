@@ -0,0 +1,96 @@
+import logging
+import threading
+from typing import Hashable, Optional
+import numpy as np
+from game.game_state import GameState
+from mcts.tree import Tree
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Ponderer:
+    """Keeps a Tree searching while the opponent thinks
+
+    start() searches from the opponent's position in a background thread
+    until the next act(). The iterations that went under the move the
+    opponent actually made are taken off the tree's iteration budget, so
+    the reply has the same number of visits behind it as without
+    pondering, but comes sooner. Time budgets aren't shortened.
+
+    The tree mustn't be used elsewhere between start() and act(). Waiting
+    on input releases the GIL, so pondering gets the whole core then.
+    """
+
+    def __init__(self, tree: Tree):
+        self.tree = tree
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Visits when pondering started, to tell what pondering added
+        self._visits_before: Optional[np.ndarray] = None
+        self._store = None
+        # Moves in the store's log when pondering started
+        self._moves_before = 0
+        self.last_pondered = 0
+        self.last_reused = 0
+        self.total_pondered = 0
+        self.total_reused = 0
+
+    def start(self, state: GameState):
+        self.stop()
+        tree = self.tree
+        if tree.unload_after_play:
+            # Drop what the opponent's move can't reach, as act would
+            tree.reroot(*tree.locate(state))
+        self._store = tree.node_store
+        self._visits_before = self._store.visits[: self._store.size].copy()
+        self._moves_before = len(self._store.moves)
+        self.last_pondered = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._ponder, args=(state.copy(),))
+        self._thread.start()
+
+    def _ponder(self, state: GameState):
+        self.last_pondered = self.tree.ponder(state, self._stop)
+        self.total_pondered += self.last_pondered
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def reused_visits(self, state: GameState) -> int:
+        """Visits pondering added to the node for state"""
+        tree = self.tree
+        # Pruning renumbers nodes, so visits can't be compared across it
+        if self._visits_before is None or tree.node_store is not self._store:
+            return 0
+        node = tree.get_node(state)
+        # Sampled outcomes may have moved it since; see NodeStore.add_outcome
+        [old] = tree.node_store.renumber([node], self._moves_before, back=True)
+        before = self._visits_before[old] if old < self._visits_before.size else 0
+        return int(tree.node_store.visits[node] - before)
+
+    def act(self, state: GameState) -> Hashable:
+        """tree.act, less the iterations pondering already ran for state"""
+        self.stop()
+        tree = self.tree
+        reused = 0
+        if tree.iterations is not None:
+            reused = min(self.reused_visits(state), tree.iterations - 1)
+        self._visits_before = None
+        self._store = None
+        if reused:
+            action = tree.act(state, tree.iterations - reused, tree.move_time)
+            LOGGER.info(
+                "Pondered %d iterations, %d under the move played; searched %d more",
+                self.last_pondered,
+                reused,
+                tree.last_iterations,
+            )
+        else:
+            action = tree.act(state)
+        self.last_reused = reused
+        self.total_reused += reused
+        return action
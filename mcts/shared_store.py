@@ -0,0 +1,280 @@
+import logging
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+from typing import Hashable, Optional
+import numpy as np
+from game.game import GameType
+from game.game_state import GameState
+from mcts.node import (
+    FLAG_CHANCE,
+    FLAG_EXPANDED,
+    NO_NODE,
+    ROOT_ACTION,
+    SYMMETRY_MASK,
+    NodeStore,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+# size, root
+HEADER_FIELDS = 2
+
+
+def _layout(capacity: int) -> tuple[dict[str, int], int]:
+    offsets = {}
+    offset = HEADER_FIELDS * np.dtype(np.int64).itemsize
+    for name, dtype in NodeStore.FIELDS.items():
+        offsets[name] = offset
+        nbytes = capacity * np.dtype(dtype).itemsize
+        # Keep every array 8 byte aligned
+        offset += (nbytes + 7) // 8 * 8
+    return offsets, offset
+
+
+class SharedNodeStore(NodeStore):
+    """NodeStore whose arrays live in shared memory, for tree parallel search
+
+    Every worker process attaches to the same arrays, so statistics from
+    one worker steer selection in all of them. Capacity is fixed when the
+    store is created; once it is full, leaves stop being expanded.
+
+    States can't be shared, so each process keeps its own lazily filled
+    state cache. For the same reason the action field holds a child's slot
+    in its parent's permitted_actions rather than an interned action id.
+
+    Structural changes and statistics updates are made under one lock.
+    Selection reads without it and uses virtual loss to steer concurrent
+    workers down different paths.
+    """
+
+    def __init__(
+        self,
+        game_class: GameType,
+        root_state: GameState,
+        capacity: int = 1 << 20,
+        virtual_loss: float = 1.0,
+    ):
+        _, nbytes = _layout(capacity)
+        self._shared_memory = shared_memory.SharedMemory(create=True, size=nbytes)
+        self._owner = True
+        self.lock = multiprocessing.Lock()
+        self._attach(game_class, capacity, virtual_loss)
+        self.reset(root_state)
+
+    def _attach(self, game_class: GameType, capacity: int, virtual_loss: float):
+        self.game_class = game_class
+        self.capacity = capacity
+        self.virtual_loss = virtual_loss
+        self._warned_full = False
+        buffer = self._shared_memory.buf
+        self._header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=buffer)
+        offsets, _ = _layout(capacity)
+        for name, dtype in NodeStore.FIELDS.items():
+            setattr(
+                self,
+                name,
+                np.ndarray((capacity,), dtype=dtype, buffer=buffer, offset=offsets[name]),
+            )
+        self.states = np.empty(capacity, dtype=object)
+        self.moves = []
+
+    def __getstate__(self):
+        # Used when worker processes are spawned rather than forked
+        return {
+            "name": self._shared_memory.name,
+            "game_class": self.game_class,
+            "capacity": self.capacity,
+            "virtual_loss": self.virtual_loss,
+            "lock": self.lock,
+            "root_state": self.states[self.root],
+        }
+
+    def __setstate__(self, data):
+        self._shared_memory = shared_memory.SharedMemory(name=data["name"])
+        # Only the creating process should unlink the block
+        resource_tracker.unregister(self._shared_memory._name, "shared_memory")
+        self._owner = False
+        self.lock = data["lock"]
+        self._attach(data["game_class"], data["capacity"], data["virtual_loss"])
+        self.states[self.root] = data["root_state"]
+
+    @property
+    def size(self) -> int:
+        return int(self._header[0])
+
+    @size.setter
+    def size(self, value: int):
+        self._header[0] = value
+
+    @property
+    def root(self) -> int:
+        return int(self._header[1])
+
+    @root.setter
+    def root(self, value: int):
+        self._header[1] = value
+
+    def reset(self, root_state: GameState):
+        """Clear the shared tree down to a new root. Workers must be idle."""
+        with self.lock:
+            self.size = 0
+            self.root = self._allocate(1)
+            self.parent[self.root] = NO_NODE
+            self.action[self.root] = NO_NODE
+            self.player_id[self.root] = root_state.player_id
+            self.visits[self.root] = 1
+        self.reset_states(root_state)
+
+    def reset_states(self, root_state: GameState):
+        """Drop this process's cached states, after the tree was reset"""
+        self.states[:] = None
+        self.states[self.root] = root_state.copy()
+
+    def _reserve(self, count: int):
+        # Capacity is fixed; add_children checks for room before allocating
+        pass
+
+    def action_value(self, index: int) -> Hashable:
+        return self.state(self.parent[index]).permitted_actions[self.action[index]]
+
+    def child_action_array(self, index: int) -> np.ndarray:
+        actions = np.empty(self.child_count[index], dtype=object)
+        if actions.size:
+            for slot, action in enumerate(self.state(index).permitted_actions):
+                actions[slot] = action
+        return actions
+
+    def child(self, index: int, action: Hashable) -> int:
+        if not self.is_expanded(index) or self.child_count[index] == 0:
+            return NO_NODE
+        try:
+            slot = list(self.state(index).permitted_actions).index(action)
+        except ValueError:
+            return NO_NODE
+        return int(self.first_child[index] + slot)
+
+    def add_children(self, index: int, actions: list[Hashable], chance: bool):
+        count = len(actions)
+        with self.lock:
+            # Another worker may have expanded it since we checked
+            if self.flags[index] & FLAG_EXPANDED:
+                return
+            if self.size + count > self.capacity:
+                if not self._warned_full:
+                    LOGGER.warning("Shared tree is full at %d nodes", self.size)
+                    self._warned_full = True
+                return
+            start = self._allocate(count)
+            end = start + count
+            self.parent[start:end] = index
+            self.action[start:end] = np.arange(count)
+            if chance:
+                self.flags[start:end] = FLAG_CHANCE
+            if count:
+                self.first_child[index] = start
+                self.child_count[index] = count
+            # Set last, so other workers never see a half built block
+            self.flags[index] |= FLAG_EXPANDED
+
+    def _credited(self, path: np.ndarray) -> np.ndarray:
+        return path[
+            ((self.flags[path] & FLAG_CHANCE) == 0) & (self.parent[path] != NO_NODE)
+        ]
+
+    def add_virtual_loss(self, path_to_node: list[int]):
+        """Count a visit and a loss on the path until the playout reports back"""
+        path = np.array(path_to_node, dtype=np.intp)
+        credited = self._credited(path)
+        with self.lock:
+            self.visits[path] += 1
+            self.value[credited] -= self.virtual_loss
+
+    def back_propogate(self, path_to_node: list[int], value_d: list[float]):
+        """Replace the virtual loss on the path with the real reward
+
+        The visit was already counted by add_virtual_loss.
+        """
+        path = np.array(path_to_node, dtype=np.intp)
+        credited = self._credited(path)
+        rewards = np.asarray(value_d, dtype=np.float64)
+        with self.lock:
+            self.value[credited] += rewards[self.player_id[credited]] + self.virtual_loss
+
+    def back_propogate_many(
+        self, paths: list[list[int]], values: list[list[float]]
+    ):
+        for path_to_node, value_d in zip(paths, values):
+            self.back_propogate(path_to_node, value_d)
+
+    def snapshot(self) -> NodeStore:
+        """Copy of the tree as an ordinary NodeStore, with actions interned
+
+        States for every expanded node get materialised in this process
+        along the way, to turn child slots back into actions.
+        """
+        with self.lock:
+            size = self.size
+            store = NodeStore(self.game_class, capacity=0)
+            for name in NodeStore.FIELDS:
+                setattr(store, name, getattr(self, name)[:size].copy())
+        store.states = np.empty(size, dtype=object)
+        store.size = store.capacity = size
+        store.root = self.root
+        store.states[store.root] = self.state(self.root).copy()
+        store.action[store.root] = store.action_id(ROOT_ACTION)
+        # Parents are always allocated before their children, so each node's
+        # action is interned before its state is needed
+        for index in np.flatnonzero(store.child_count > 0).tolist():
+            start = int(store.first_child[index])
+            actions = store.state(index).permitted_actions
+            store.action[start : start + len(actions)] = [
+                store.action_id(action) for action in actions
+            ]
+        return store
+
+    def load(self, store: NodeStore):
+        """Replace the tree with a copy of store. Workers must be idle.
+
+        Every child block has to list its parent's permitted_actions in
+        order, as search builds them, since children are found by slot; so
+        stores sharing children between symmetric positions won't do.
+        """
+        size = store.count()
+        if size > self.capacity:
+            raise ValueError(
+                f"{size} nodes don't fit in a shared store of {self.capacity}"
+            )
+        if np.any(store.flags[:size] & SYMMETRY_MASK):
+            raise ValueError("Shared stores can't hold symmetric positions")
+        expanded = np.flatnonzero(store.child_count[:size] > 0).tolist()
+        for index in expanded:
+            if store.child_actions(index) != list(
+                store.state(index).permitted_actions
+            ):
+                raise ValueError(f"Children of node {index} aren't in slot order")
+        with self.lock:
+            for name in NodeStore.FIELDS:
+                getattr(self, name)[:size] = getattr(store, name)[:size]
+            for index in expanded:
+                start = int(store.first_child[index])
+                count = int(store.child_count[index])
+                self.action[start : start + count] = np.arange(count)
+            self.action[store.root] = NO_NODE
+            self.size = size
+            self.root = store.root
+        self.reset_states(store.state(store.root))
+
+    def subtree(self, index: int, max_depth: Optional[int] = None) -> NodeStore:
+        return self.snapshot().subtree(index, max_depth)
+
+    def to_disk(self, filename: str):
+        self.snapshot().to_disk(filename)
+
+    def close(self):
+        # Views onto the buffer have to go before it can be closed
+        self._header = None
+        for name in NodeStore.FIELDS:
+            setattr(self, name, None)
+        self._shared_memory.close()
+        if self._owner:
+            self._shared_memory.unlink()
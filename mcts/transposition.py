@@ -0,0 +1,59 @@
+import numpy as np
+from mcts.node import NO_NODE
+
+# Entries per bucket
+WAYS = 2
+
+
+class TranspositionTable:
+    """Fixed size map from a position's hash to the node expanded for it
+
+    Lets a position reached by a different move order share the children,
+    and so the statistics, of the node first expanded for it. Memory is
+    bounded by the entry count; a full bucket replaces its least visited
+    entry, so well searched positions stay shared the longest. Losing an
+    entry only means the position gets searched again under a new node.
+    """
+
+    def __init__(self, size: int = 1 << 16):
+        buckets = 1 << max(int(np.ceil(np.log2(max(size, WAYS) / WAYS))), 0)
+        self.mask = buckets - 1
+        self.keys = np.zeros((buckets, WAYS), dtype=np.uint64)
+        self.nodes = np.full((buckets, WAYS), NO_NODE, dtype=np.int32)
+        self.hits = 0
+        self.misses = 0
+        self.replacements = 0
+
+    @property
+    def size(self) -> int:
+        return self.nodes.size
+
+    def memory_usage(self) -> int:
+        return self.keys.nbytes + self.nodes.nbytes
+
+    def clear(self):
+        """Forget every entry, for when node numbers change"""
+        self.nodes[:] = NO_NODE
+
+    def lookup(self, key: int) -> int:
+        bucket = key & self.mask
+        for way in range(WAYS):
+            node = int(self.nodes[bucket, way])
+            if node != NO_NODE and int(self.keys[bucket, way]) == key:
+                self.hits += 1
+                return node
+        self.misses += 1
+        return NO_NODE
+
+    def store(self, key: int, node: int, visits: np.ndarray):
+        """Record node for key, using visits to pick what to replace"""
+        bucket = key & self.mask
+        nodes = self.nodes[bucket]
+        empty = np.flatnonzero(nodes == NO_NODE)
+        if empty.size:
+            way = int(empty[0])
+        else:
+            way = int(np.argmin(visits[nodes]))
+            self.replacements += 1
+        self.keys[bucket, way] = key
+        self.nodes[bucket, way] = node
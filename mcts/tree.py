@@ -1,18 +1,51 @@
 from dataclasses import dataclass
 import typing
-from typing import Optional
+from typing import Hashable, Optional
 import os
 import random
+import threading
+import time
 import logging
 import numpy as np
 import game.game_state
 import game.game
 from game.game_state import GameStateType
 from game.game import GameType
-from mcts.node import Node, NodeStore, RootNode
+from mcts.node import (
+    FLAG_EXPANDED,
+    FLAG_PROVEN,
+    FLAG_PROVEN_LOSS,
+    FLAG_PROVEN_WIN,
+    FLAG_SAMPLED,
+    NO_NODE,
+    Node,
+    NodeStore,
+)
+from mcts.metrics import SearchMetrics
+from mcts.transposition import TranspositionTable
 
 LOGGER = logging.getLogger(__name__)
 MAX_SELECTION_DEPTH = 5000
+EARLY_STOP_RULES = ("visits", "confidence")
+# Iterations between checks of the early stopping rule
+EARLY_STOP_INTERVAL = 50
+# Pruning cuts the tree to this fraction of max_nodes, so it doesn't rerun
+# every few iterations
+PRUNE_TO = 0.75
+# Draws tried for an outcome a chance node at max_outcomes already has,
+# before settling for one of them at random
+OUTCOME_DRAWS = 100
+
+
+def settle_scores(rule: str, visits: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Scores the early stop rule ranks children by, given their visits and values
+
+    Visit counts for "visits", mean reward for "confidence" with unvisited
+    children never preferred.
+    """
+    if rule == "confidence":
+        return np.where(visits > 0, values / np.maximum(visits, 1), -np.inf)
+    return visits
 
 
 class Tree:
@@ -22,90 +55,234 @@ class Tree:
         game_state_class: GameStateType,
         game_class: GameType,
         initial_state: game.game_state.GameState,
-        iterations: int = 1000,
+        iterations: Optional[int] = 1000,
         constant: float = 1.4142135623730951,
         reward_model: Optional[callable] = None,
         slow_mode: bool = False,
         unload_after_play: bool = False,
+        playouts: int = 1,
+        move_time: Optional[float] = None,
+        early_stop: Optional[str] = None,
+        early_stop_delta: float = 0.05,
+        transposition_size: int = 0,
+        max_nodes: Optional[int] = None,
+        profile: bool = False,
+        sample_chance: bool = False,
+        max_outcomes: Optional[int] = None,
+        symmetry: bool = False,
+        solver: bool = False,
     ):
+        if iterations is None and move_time is None:
+            raise ValueError("Need an iteration budget, a move time, or both")
+        if early_stop is not None and early_stop not in EARLY_STOP_RULES:
+            raise ValueError(f"Unknown early stop rule {early_stop}")
+        if max_outcomes is not None and (not sample_chance or max_outcomes < 1):
+            raise ValueError("max_outcomes needs sample_chance, and at least 1")
+        if symmetry and not transposition_size:
+            raise ValueError("symmetry shares positions through the transposition table")
+        if solver and initial_state.player_count != 2:
+            raise ValueError("The solver needs a two player game")
         self.filename = filename
         self.constant = constant
         self.iterations = iterations
+        self.move_time = move_time
+        self.early_stop = early_stop
+        self.early_stop_delta = early_stop_delta
+        # Other searchers sharing the tree also use up the remaining budget
+        self.search_workers = 1
+        self.last_iterations = 0
+        self.last_iterations_saved = 0
+        self.total_iterations_saved = 0
         self.player_count = initial_state.player_count
         self.total_iterations = 0
         self.total_select_inspections = 0
         self.slow_mode = slow_mode
         self.unload_after_play = unload_after_play
+        self.playouts = playouts
         self.game_state_class = game_state_class
         self.game_class = game_class
         self.reward_model = reward_model or Tree.RewardModels.reward_model_binary
-        self._actions_unloaded = 0
+        # Compiled playouts score games with the game's own reward model
+        # (binary unless the game has one), so any other needs the Python loop
+        own_model = getattr(
+            game_class, "reward_model", Tree.RewardModels.reward_model_binary
+        )
+        self.compiled_play_out = (
+            game_class.random_play_out if self.reward_model is own_model else None
+        )
+        # Needs states whose hash() is an int, such as a Zobrist hash
+        self.transpositions = (
+            TranspositionTable(transposition_size) if transposition_size else None
+        )
+        # Least visited subtrees are collapsed once the tree grows past this
+        self.max_nodes = max_nodes
+        self.peak_node_count = 0
+        # Per-phase timings, only kept when profiling as they cost a little
+        self.metrics = SearchMetrics() if profile else None
+        # Moves made by playouts, which compiled playouts add to in place
+        self.play_out_moves = np.zeros(1, dtype=np.int64)
+        # Chance nodes draw their outcomes from the game as search reaches
+        # them, instead of getting a child per outcome up front; the tree
+        # keeps at most max_outcomes of them per node, bar ones actually
+        # played
+        self.sample_chance = sample_chance
+        self.max_outcomes = max_outcomes
+        # Positions symmetric to one already expanded share its children,
+        # through the transposition table keyed on GameState.canonical
+        self.symmetry = symmetry
+        # Symmetry taking the game's positions to the root's
+        self.root_symmetry = 0
+        # Won and lost terminal positions are marked proven and the proofs
+        # carried up the tree (MCTS-Solver); search passes proven children
+        # over and stops once the position it's searching is proven
+        self.solver = solver
 
         self.filename = filename
         if filename and os.path.exists(filename):
-            self.node_store = NodeStore.from_disk(filename)
-            self.root = self.node_store.root
+            self._replace_store(NodeStore.from_disk(filename, game_class))
         else:
-            self.root = RootNode(initial_state, game_class)
-            if filename:
-                self.node_store = NodeStore(self.root)
+            self._replace_store(NodeStore(game_class, initial_state))
 
         self.expansion(self.root)
 
-    def new_root(self, state: game.game_state.GameState) -> RootNode:
-        self.root = RootNode(state, self.game_class)
+    @property
+    def root(self) -> int:
+        return self.node_store.root
+
+    def new_root(self, state: game.game_state.GameState) -> int:
+        self._replace_store(NodeStore(self.game_class, state))
+        self.root_symmetry = 0
         self.expansion(self.root)
-        self._actions_unloaded = 0
         return self.root
 
-    def get_node(self, state: game.game_state.GameState) -> Node:
+    def get_node(self, state: game.game_state.GameState) -> int:
+        return self.locate(state)[0]
+
+    def locate(self, state: game.game_state.GameState) -> tuple[int, int]:
+        """The node for state, and the symmetry taking state to its state
+
+        The symmetry is 0 unless the tree shares symmetric positions, when
+        the node may hold a mirror image of state.
+        """
         # Slow for late game
+        store = self.node_store
         node = self.root
-        for action in state.previous_actions[self._actions_unloaded :]:
-            if node.leaf:
-                # Risk with lower iterations
-                return node
-            node = node.children.get(action)
-        return node
-
-    def reroot(self, node):
-        if node is self.root:
+        symmetry = self.root_symmetry
+        # The root isn't necessarily the start of the game
+        played = len(store.state(node).previous_actions)
+        for action in state.previous_actions[played:]:
+            # Intermediate nodes might never have been selected
+            self.expansion(node)
+            symmetry ^= store.symmetry(node)
+            if symmetry:
+                action = self.game_class.transform_action(action, symmetry)
+            child = store.child(node, action)
+            if child == NO_NODE and store.is_sampled(node):
+                # An outcome search never drew
+                child = self._add_outcome(node, action, 1)
+            if child == NO_NODE:
+                raise ValueError(f"Action {action} isn't reachable in the tree")
+            node = child
+        return node, symmetry
+
+    def load(self, filename: str):
+        """Replace the tree with one saved to filename"""
+        self._replace_store(NodeStore.from_disk(filename, self.game_class))
+        self.root_symmetry = 0
+
+    def reroot(self, node: int, symmetry: int = 0):
+        """Make node the root, dropping everything not under it
+
+        symmetry is the one locate gave for node.
+        """
+        self.root_symmetry = symmetry
+        if node == self.root:
             return
         LOGGER.debug("Rerooting")
 
-        visit_count = node.visit_count
-        value_estimate = node.value_estimate
+        # Copying the subtree out lets everything above it be freed
+        self._replace_store(self.node_store.subtree(node))
+
+    def prune(self, node: int) -> int:
+        """Collapse the least visited subtrees to get back under max_nodes
 
-        temp_node = node
-        self._actions_unloaded += 1
-        while temp_node.parent and temp_node.parent is not self.root:
-            self._actions_unloaded += 1
-            temp_node = temp_node.parent
+        The line from the root to node keeps its children. Returns the new
+        number of node.
+        """
+        return int(self._prune([node])[node])
 
-        # Oh - this is _bad_. I should not be doing this.
-        # But... it's also actually kind of elegant, if brittle.
-        node.__class__ = RootNode
-        # OK - dragons are passed by.
-        node.visit_count = visit_count
-        # parent_node_visit_count is set by visit_count too
-        node._value_estimate = value_estimate
-        if node.parent:
-            node._parent_state = node.parent.state
-        node.parent = None
+    def _prune(self, nodes: list[int]) -> np.ndarray:
+        # Returns the map from old node numbers to new ones
+        store = self.node_store
+        self.peak_node_count = max(self.peak_node_count, store.count())
+        started = time.perf_counter()
+        pruned, remap = store.prune(int(self.max_nodes * PRUNE_TO), nodes)
+        self._replace_store(pruned)
+        LOGGER.info(
+            "Pruned tree from %d to %d nodes in %.3fs",
+            store.count(),
+            pruned.count(),
+            time.perf_counter() - started,
+        )
+        return remap
 
-        self.root = node
+    def _replace_store(self, store: NodeStore):
+        if self.max_nodes is not None:
+            # Room for the expansion that takes the tree over budget
+            store.capacity_limit = self.max_nodes + self.game_class.max_action_count()
+        self.node_store = store
+        # Entries hold node numbers, which the new store doesn't keep
+        if self.transpositions is not None:
+            self.transpositions.clear()
 
     def _process_turn(
-        self, current_action_node: Node, state: game.game_state.GameState
+        self,
+        current_action_node: int,
+        state: game.game_state.GameState,
+        iterations: Optional[int] = None,
+        move_time: Optional[float] = None,
+        symmetry: int = 0,
     ):
+        """Search from current_action_node until the first budget runs out
+
+        If neither budget is given, the tree's own are used. At least one
+        iteration always runs, unless the solver has already proven
+        current_action_node, and the number completed is left in
+        last_iterations. With early_stop set, search also stops once the
+        rule says the best child is settled, and the iterations that
+        would otherwise have run are left in last_iterations_saved; the
+        same goes for the solver proving current_action_node.
+        """
+        if iterations is None and move_time is None:
+            iterations = self.iterations
+            move_time = self.move_time
+        started = time.perf_counter()
+        deadline = None if move_time is None else started + move_time
+
         if self.unload_after_play:
-            self.reroot(current_action_node)
+            self.reroot(current_action_node, symmetry)
+            current_action_node = self.root
 
         self.expansion(current_action_node)
+        # Nothing to decide between, so a single iteration will do
+        forced = self.node_store.child_count[current_action_node] <= 1
 
         iteration = 0
+        self.last_iterations_saved = 0
+        solved = self.solver and self.node_store.is_proven(current_action_node)
+        if solved:
+            # Proven by an earlier search, so none of the budget is needed
+            remaining = self._remaining_iterations(0, iterations, started, deadline)
+            self.last_iterations_saved = remaining
+            self.total_iterations_saved += remaining
 
-        while iteration < self.iterations:
+        while not solved and (
+            iteration == 0
+            or (
+                (iterations is None or iteration < iterations)
+                and (deadline is None or time.perf_counter() < deadline)
+            )
+        ):
             iteration += 1
             self.total_iterations += 1
             LOGGER.debug("---------------------")
@@ -115,61 +292,481 @@ class Tree:
             if len(path_to_selected_node) > 0:
                 node = path_to_selected_node[-1]
                 self.expansion(node)
+                if self.solver:
+                    self.solve(path_to_selected_node)
                 self.play_out(path_to_selected_node)
+            if self.max_nodes is not None and self.node_store.size > self.max_nodes:
+                current_action_node = self.prune(current_action_node)
+            if self.solver and self.node_store.is_proven(current_action_node):
+                remaining = self._remaining_iterations(
+                    iteration, iterations, started, deadline
+                )
+                self.last_iterations_saved = remaining
+                self.total_iterations_saved += remaining
+                LOGGER.info(
+                    "Solved after %d iterations, saving %d", iteration, remaining
+                )
+                break
+            if self.early_stop and (forced or iteration % EARLY_STOP_INTERVAL == 0):
+                remaining = self._remaining_iterations(
+                    iteration, iterations, started, deadline
+                )
+                if forced or self._settled(current_action_node, remaining):
+                    self.last_iterations_saved = remaining
+                    self.total_iterations_saved += remaining
+                    LOGGER.info(
+                        "Stopped early after %d iterations, saving %d",
+                        iteration,
+                        remaining,
+                    )
+                    break
+        self.last_iterations = iteration
+        LOGGER.debug("Searched %d iterations", iteration)
+        return current_action_node
+
+    def _remaining_iterations(
+        self,
+        iteration: int,
+        iterations: Optional[int],
+        started: float,
+        deadline: Optional[float],
+    ) -> int:
+        """Iterations left in the budget, estimated from the rate so far for time"""
+        remaining = []
+        if iterations is not None:
+            remaining.append(iterations - iteration)
+        if deadline is not None:
+            now = time.perf_counter()
+            rate = iteration / max(now - started, 1e-9)
+            remaining.append(int(rate * max(deadline - now, 0)))
+        return min(remaining) * self.search_workers
+
+    def _child_means(self, node: int) -> tuple[np.ndarray, np.ndarray]:
+        store = self.node_store
+        start = store.first_child[node]
+        end = start + store.child_count[node]
+        visits = store.visits[start:end]
+        return visits, store.value[start:end] / np.maximum(visits, 1)
+
+    def settled_child(self, node: int) -> int:
+        """Slot of the child the early stop rule protects
+
+        The most visited child for "visits", the best mean reward for
+        "confidence".
+        """
+        return int(np.argmax(self._settle_scores(node)))
+
+    def _settle_scores(self, node: int) -> np.ndarray:
+        store = self.node_store
+        start = store.first_child[node]
+        end = start + store.child_count[node]
+        return settle_scores(
+            self.early_stop, store.visits[start:end], store.value[start:end]
+        )
+
+    def _settled(self, node: int, remaining: int) -> bool:
+        visits, means = self._child_means(node)
+        if self.early_stop == "visits":
+            # The runner up can't catch the leader even if it gets every
+            # remaining iteration
+            runner_up, leader = np.partition(visits, -2)[-2:]
+            return leader - runner_up > remaining
+        # Hoeffding bounds on each child's mean reward, which lies in [-1, 1]
+        radius = np.sqrt(2 * np.log(2 / self.early_stop_delta) / np.maximum(visits, 1))
+        radius[visits == 0] = np.inf
+        best = self.settled_child(node)
+        upper = means + radius
+        upper[best] = -np.inf
+        return means[best] - radius[best] > upper.max()
+
+    def act(
+        self,
+        state: game.game_state.GameState,
+        iterations: Optional[int] = None,
+        move_time: Optional[float] = None,
+    ) -> Hashable:
+        current_action_node, symmetry = self.locate(state)
+        current_action_node = self._process_turn(
+            current_action_node, state, iterations, move_time, symmetry
+        )
+
+        return self._best_action(current_action_node, symmetry)
+
+    def ponder(
+        self, state: game.game_state.GameState, stop: threading.Event
+    ) -> int:
+        """Search from state until stop is set, returning the iterations run
+
+        For searching on the opponent's time; see mcts.ponder.
+        """
+        node = self.get_node(state)
+        self.expansion(node)
+        if self.node_store.state(node).winner != -1:
+            return 0
+        iteration = 0
+        while not stop.is_set():
+            if self.solver and self.node_store.is_proven(node):
+                break
+            iteration += 1
+            self.total_iterations += 1
+            path_to_selected_node = self.selection(node)
+            self.expansion(path_to_selected_node[-1])
+            if self.solver:
+                self.solve(path_to_selected_node)
+            self.play_out(path_to_selected_node)
+            if self.max_nodes is not None and self.node_store.size > self.max_nodes:
+                node = self.prune(node)
+        return iteration
+
+    def _best_action(self, node: int, symmetry: int = 0) -> Hashable:
+        store = self.node_store
+        if self.early_stop:
+            # Pick by the same measure the stop rule settled on
+            scores = self._settle_scores(node)
+        else:
+            scores = store.child_ucb(node, self.constant)
+        if self.solver:
+            scores = self._solver_scores(node, scores)
+        action = store.child_actions(node)[int(np.argmax(scores))]
+        # Back from the orientation of node's children to the game's
+        symmetry ^= store.symmetry(node)
+        if symmetry:
+            return self.game_class.transform_action(action, symmetry)
+        return action
+
+    def _solver_scores(self, node: int, scores: np.ndarray) -> np.ndarray:
+        # A proven win beats anything; proven losses are only played when
+        # there's nothing else, and then by the usual measure
+        start = self.node_store.first_child[node]
+        flags = self.node_store.flags[start : start + len(scores)]
+        won = (flags & FLAG_PROVEN_WIN) != 0
+        if won.any():
+            return won
+        lost = (flags & FLAG_PROVEN_LOSS) != 0
+        if lost.all():
+            return scores
+        return np.where(lost, -np.inf, scores)
+
+    def act_many(
+        self,
+        states: list[game.game_state.GameState],
+        iterations: Optional[int] = None,
+        move_time: Optional[float] = None,
+    ) -> list[Hashable]:
+        """Pick an action for each of several positions, searched together
 
-    def act(self, state: game.game_state.GameState) -> int:
-        current_action_node = self.get_node(state)
-        self._process_turn(current_action_node, state)
+        Every position is searched in this one tree, so positions along
+        the same line share statistics and repeated positions are searched
+        once. Iterations go round robin: each round selects a leaf under
+        every position still searching, then plays them all out and backs
+        the rewards up in one batch. Budgets are per position, as for act,
+        except move_time, which bounds the whole batch. The tree is never
+        rerooted, so every state must follow on from the root.
+        """
+        if iterations is None and move_time is None:
+            iterations = self.iterations
+            move_time = self.move_time
+        started = time.perf_counter()
+        deadline = None if move_time is None else started + move_time
 
-        best_pick = current_action_node.best_pick(self.constant)
-        return best_pick[0]
+        # Drawing an outcome under one position can move the node of
+        # another (see NodeStore.add_outcome), so node numbers held across
+        # locating and selection are renumbered through the store's moves
+        since = len(self.node_store.moves)
+        located = [self.locate(state) for state in states]
+        nodes = self.node_store.renumber([node for node, _ in located], since)
+        symmetries = [symmetry for _, symmetry in located]
+        searching = list(dict.fromkeys(nodes))
+        for node in searching:
+            self.expansion(node)
+        # Nothing to decide between, so a single iteration will do
+        forced = {
+            node for node in searching if self.node_store.child_count[node] <= 1
+        }
+
+        iteration = 0
+        searched = 0
+        self.last_iterations_saved = 0
+        while searching and (
+            iteration == 0
+            or (
+                (iterations is None or iteration < iterations)
+                and (deadline is None or time.perf_counter() < deadline)
+            )
+        ):
+            iteration += 1
+            store = self.node_store
+            since = len(store.moves)
+            paths = [
+                self.selection(store.renumber([node], since)[0]) for node in searching
+            ]
+            if len(store.moves) > since:
+                paths = [store.renumber(path, since) for path in paths]
+                nodes = store.renumber(nodes, since)
+                searching = store.renumber(searching, since)
+                forced = set(store.renumber(list(forced), since))
+            for path in paths:
+                self.expansion(path[-1])
+                if self.solver:
+                    self.solve(path)
+            rewards = [self.simulation(path[-1]) for path in paths]
+            if self.metrics is None:
+                self.node_store.back_propogate_many(paths, rewards)
+            else:
+                backing_up = time.perf_counter()
+                self.node_store.back_propogate_many(paths, rewards)
+                self.metrics.add("backprop", time.perf_counter() - backing_up)
+            searched += len(paths)
+            self.total_iterations += len(paths)
+            if self.max_nodes is not None and self.node_store.size > self.max_nodes:
+                remap = self._prune(nodes)
+                nodes = [int(remap[node]) for node in nodes]
+                searching = [int(remap[node]) for node in searching]
+                forced = {int(remap[node]) for node in forced}
+            if self.solver:
+                # Pruning replaces the store, so not the one bound above
+                solved = [
+                    node for node in searching if self.node_store.is_proven(node)
+                ]
+                if solved:
+                    remaining = self._remaining_iterations(
+                        iteration, iterations, started, deadline
+                    )
+                for node in solved:
+                    searching.remove(node)
+                    self.last_iterations_saved += remaining
+                    self.total_iterations_saved += remaining
+            if self.early_stop and (forced or iteration % EARLY_STOP_INTERVAL == 0):
+                remaining = self._remaining_iterations(
+                    iteration, iterations, started, deadline
+                )
+                settled = [
+                    node
+                    for node in searching
+                    if node in forced
+                    or (
+                        iteration % EARLY_STOP_INTERVAL == 0
+                        and self._settled(node, remaining)
+                    )
+                ]
+                forced.clear()
+                for node in settled:
+                    searching.remove(node)
+                    self.last_iterations_saved += remaining
+                    self.total_iterations_saved += remaining
+        self.last_iterations = searched
+        LOGGER.debug("Searched %d iterations over %d positions", searched, len(nodes))
+        return [
+            self._best_action(node, symmetry)
+            for node, symmetry in zip(nodes, symmetries)
+        ]
 
-    def selection(self, node: "Node") -> list["Node"]:
-        LOGGER.debug("Selection checking %s ", str(node.action))
+    def selection(self, node: int) -> list[int]:
+        store = self.node_store
+        LOGGER.debug("Selection checking %d", node)
         self.total_select_inspections += 1
-        path = [node]
+        metrics = self.metrics
+        if metrics is not None:
+            started = time.perf_counter()
+        path = store.select_path(node, self.constant, MAX_SELECTION_DEPTH)
+        leaf = path[-1]
+        while (
+            store.flags[leaf] & FLAG_SAMPLED
+            and store.flags[leaf] & FLAG_EXPANDED
+            and len(path) <= MAX_SELECTION_DEPTH
+        ):
+            leaf = self._sample_outcome(leaf)
+            path.append(leaf)
+            if store.flags[leaf] & FLAG_EXPANDED:
+                path.extend(
+                    store.select_path(
+                        leaf, self.constant, MAX_SELECTION_DEPTH + 1 - len(path)
+                    )[1:]
+                )
+                leaf = path[-1]
+        if metrics is not None:
+            metrics.add("selection", time.perf_counter() - started)
+            metrics.selection_steps += len(path) - 1
         if self.slow_mode:
             backtrace_node = node
-            while backtrace_node.parent:
-                backtrace_node = backtrace_node.parent
+            while store.parent[backtrace_node] != NO_NODE:
+                backtrace_node = int(store.parent[backtrace_node])
                 path.insert(0, backtrace_node)
-        for _ in range(MAX_SELECTION_DEPTH):
-            order = node.best_pick(self.constant)
-            for action in order:
-                node_to_check = node.children.get(action)
-                if node_to_check:
-                    if node_to_check.leaf:
-                        path.append(node_to_check)
-                        return path
-                    else:
-                        node = node_to_check
-                        path.append(node)
-                        break
-        LOGGER.warning("Failed to select within MAX_SELECTION_DEPTH")
+        leaf = path[-1]
+        if (
+            store.child_count[leaf] > 0
+            and store.flags[leaf] & FLAG_EXPANDED
+            # Unless its children settle it, for the solver to mark
+            and store.select_child(leaf, self.constant) != NO_NODE
+        ):
+            LOGGER.warning("Failed to select within MAX_SELECTION_DEPTH")
         return path
 
-    def expansion(self, node: "Node"):
+    def _sample_outcome(self, node: int) -> int:
+        """Child of chance node for an outcome the game draws, added if new
+
+        Once the node has max_outcomes children, draws are repeated until
+        they give one of those, so each is still taken with the odds the
+        game gives it.
+        """
+        store = self.node_store
+        state = self._state(node)
+        count = int(store.child_count[node])
+        first = int(store.first_child[node])
+        if self.max_outcomes is not None and count >= self.max_outcomes:
+            outcomes = store.child_actions(node)
+            for _ in range(OUTCOME_DRAWS):
+                outcome = self.game_class.sample_non_player_act(state)
+                if outcome in outcomes:
+                    return first + outcomes.index(outcome)
+            return first + random.randrange(count)
+        outcome = self.game_class.sample_non_player_act(state)
+        child = store.child(node, outcome)
+        if child != NO_NODE:
+            return child
+        # Room for twice as many, so blocks move a logarithmic number of times
+        return self._add_outcome(node, outcome, max(2 * count, 1))
+
+    def _add_outcome(self, node: int, action: Hashable, room: int) -> int:
+        store = self.node_store
+        outcomes = len(store.state(node).permitted_actions)
+        if self.max_outcomes is not None:
+            outcomes = min(outcomes, self.max_outcomes)
+        return store.add_outcome(node, action, min(room, outcomes))
+
+    def solve(self, path: list[int]):
+        """Carry a proof at the end of path up it, as far as it goes
+
+        The end of the path is proven if it's a won or lost terminal
+        position, or if selection stopped there because its children
+        settle it.
+        """
+        store = self.node_store
+        leaf = path[-1]
+        # A leaf just expanded with fresh children has nothing to prove yet,
+        # which is nearly every iteration
+        if not store.flags[leaf] & FLAG_PROVEN and not store.visits[leaf]:
+            return
+        for node in reversed(path):
+            if not store.solve(node):
+                break
+
+    def expansion(self, node: int):
         # Create nodes for all legal actions
         LOGGER.debug("## Expansion")
-        LOGGER.debug("Expanding node %s", str(node.action))
-        state = node.state
-        if node.child_visit_count is None:
-            node.child_visit_count = np.zeros(len(state.permitted_actions))
-        if node.child_value is None:
-            node.child_value = np.zeros(len(state.permitted_actions))
-        for action in state.permitted_actions:
-            if action in node.children:
-                continue
-            node.add_child(action)
-
-        node.leaf = False
-
-    def play_out(self, path_to_node: list["Node"]):
+        store = self.node_store
+        if store.flags[node] & FLAG_EXPANDED:
+            return
+        LOGGER.debug("Expanding node %d", node)
+        state = self._state(node)
+        if self.metrics is None:
+            self._expand(node, state)
+        else:
+            started = time.perf_counter()
+            self._expand(node, state)
+            self.metrics.add("expansion", time.perf_counter() - started)
+
+    def _expand(self, node: int, state: game.game_state.GameState):
+        store = self.node_store
+        if state.winner != -1:
+            store.add_children(node, [], False)
+            if self.solver and state.winner >= 0:
+                won = state.winner == state.player_id
+                store.flags[node] |= FLAG_PROVEN_WIN if won else FLAG_PROVEN_LOSS
+            return
+        if self.sample_chance and state.next_automated:
+            # Outcomes are added as they're drawn; a chance node's block
+            # moves as it grows, so it isn't shared with transpositions
+            store.flags[node] |= FLAG_EXPANDED | FLAG_SAMPLED
+            return
+        if self.transpositions is not None:
+            if self.symmetry:
+                key, symmetry = state.canonical()
+            else:
+                key, symmetry = state.hash(), 0
+            known = self.transpositions.lookup(key)
+            if known != NO_NODE:
+                LOGGER.debug("Node %d is a transposition of %d", node, known)
+                if self.symmetry:
+                    # Through the canonical orientation, to known's
+                    symmetry ^= store.state(known).canonical()[1]
+                store.share_children(node, known, symmetry)
+                # Same position, same mover, so the same proof
+                store.flags[node] |= store.flags[known] & FLAG_PROVEN
+                return
+        store.add_children(node, state.permitted_actions, state.next_automated)
+        parent = int(store.parent[node])
+        # Outcomes of a sampled chance node are renumbered when its block
+        # moves (see NodeStore.add_outcome), which would leave the entry
+        # pointing at an empty slot; they can still share others' children
+        if self.transpositions is not None and not (
+            parent != NO_NODE and store.is_sampled(parent)
+        ):
+            self.transpositions.store(key, node, store.visits)
+
+    def play_out(self, path_to_node: list[int]):
         LOGGER.debug("## Play Out")
-        node = path_to_node[-1]
-        state = node.state
+        reward = self.simulation(path_to_node[-1])
+        if self.metrics is None:
+            self.node_store.back_propogate(path_to_node, reward)
+        else:
+            started = time.perf_counter()
+            self.node_store.back_propogate(path_to_node, reward)
+            self.metrics.add("backprop", time.perf_counter() - started)
+
+    def _state(self, node: int) -> game.game_state.GameState:
+        # The node's state, timed as materialization when profiling; states
+        # already cached cost nothing to speak of, so aren't counted
+        if self.metrics is None or self.node_store.states[node] is not None:
+            return self.node_store.state(node)
+        started = time.perf_counter()
+        state = self.node_store.state(node)
+        self.metrics.add("state", time.perf_counter() - started)
+        return state
+
+    def simulation(self, node: int) -> list[float]:
+        """Reward for each player from playing out node"""
+        state = self._state(node)
+        if state.winner != -1:
+            return self.reward_model(state)
+        if self.solver and self.node_store.is_proven(node):
+            return self._proven_reward(node)
+        metrics = self.metrics
+        if metrics is None:
+            return self._simulate(state)
+        started = time.perf_counter()
+        moves = int(self.play_out_moves[0])
+        reward = self._simulate(state)
+        metrics.add("playout", time.perf_counter() - started)
+        metrics.playouts += self.playouts
+        metrics.playout_moves += int(self.play_out_moves[0]) - moves
+        return reward
+
+    def _proven_reward(self, node: int) -> list[float]:
+        # As reward_model_binary would give for the end the proof reaches
+        mover = int(self.node_store.player_id[node])
+        winner = mover if self.node_store.flags[node] & FLAG_PROVEN_WIN else 1 - mover
+        reward = [-1] * self.player_count
+        reward[winner] = 1
+        return reward
+
+    def _simulate(self, state: game.game_state.GameState) -> list[float]:
+        if self.compiled_play_out is not None:
+            # Compiled playouts - the whole game runs without returning here
+            if self.metrics is None:
+                return self.compiled_play_out(state, self.playouts)
+            return self.compiled_play_out(state, self.playouts, self.play_out_moves)
+        if self.playouts == 1:
+            return self.random_play_out(state)
+        return np.mean(
+            [self.random_play_out(state) for _ in range(self.playouts)], axis=0
+        )
+
+    def random_play_out(self, state: game.game_state.GameState) -> list[float]:
         game = self.game_class.from_state(state)
+        moves = 0
         while state.winner == -1:
+            moves += 1
             # TODO: Generalize Action Selection so can make not just random
             action = random.choice(state.permitted_actions)
             LOGGER.debug("Action: %s", str(action))
@@ -177,18 +774,17 @@ class Tree:
                 state = game.apply_non_player_acts(action)
             else:
                 state = game.act(action)
+        self.play_out_moves[0] += moves
+        return self.reward_model(state)
 
-        reward = self.reward_model(state)
-        node.leaf = False
-        node.back_propogate(path_to_node, reward)
-
-    def node_count(self):
-        # Creates a new conn, because it's not thread safe
+    def node_count(self, peak: bool = False) -> int:
+        """Nodes in the tree now, or the most it has held if peak is set"""
+        if peak:
+            return max(self.peak_node_count, self.node_store.count())
         return self.node_store.count()
 
     def to_disk(self):
         if self.filename:
-
             self.node_store.to_disk(self.filename)
 
     def close(self):
@@ -8,14 +8,20 @@ import threading
 import time
 import gc
 import os
-from typing import NamedTuple, Optional
+from typing import Callable, NamedTuple, Optional
+import functools
+import multiprocessing
 import json
+import numpy as np
+import c4.bitboard
 import c4.game
 import c4.human_play
-from game.game import GameType
+from game.game import Game, GameType
 from game.game_state import GameState
 import nt.game
 import nt.human_play
+import mcts.metrics
+import mcts.node
 import mcts.tree
 import mcts.multi_tree
 
@@ -35,6 +41,143 @@ def save_report(folder, actions: list[ActionLog]):
         json.dump(actions, f)
 
 
+# Upper bounds of the move latency histogram buckets, in seconds
+LATENCY_BUCKETS = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10]
+
+
+def log_latency_histogram(latencies: list[float]):
+    if not latencies:
+        return
+    counts = np.histogram(latencies, bins=[0] + LATENCY_BUCKETS + [np.inf])[0]
+    LOGGER.info(
+        "Move latency over %d moves: p50 %.4fs, p90 %.4fs, p99 %.4fs, max %.4fs",
+        len(latencies),
+        *np.percentile(latencies, [50, 90, 99]),
+        max(latencies),
+    )
+    for upper, count in zip(LATENCY_BUCKETS + [np.inf], counts):
+        if count:
+            LOGGER.info("  <%8ss: %d", upper, count)
+
+
+class Checkpointer:
+    """Saves the tree every so many episodes and/or seconds
+
+    For a Tree, only copying the node arrays pauses the caller; the copy is
+    written out from a background thread while search carries on. Other
+    trees are saved inline. Saves are atomic, as NodeStore.to_disk writes
+    to a temporary file and renames it.
+    """
+
+    def __init__(
+        self,
+        tree: mcts.tree.Tree,
+        every_episodes: Optional[int] = 10,
+        every_seconds: Optional[float] = None,
+    ):
+        self.tree = tree
+        self.every_episodes = every_episodes
+        self.every_seconds = every_seconds
+        self.last_saved = time.perf_counter()
+        self.saves = 0
+        # Seconds the caller was held up, and the whole save took
+        self.last_pause = 0.0
+        self.last_duration = 0.0
+        self._thread: Optional[threading.Thread] = None
+
+    def due(self, episode_no: Optional[int] = None) -> bool:
+        """Whether to save now, after a move or (with episode_no) an episode"""
+        if self.every_seconds is not None and (
+            time.perf_counter() - self.last_saved >= self.every_seconds
+        ):
+            return True
+        return (
+            episode_no is not None
+            and self.every_episodes is not None
+            and episode_no % self.every_episodes == 0
+        )
+
+    def save(self):
+        started = time.perf_counter()
+        self.last_saved = started
+        if self._thread is not None and self._thread.is_alive():
+            LOGGER.warning("Previous checkpoint is still being written; waiting")
+        self.wait()
+        if not isinstance(self.tree, mcts.tree.Tree):
+            self.tree.to_disk()
+            self._finished(started, time.perf_counter() - started)
+            return
+        if not self.tree.filename:
+            return
+        snapshot = self.tree.node_store.snapshot()
+        pause = time.perf_counter() - started
+        self._thread = threading.Thread(
+            target=self._write, args=(snapshot, self.tree.filename, started, pause)
+        )
+        self._thread.start()
+
+    def _write(
+        self, snapshot: mcts.node.NodeStore, filename: str, started: float, pause: float
+    ):
+        snapshot.to_disk(filename)
+        self._finished(started, pause)
+
+    def _finished(self, started: float, pause: float):
+        self.saves += 1
+        self.last_duration = time.perf_counter() - started
+        self.last_pause = pause
+        LOGGER.info(
+            "Checkpoint took %.3fs, pausing search for %.3fs",
+            self.last_duration,
+            self.last_pause,
+        )
+
+    def wait(self):
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def play_episode(
+    tree: mcts.tree.Tree,
+    game_class: GameType,
+    checkpointer: Optional[Checkpointer] = None,
+) -> tuple[Game, list[ActionLog], list[float]]:
+    """Play one self-play game, returning it, its action log and move latencies"""
+    game = game_class()
+    if tree.unload_after_play:
+        tree.new_root(game.state)
+
+    action_log: list[ActionLog] = []
+    latencies: list[float] = []
+    while game.state.winner == -1:
+
+        LOGGER.debug("GC tracked objects: %d, %d, %d", *gc.get_count())
+        LOGGER.debug("Playing Non-Player Act")
+        action, state = game.non_player_act()
+        action_log.append(ActionLog(action, None, state.loggable(), None))
+        LOGGER.debug("Deciding/Playing Turn")
+        time_before = time.perf_counter()
+        action = tree.act(game.state)
+        latency = time.perf_counter() - time_before
+        latencies.append(latency)
+        LOGGER.info(
+            "Player %d: %s (%fs, %d iterations, %d saved)",
+            game.state.next_player_id,
+            str(action),
+            latency,
+            tree.last_iterations,
+            tree.last_iterations_saved,
+        )
+        game.act(action)
+        action_log.append(
+            ActionLog(action, game.state.last_player_id, state.loggable(), None)
+        )
+        if checkpointer is not None and checkpointer.due():
+            checkpointer.save()
+    return game, action_log, latencies
+
+
 def train(
     filename,
     tree: mcts.tree.Tree,
@@ -42,51 +185,204 @@ def train(
     episodes: int,
     use_speedo: bool,
     report_folder=Optional[str],
+    checkpointer: Optional[Checkpointer] = None,
 ):
+    checkpointer = checkpointer or Checkpointer(tree)
     if use_speedo:
         stop_event = threading.Event()
-        speedo_thread = threading.Thread(target=speedo, args=(tree, stop_event))
+        speedo_thread = threading.Thread(
+            target=speedo, args=(tree, stop_event, checkpointer)
+        )
         speedo_thread.start()
+    latencies: list[float] = []
     try:
         for episode_no in range(episodes):
-            game = game_class()
-            if tree.unload_after_play:
-                tree.new_root(game.state)
-
             LOGGER.info("Episode %d", episode_no)
-            action_log: list[ActionLog] = []
-            while game.state.winner == -1:
-
-                LOGGER.debug("GC tracked objects: %d, %d, %d", *gc.get_count())
-                LOGGER.debug("Playing Non-Player Act")
-                action, state = game.non_player_act()
-                action_log.append(ActionLog(action, None, state.loggable(), None))
-                LOGGER.debug("Deciding/Playing Turn")
-                time_before = time.process_time()
-                action = tree.act(game.state)
-                LOGGER.info(
-                    "Player %d: %s (%fs)",
-                    game.state.next_player_id,
-                    str(action),
-                    time.process_time() - time_before,
-                )
-                game.act(action)
-                action_log.append(
-                    ActionLog(action, game.state.last_player_id, state.loggable(), None)
-                )
+            game, action_log, episode_latencies = play_episode(
+                tree, game_class, checkpointer
+            )
+            latencies.extend(episode_latencies)
 
             if report_folder:
                 save_report(report_folder, action_log)
 
             LOGGER.info("Winner: %d", game.state.winner)
             if episode_no % 10 == 0 or episode_no == episodes - 1:
-                tree.to_disk()
+                log_latency_histogram(latencies)
+            if checkpointer.due(episode_no) or episode_no == episodes - 1:
+                checkpointer.save()
     finally:
+        checkpointer.wait()
         if use_speedo:
             stop_event.set()
 
 
-def speedo(tree: mcts.tree.Tree, stop_event: threading.Event):
+def self_play_worker(
+    worker_id: int,
+    make_tree: Callable[[], mcts.tree.Tree],
+    game_class: GameType,
+    inbox: multiprocessing.Queue,
+    results: multiprocessing.Queue,
+):
+    """Plays the episodes parallel_train sends it, each on its own tree"""
+    tree = make_tree()
+    while True:
+        message, payload = inbox.get()
+        if message == "episode":
+            game, action_log, latencies = play_episode(tree, game_class)
+            results.put(
+                (
+                    "episode",
+                    worker_id,
+                    (payload, game.state.winner, action_log, latencies),
+                )
+            )
+        elif message == "snapshot":
+            snapshot = tree.node_store.subtree(tree.root)
+            # States are rebuilt on demand, so only the root's needs sending
+            snapshot.states[1:] = None
+            results.put(("snapshot", worker_id, snapshot))
+        elif message == "load":
+            tree.load(payload)
+        elif message == "stop":
+            break
+
+
+def parallel_train(
+    filename: Optional[str],
+    make_tree: Callable[[], mcts.tree.Tree],
+    game_class: GameType,
+    episodes: int,
+    parallel_games: int,
+    report_folder: Optional[str],
+    checkpoint_episodes: int = 10,
+    checkpoint_seconds: Optional[float] = None,
+):
+    """Train by playing parallel_games self-play games at once
+
+    Each game runs in its own process with its own tree; move logs come
+    straight from the workers, and each finished game's action log and
+    latencies come back here. On every checkpoint the workers' trees are
+    merged, saved, and loaded back by every worker, so they all carry on
+    from what all of them learned. The saved tree is memory mapped, so
+    workers share its pages until they change them.
+    """
+    inboxes = [multiprocessing.Queue() for _ in range(parallel_games)]
+    results = multiprocessing.Queue()
+    processes = [
+        multiprocessing.Process(
+            target=self_play_worker,
+            args=(worker_id, make_tree, game_class, inbox, results),
+        )
+        for worker_id, inbox in enumerate(inboxes)
+    ]
+    for process in processes:
+        process.start()
+
+    # Workers all start from the saved tree, if there is one
+    base = (
+        mcts.node.NodeStore.from_disk(filename, game_class)
+        if filename and os.path.exists(filename)
+        else None
+    )
+
+    started = time.perf_counter()
+    last_saved = started
+    latencies: list[float] = []
+    finished = 0
+    finished_at_save = 0
+    next_episode = 0
+
+    def send_episode(worker_id: int):
+        nonlocal next_episode
+        if next_episode < episodes:
+            inboxes[worker_id].put(("episode", next_episode))
+            next_episode += 1
+
+    def handle_episode(worker_id: int, payload):
+        nonlocal finished
+        episode_no, winner, action_log, episode_latencies = payload
+        finished += 1
+        latencies.extend(episode_latencies)
+        if report_folder:
+            save_report(report_folder, action_log)
+        LOGGER.info(
+            "Episode %d (worker %d): winner %d after %d moves; %.1f games/hour",
+            episode_no,
+            worker_id,
+            winner,
+            len(episode_latencies),
+            finished * 3600 / (time.perf_counter() - started),
+        )
+        if finished % 10 == 0:
+            log_latency_histogram(latencies)
+
+    def sync():
+        nonlocal base, last_saved, finished_at_save
+        for inbox in inboxes:
+            inbox.put(("snapshot", None))
+        stores = [None] * parallel_games
+        idle = []
+        while len(idle) < parallel_games:
+            kind, worker_id, payload = results.get()
+            if kind == "episode":
+                # Finished before it saw the snapshot request
+                handle_episode(worker_id, payload)
+                continue
+            stores[worker_id] = payload
+            idle.append(worker_id)
+        merging = time.perf_counter()
+        merged = stores[0]
+        for store in stores[1:]:
+            merged.merge(store)
+        if base is not None:
+            # Every worker started from base, so it was counted once per worker
+            merged.merge(base, 1 - parallel_games)
+            unvisited = merged.visits <= 0
+            merged.visits[unvisited] = 0
+            merged.value[unvisited] = 0
+        merged.to_disk(filename)
+        for inbox in inboxes:
+            inbox.put(("load", filename))
+        base = merged
+        finished_at_save = finished
+        last_saved = time.perf_counter()
+        LOGGER.info(
+            "Merged and saved %d nodes in %.3fs",
+            merged.count(),
+            last_saved - merging,
+        )
+        return idle
+
+    try:
+        for worker_id in range(parallel_games):
+            send_episode(worker_id)
+        while finished < episodes:
+            kind, worker_id, payload = results.get()
+            handle_episode(worker_id, payload)
+            if filename and (
+                finished - finished_at_save >= checkpoint_episodes
+                or finished == episodes
+                or (
+                    checkpoint_seconds is not None
+                    and time.perf_counter() - last_saved >= checkpoint_seconds
+                )
+            ):
+                # Workers pick up new episodes once they have the merged tree
+                for idle_worker in sync():
+                    send_episode(idle_worker)
+            else:
+                send_episode(worker_id)
+        log_latency_histogram(latencies)
+    finally:
+        mcts.multi_tree.stop_workers(inboxes, processes)
+
+
+def speedo(
+    tree: mcts.tree.Tree,
+    stop_event: threading.Event,
+    checkpointer: Optional[Checkpointer] = None,
+):
     start_time = time.perf_counter()
     iterations_count = tree.total_iterations
     t_old = start_time
@@ -101,6 +397,20 @@ def speedo(tree: mcts.tree.Tree, stop_event: threading.Event):
         if len(speeds) > 20:
             del speeds[0]
         LOGGER.info("Iterations/second: %f", sum(speeds) / len(speeds))
+        if isinstance(tree, mcts.tree.Tree):
+            node_count = tree.node_count()
+            LOGGER.info(
+                "Nodes: %d (peak %d, %.1f bytes/node)",
+                node_count,
+                tree.node_count(peak=True),
+                tree.node_store.memory_usage() / max(node_count, 1),
+            )
+        if checkpointer is not None and checkpointer.saves:
+            LOGGER.info(
+                "Last checkpoint: %.3fs (search paused %.3fs)",
+                checkpointer.last_duration,
+                checkpointer.last_pause,
+            )
         iterations_count = new_iterations_count
 
         stop_event.wait(2)
@@ -109,7 +419,9 @@ def speedo(tree: mcts.tree.Tree, stop_event: threading.Event):
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("game", choices=["c4", "nt"], help="Game to play/train")
+    parser.add_argument(
+        "game", choices=["c4", "c4-bitboard", "nt"], help="Game to play/train"
+    )
     parser.add_argument(
         "action",
         choices=["play", "train"],
@@ -128,8 +440,84 @@ def main():
         "-i",
         "--iterations",
         type=int,
-        default=100,
-        help="Number of iterations to run per process (default: 100)",
+        help="Number of iterations to run per process (default: 100 if no --move-time)",
+    )
+    parser.add_argument(
+        "-t",
+        "--move-time",
+        type=float,
+        help="Seconds to search per move; stops at whichever of this and --iterations comes first",
+    )
+    parser.add_argument(
+        "-p",
+        "--playouts",
+        type=int,
+        default=1,
+        help="Number of random playouts averaged per selected leaf (default: 1)",
+    )
+    parser.add_argument(
+        "-c",
+        "--constant",
+        type=float,
+        default=2**0.5,
+        help="Exploration constant in the UCB used to select children (default: sqrt 2)",
+    )
+    parser.add_argument(
+        "--early-stop",
+        choices=mcts.tree.EARLY_STOP_RULES,
+        help="Stop searching a move once the best action is settled, by visit "
+        "counts or confidence bounds on value",
+    )
+    parser.add_argument(
+        "--transposition-size",
+        type=int,
+        default=0,
+        help="Entries in the transposition table that lets positions reached "
+        "by different move orders share statistics (default: 0, disabled)",
+    )
+    parser.add_argument(
+        "--symmetry",
+        action="store_true",
+        default=False,
+        help="With --transposition-size, let mirror image positions (c4) share "
+        "statistics too (single job only)",
+    )
+    parser.add_argument(
+        "--solver",
+        action="store_true",
+        default=False,
+        help="Mark won and lost positions proven and stop searching them "
+        "(MCTS-Solver, two player games such as c4; single job only)",
+    )
+    parser.add_argument(
+        "--max-nodes",
+        type=int,
+        help="Collapse the least visited subtrees once a tree grows past this many nodes",
+    )
+    parser.add_argument(
+        "--max-memory-mb",
+        type=float,
+        help="Like --max-nodes, sized so node storage fits in this many MB "
+        "(cached states come on top)",
+    )
+    parser.add_argument(
+        "--sample-chance",
+        action="store_true",
+        default=False,
+        help="Draw chance outcomes (nt card draws) as search reaches them, "
+        "instead of adding a child for every outcome up front (single job only)",
+    )
+    parser.add_argument(
+        "--max-outcomes",
+        type=int,
+        help="With --sample-chance, keep at most this many drawn outcomes per "
+        "chance node",
+    )
+    parser.add_argument(
+        "--save-depth",
+        type=int,
+        help="With parallel jobs, only merge and save each worker's tree to "
+        "this depth (default: whole trees)",
     )
     parser.add_argument(
         "-f",
@@ -137,6 +525,17 @@ def main():
         help="Save/load model from filename",
         nargs="?",
     )
+    parser.add_argument(
+        "--checkpoint-episodes",
+        type=int,
+        default=10,
+        help="Save the tree every this many episodes while training (default: 10)",
+    )
+    parser.add_argument(
+        "--checkpoint-seconds",
+        type=float,
+        help="Also save the tree once this many seconds have passed since the last save",
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -174,6 +573,36 @@ def main():
     parser.add_argument(
         "-j", "--jobs", type=int, default=1, help="Number of parallel processes"
     )
+    parser.add_argument(
+        "--parallel-games",
+        type=int,
+        default=1,
+        help="Number of self-play games to train on at once, each in its own "
+        "process with its own tree, merged on every checkpoint (default: 1)",
+    )
+    parser.add_argument(
+        "--shared-tree",
+        action="store_true",
+        default=False,
+        help="Whether parallel jobs search one shared tree instead of one each",
+    )
+    parser.add_argument(
+        "--ponder",
+        action="store_true",
+        default=False,
+        help="Keep searching while waiting for the human's move (single job only)",
+    )
+    parser.add_argument(
+        "--metrics",
+        help="Time each phase of search and append the totals to this file "
+        "as JSON lines (single job only)",
+    )
+    parser.add_argument(
+        "--metrics-seconds",
+        type=float,
+        default=10.0,
+        help="Seconds between lines written to --metrics (default: 10)",
+    )
     parser.add_argument(
         "-r",
         "--reports",
@@ -183,8 +612,72 @@ def main():
     args = parser.parse_args()
 
     # Ensure that iterations and episodes are set properly based on the action
-    if args.iterations <= 0:
+    if args.iterations is None and args.move_time is None:
+        args.iterations = 100
+    if args.iterations is not None and args.iterations <= 0:
         parser.error("--iterations must be greater than 0 for training.")
+    if args.move_time is not None and args.move_time <= 0:
+        parser.error("--move-time must be greater than 0.")
+    if args.playouts <= 0:
+        parser.error("--playouts must be greater than 0.")
+    if args.constant < 0:
+        parser.error("--constant can't be negative.")
+    if args.transposition_size < 0:
+        parser.error("--transposition-size can't be negative.")
+    if args.max_memory_mb is not None:
+        if args.max_nodes is not None:
+            parser.error("Give only one of --max-nodes and --max-memory-mb.")
+        args.max_nodes = int(
+            args.max_memory_mb * 2**20 / mcts.node.NodeStore.bytes_per_node()
+        )
+    if args.max_nodes is not None and args.max_nodes <= 0:
+        parser.error("--max-nodes and --max-memory-mb must be greater than 0.")
+    if args.transposition_size and args.shared_tree:
+        parser.error("--transposition-size isn't supported with --shared-tree.")
+    if args.symmetry:
+        if not args.transposition_size:
+            parser.error("--symmetry needs --transposition-size.")
+        if args.jobs > 1 or args.force_multitree:
+            parser.error("--symmetry needs a single job tree.")
+    if args.solver:
+        if args.game == "nt":
+            parser.error("--solver needs a two player game.")
+        if args.jobs > 1 or args.force_multitree or args.shared_tree:
+            parser.error("--solver needs a single job tree.")
+    if args.sample_chance and (
+        args.jobs > 1 or args.force_multitree or args.shared_tree
+    ):
+        parser.error("--sample-chance needs a single job tree.")
+    if args.max_outcomes is not None:
+        if not args.sample_chance:
+            parser.error("--max-outcomes needs --sample-chance.")
+        if args.max_outcomes <= 0:
+            parser.error("--max-outcomes must be greater than 0.")
+    if args.save_depth is not None and args.save_depth < 0:
+        parser.error("--save-depth can't be negative.")
+    if args.checkpoint_episodes <= 0:
+        parser.error("--checkpoint-episodes must be greater than 0.")
+    if args.checkpoint_seconds is not None and args.checkpoint_seconds <= 0:
+        parser.error("--checkpoint-seconds must be greater than 0.")
+    if args.ponder and (args.jobs > 1 or args.force_multitree):
+        parser.error("--ponder needs a single job tree.")
+    if args.metrics and (
+        args.jobs > 1 or args.force_multitree or args.parallel_games > 1
+    ):
+        parser.error("--metrics needs a single job tree.")
+    if args.metrics_seconds <= 0:
+        parser.error("--metrics-seconds must be greater than 0.")
+    if args.parallel_games <= 0:
+        parser.error("--parallel-games must be greater than 0.")
+    if args.parallel_games > 1:
+        if args.action != "train":
+            parser.error("--parallel-games is only for training.")
+        if args.jobs > 1 or args.shared_tree or args.force_multitree:
+            parser.error("--parallel-games runs a single job tree per game.")
+        if args.unload_played or args.speedo:
+            parser.error(
+                "--parallel-games doesn't support --unload-played or --speedo."
+            )
     if args.action == "train":
         if args.episodes <= 0:
             parser.error("--episodes must be greater than 0 for training.")
@@ -213,6 +706,11 @@ def main():
         game_class = c4.game.Game
         human_play = c4.human_play.human_play
         game = game_class()
+    elif args.game == "c4-bitboard":
+        state_class = c4.bitboard.BitboardState
+        game_class = c4.bitboard.BitboardGame
+        human_play = c4.human_play.human_play
+        game = game_class()
     elif args.game == "nt":
         state_class = nt.game.NtState
         game_class = nt.game.NtGame
@@ -223,17 +721,62 @@ def main():
         raise ValueError("Unknown game type")
     game = game_class()
 
+    make_tree = functools.partial(
+        mcts.tree.Tree,
+        args.filename,
+        state_class,
+        game_class,
+        game.state,
+        args.iterations,
+        args.constant,
+        reward_model=getattr(game_class, "reward_model", None),
+        slow_mode=args.slow,
+        unload_after_play=args.unload_played,
+        playouts=args.playouts,
+        move_time=args.move_time,
+        early_stop=args.early_stop,
+        transposition_size=args.transposition_size,
+        max_nodes=args.max_nodes,
+        profile=bool(args.metrics),
+        sample_chance=args.sample_chance,
+        max_outcomes=args.max_outcomes,
+        symmetry=args.symmetry,
+        solver=args.solver,
+    )
+    if args.parallel_games > 1:
+        parallel_train(
+            args.filename,
+            make_tree,
+            game_class,
+            args.episodes,
+            args.parallel_games,
+            args.reports,
+            args.checkpoint_episodes,
+            args.checkpoint_seconds,
+        )
+        return
+
+    exporter = None
     try:
         if args.jobs == 1 and not args.force_multitree:
-            tree = mcts.tree.Tree(
+            tree = make_tree()
+        elif args.shared_tree:
+            tree = mcts.multi_tree.SharedMultiTree(
                 args.filename,
                 state_class,
                 game_class,
                 game.state,
                 args.iterations,
+                args.constant,
                 reward_model=getattr(game_class, "reward_model", None),
                 slow_mode=args.slow,
                 unload_after_play=args.unload_played,
+                playouts=args.playouts,
+                move_time=args.move_time,
+                early_stop=args.early_stop,
+                jobs=args.jobs,
+                # The shared tree can't be pruned, so it stops growing instead
+                capacity=args.max_nodes or mcts.multi_tree.SHARED_CAPACITY,
             )
         else:
             tree = mcts.multi_tree.MultiTree(
@@ -242,13 +785,25 @@ def main():
                 game_class,
                 game.state,
                 args.iterations,
+                args.constant,
                 reward_model=getattr(game_class, "reward_model", None),
                 slow_mode=args.slow,
                 unload_after_play=args.unload_played,
+                playouts=args.playouts,
+                move_time=args.move_time,
+                early_stop=args.early_stop,
+                transposition_size=args.transposition_size,
+                max_nodes=args.max_nodes,
+                save_depth=args.save_depth,
                 jobs=args.jobs,
             )
+        if args.metrics:
+            exporter = mcts.metrics.MetricsExporter(
+                tree, args.metrics, args.metrics_seconds
+            )
+            exporter.start()
         if args.action == "play":
-            human_play(game, tree)
+            human_play(game, tree, args.ponder)
         elif args.action == "train":
             train(
                 args.filename,
@@ -257,8 +812,13 @@ def main():
                 args.episodes,
                 args.speedo,
                 args.reports,
+                Checkpointer(
+                    tree, args.checkpoint_episodes, args.checkpoint_seconds
+                ),
             )
     finally:
+        if exporter is not None:
+            exporter.stop()
         tree.close()
 
 
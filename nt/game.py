@@ -1,8 +1,12 @@
-from hashlib import sha256
+import array
+import random
 import typing
 import numpy as np
+from numba import jit
 from game.game import Game
 from game.game_state import GameState
+from game.history import ActionHistory
+from game.zobrist import zobrist_keys
 
 # Basic implementation of a game that might be similar to no-thanks
 
@@ -12,25 +16,143 @@ PLAYER_COUNT = 5
 ACTION_NO_THANKS = 1
 ACTION_TAKE = 2
 
+# Most chips anyone (or the board) can hold
+MAX_CHIPS = 11 * PLAYER_COUNT
+
+# Zobrist keys for each feature of a position; cards are keyed by owner + 1
+ZOBRIST_CARDS = zobrist_keys(36, 36, PLAYER_COUNT + 1)
+ZOBRIST_CARD_ON_BOARD = zobrist_keys(37, 36)
+ZOBRIST_CHIPS = zobrist_keys(38, PLAYER_COUNT, MAX_CHIPS + 1)
+ZOBRIST_CHIPS_ON_BOARD = zobrist_keys(39, MAX_CHIPS + 1)
+ZOBRIST_NEXT_PLAYER = zobrist_keys(40, PLAYER_COUNT)
+ZOBRIST_LAST_PLAYER = zobrist_keys(41, PLAYER_COUNT)
+ZOBRIST_NEXT_AUTOMATED = zobrist_keys(42, 1)[0]
+
+
+# Layout of NtState's buffer. Cards hold 0 in the deck, -1 for cards not in
+# the game, or the owner's player id + 1; a card_on_board of -1 means none.
+CARDS = slice(0, 36)
+CHIPS_START = 36
+CHIPS = slice(CHIPS_START, CHIPS_START + PLAYER_COUNT)
+CHIPS_ON_BOARD = 36 + PLAYER_COUNT
+CARD_ON_BOARD = CHIPS_ON_BOARD + 1
+BUFFER_SIZE = CARD_ON_BOARD + 1
+# Signed bytes; every count fits, as MAX_CHIPS is well under 127. An
+# array.array rather than numpy, as act reads and writes single items, which
+# numpy makes several times slower
+BUFFER_TYPECODE = "b"
+BUFFER_DTYPE = np.int8
+
+EMPTY_BUFFER = array.array(BUFFER_TYPECODE, bytes(BUFFER_SIZE))
+# Technically, only cards 3 to 35 are there - but the memory cost is
+# worth it
+EMPTY_BUFFER[0:3] = array.array(BUFFER_TYPECODE, [-1] * 3)
+EMPTY_BUFFER[CARD_ON_BOARD] = -1
+
+# The non-player action drawing each card
+DRAW_ACTIONS = [(card,) for card in range(36)]
+
+
+# Cards left undrawn when the game ends
+UNDRAWN_AT_END = 12
+
+# Where playouts count their moves when nobody is asking
+UNCOUNTED_MOVES = np.zeros(1, dtype=np.int64)
+
+
+@jit(cache=True)
+def scores(cards, chips):
+    """Each player's score: the first card of every run they hold, less chips"""
+    result = -chips.astype(np.int64)
+    for card in range(1, cards.shape[0]):
+        owner = cards[card]
+        if owner > 0 and cards[card - 1] != owner:
+            result[owner - 1] += card
+    return result
+
+
+@jit(cache=True)
+def normalized_reward(player_scores):
+    # The lower the score, the better: inverted and scaled to -1 (worst)
+    # to 1 (best). A tie between everyone is worth nothing to anyone
+    best = -np.min(player_scores)
+    worst = -np.max(player_scores)
+    if best == worst:
+        return np.zeros(player_scores.shape[0])
+    return 2 * (-player_scores - worst) / (best - worst) - 1
+
+
+@jit(cache=True)
+def random_play_outs(buffers, next_player_ids, playouts, seed, moves):
+    # Random games to the end from each encoded state, the rows of buffers,
+    # returning the mean reward per player for each and adding the moves
+    # played, draws included, to moves[0]. Mirrors NtGame.act.
+    np.random.seed(seed)
+    rewards = np.zeros((buffers.shape[0], PLAYER_COUNT))
+    deck = np.empty(36, dtype=np.int64)
+    for state in range(buffers.shape[0]):
+        for _ in range(playouts):
+            scratch = buffers[state].copy()
+            player_id = next_player_ids[state]
+            undrawn = 0
+            for card in range(36):
+                if scratch[card] == 0:
+                    undrawn += 1
+            while undrawn > UNDRAWN_AT_END:
+                card = scratch[CARD_ON_BOARD]
+                if card < 0:
+                    deck_size = 0
+                    for undrawn_card in range(36):
+                        if scratch[undrawn_card] == 0:
+                            deck[deck_size] = undrawn_card
+                            deck_size += 1
+                    scratch[CARD_ON_BOARD] = deck[np.random.randint(deck_size)]
+                elif (
+                    scratch[CHIPS_START + player_id] > 0 and np.random.randint(2) == 0
+                ):
+                    scratch[CHIPS_START + player_id] -= 1
+                    scratch[CHIPS_ON_BOARD] += 1
+                    player_id = (player_id + 1) % PLAYER_COUNT
+                else:
+                    scratch[CHIPS_START + player_id] += scratch[CHIPS_ON_BOARD]
+                    scratch[card] = player_id + 1
+                    scratch[CARD_ON_BOARD] = -1
+                    scratch[CHIPS_ON_BOARD] = 0
+                    undrawn -= 1
+                moves[0] += 1
+            rewards[state] += normalized_reward(
+                scores(scratch[:36], scratch[CHIPS_START : CHIPS_START + PLAYER_COUNT])
+            )
+    return rewards / playouts
+
 
 class NtState(GameState):
+    # Trees keep a state per node, so states carry no __dict__ and hold the
+    # board in one small buffer
+    __slots__ = (
+        "next_player_id",
+        "last_player_id",
+        "buffer",
+        "_winner",
+        "_previous_actions",
+        "_next_automated",
+        "_permitted_actions",
+        "zobrist",
+    )
+
     def __init__(
         self, next_player_id, last_player_id, previous_actions, next_automated
     ):
-        # Technically, only cards 3 to 35 are there - but memory
-        # cost is worth it
         self.next_player_id = next_player_id
         self.last_player_id = last_player_id
-        self.cards = np.zeros(36)
-        self.cards[0] = -1
-        self.cards[1] = -1
-        self.cards[2] = -1
-        self.card_on_board = None
-        self.chips = np.zeros(PLAYER_COUNT)
-        self.chips_on_board = 0
+        self.buffer = EMPTY_BUFFER[:]
         self._winner = -1
-        self._previous_actions = previous_actions.copy()
+        if not isinstance(previous_actions, ActionHistory):
+            previous_actions = ActionHistory.from_actions(previous_actions)
+        self._previous_actions = previous_actions
         self._next_automated = next_automated
+        self._permitted_actions = None
+        self.zobrist = 0
 
     @property
     def player_id(self):
@@ -47,62 +169,134 @@ class NtState(GameState):
     @next_automated.setter
     def next_automated(self, value):
         self._next_automated = value
+        self.changed()
+
+    def _view(self, part: slice) -> np.ndarray:
+        return np.frombuffer(
+            self.buffer,
+            dtype=BUFFER_DTYPE,
+            count=part.stop - part.start,
+            offset=part.start,
+        )
+
+    @property
+    def cards(self) -> np.ndarray:
+        """Writable view of the cards in the buffer"""
+        return self._view(CARDS)
+
+    @cards.setter
+    def cards(self, value):
+        self._view(CARDS)[:] = value
+        self.changed()
+
+    @property
+    def chips(self) -> np.ndarray:
+        """Writable view of the players' chips in the buffer"""
+        return self._view(CHIPS)
+
+    @chips.setter
+    def chips(self, value):
+        self._view(CHIPS)[:] = value
+        self.changed()
+
+    @property
+    def chips_on_board(self) -> int:
+        return self.buffer[CHIPS_ON_BOARD]
+
+    @chips_on_board.setter
+    def chips_on_board(self, value: int):
+        self.buffer[CHIPS_ON_BOARD] = value
+
+    @property
+    def card_on_board(self) -> typing.Optional[int]:
+        card = self.buffer[CARD_ON_BOARD]
+        return None if card < 0 else card
+
+    @card_on_board.setter
+    def card_on_board(self, value: typing.Optional[int]):
+        self.buffer[CARD_ON_BOARD] = -1 if value is None else value
+        self.changed()
+
+    def changed(self):
+        """Forget cached permitted actions, after changing the state in place
+
+        The setters call this; code writing into cards or chips directly
+        has to.
+        """
+        self._permitted_actions = None
 
     @property
     def permitted_actions(self):
-        if self.card_on_board is None:
+        if self._permitted_actions is None:
+            self._permitted_actions = self._find_permitted_actions()
+        return self._permitted_actions
+
+    def _find_permitted_actions(self) -> tuple:
+        if self.buffer[CARD_ON_BOARD] < 0:
             # About to draw cards
-            return [(action,) for action in np.where(self.cards == 0)[0]]
-        if self.chips[self.next_player_id] == 0:
-            return [ACTION_TAKE]
-        else:
-            return [ACTION_NO_THANKS, ACTION_TAKE]
+            return tuple(
+                DRAW_ACTIONS[card]
+                for card, owner in enumerate(self.buffer[CARDS])
+                if owner == 0
+            )
+        if self.buffer[CHIPS_START + self.next_player_id] == 0:
+            return (ACTION_TAKE,)
+        return (ACTION_NO_THANKS, ACTION_TAKE)
 
     @property
     def winner(self):
         return self._winner
 
     @property
-    def previous_actions(self):
+    def previous_actions(self) -> ActionHistory:
         return self._previous_actions
 
     def add_action(self, action):
-        self._previous_actions.append(action)
+        self._previous_actions = self._previous_actions.extended(action)
 
-    def hash(self):
-        return sha256(str(self).encode()).hexdigest()
+    def hash(self) -> int:
+        return self.zobrist
+
+    def full_zobrist(self) -> int:
+        """Zobrist hash computed from scratch, which act keeps up incrementally"""
+        zobrist = (
+            ZOBRIST_NEXT_PLAYER[self.next_player_id]
+            ^ ZOBRIST_LAST_PLAYER[self.last_player_id]
+            ^ ZOBRIST_CHIPS_ON_BOARD[self.chips_on_board]
+        )
+        if self.next_automated:
+            zobrist ^= ZOBRIST_NEXT_AUTOMATED
+        if self.card_on_board is not None:
+            zobrist ^= ZOBRIST_CARD_ON_BOARD[self.card_on_board]
+        for card in np.flatnonzero(self.cards > 0):
+            zobrist ^= ZOBRIST_CARDS[card][int(self.cards[card])]
+        for player_id, chips in enumerate(self.chips):
+            zobrist ^= ZOBRIST_CHIPS[player_id][int(chips)]
+        return zobrist
 
     def cards_remaining(self):
         # Cards 3-35
         # 9 cards removed
-        return (35 - np.count_nonzero(self.cards)) - 11
+        return self.buffer[CARDS].count(0) - 12
 
     def copy(self) -> "NtState":
-
-        copy_state = NtState(
-            self.next_player_id,
-            self.last_player_id,
-            self.previous_actions,
-            self.next_automated,
-        )
-        copy_state.cards = self.cards.copy()
-        copy_state.card_on_board = self.card_on_board
-        copy_state.chips = self.chips.copy()
-        copy_state.chips_on_board = self.chips_on_board
+        # Skips __init__; the history is immutable, so it's shared
+        copy_state = NtState.__new__(NtState)
+        copy_state.next_player_id = self.next_player_id
+        copy_state.last_player_id = self.last_player_id
+        copy_state.buffer = self.buffer[:]
         copy_state._winner = self._winner
+        copy_state._previous_actions = self._previous_actions
+        copy_state._next_automated = self._next_automated
+        copy_state._permitted_actions = self._permitted_actions
+        copy_state.zobrist = self.zobrist
         return copy_state
 
-    def score_player(self, player_id):
-        cards_held = np.sort(np.where(self.cards == player_id + 1))[0]
-        score = 0
-        last_card = None
-        for card in cards_held:
-            if last_card != (card - 1):
-                score += card
-            last_card = card
-        score -= self.chips[player_id]
+    def scores(self) -> np.ndarray:
+        return scores(self.cards, self.chips)
 
-        return score
+    def score_player(self, player_id):
+        return int(self.scores()[player_id])
 
     def loggable(self) -> dict:
         return {
@@ -113,7 +307,7 @@ class NtState(GameState):
             "chips": self.chips.tolist(),
             "chips_on_board": self.chips_on_board,
             "winner": self._winner,
-            "previous_actions": self.previous_actions,
+            "previous_actions": self.previous_actions.tolist(),
         }
 
 
@@ -129,6 +323,41 @@ class NtGame(Game):
         # (and 1 extra - index is the card number for coding simplicity)
         return 36
 
+    @classmethod
+    def random_play_out(
+        cls, state: NtState, playouts: int = 1, moves: typing.Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        return random_play_outs(
+            np.frombuffer(state.buffer, dtype=BUFFER_DTYPE).reshape(1, BUFFER_SIZE),
+            np.array([state.next_player_id]),
+            playouts,
+            random.getrandbits(31),
+            UNCOUNTED_MOVES if moves is None else moves,
+        )[0]
+
+    @classmethod
+    def random_play_out_batch(
+        cls,
+        states: typing.Sequence[NtState],
+        playouts: int = 1,
+        moves: typing.Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """Mean reward per player from playouts of each state, one row each"""
+        # Writable, like the single state's buffer, so both share one compile
+        buffers = np.frombuffer(
+            bytearray().join(state.buffer for state in states), dtype=BUFFER_DTYPE
+        ).reshape(len(states), BUFFER_SIZE)
+        next_player_ids = np.array(
+            [state.next_player_id for state in states], dtype=np.int64
+        )
+        return random_play_outs(
+            buffers,
+            next_player_ids,
+            playouts,
+            random.getrandbits(31),
+            UNCOUNTED_MOVES if moves is None else moves,
+        )
+
     @property
     def state(self) -> "NtState":
         return self._state
@@ -144,51 +373,93 @@ class NtGame(Game):
     def initialize_game(self) -> "NtState":
         self._state = NtState(0, 0, [], True)
         self._state.chips = np.full(PLAYER_COUNT, 11)
+        self._state.zobrist = self._state.full_zobrist()
 
         return self._state
 
     def act(self, action: int) -> "NtState":
-        self._state.last_player_id = self._state.next_player_id
-        self._state.add_action(action)
+        state = self._state
+        buffer = state.buffer
+        # Every change below is mirrored in the Zobrist hash
+        state.zobrist ^= (
+            ZOBRIST_LAST_PLAYER[state.last_player_id]
+            ^ ZOBRIST_LAST_PLAYER[state.next_player_id]
+        )
+        state.last_player_id = state.next_player_id
+        state.add_action(action)
+        player_id = state.player_id
+        chips_index = CHIPS_START + player_id
+        chips = buffer[chips_index]
+        chips_on_board = buffer[CHIPS_ON_BOARD]
         if action == ACTION_NO_THANKS:
-            self._state.chips[self._state.player_id] -= 1
-            self._state.chips_on_board += 1
-            self._state.next_player_id = (self._state.player_id + 1) % PLAYER_COUNT
-            self._state.next_automated = False
+            state.zobrist ^= (
+                ZOBRIST_CHIPS[player_id][chips]
+                ^ ZOBRIST_CHIPS[player_id][chips - 1]
+                ^ ZOBRIST_CHIPS_ON_BOARD[chips_on_board]
+                ^ ZOBRIST_CHIPS_ON_BOARD[chips_on_board + 1]
+                ^ ZOBRIST_NEXT_PLAYER[player_id]
+                ^ ZOBRIST_NEXT_PLAYER[(player_id + 1) % PLAYER_COUNT]
+            )
+            if state._next_automated:
+                state.zobrist ^= ZOBRIST_NEXT_AUTOMATED
+            buffer[chips_index] = chips - 1
+            buffer[CHIPS_ON_BOARD] = chips_on_board + 1
+            state.next_player_id = (player_id + 1) % PLAYER_COUNT
+            state._next_automated = False
             # Not checking for invalid
         elif action == ACTION_TAKE:
-            self._state.next_automated = True
-            self._state.chips[self._state.player_id] += self._state.chips_on_board
-            self._state.cards[self._state.card_on_board] = self._state.player_id + 1
-            self._state.card_on_board = None
-            self._state.chips_on_board = 0
-            if self._state.cards_remaining() == 0:
-                scores = np.array([self.score_player(i) for i in range(PLAYER_COUNT)])
-                self._state._winner = np.argmin(scores)
+            card = buffer[CARD_ON_BOARD]
+            state.zobrist ^= (
+                ZOBRIST_CHIPS[player_id][chips]
+                ^ ZOBRIST_CHIPS[player_id][chips + chips_on_board]
+                ^ ZOBRIST_CHIPS_ON_BOARD[chips_on_board]
+                ^ ZOBRIST_CHIPS_ON_BOARD[0]
+                ^ ZOBRIST_CARD_ON_BOARD[card]
+                ^ ZOBRIST_CARDS[card][player_id + 1]
+            )
+            if not state._next_automated:
+                state.zobrist ^= ZOBRIST_NEXT_AUTOMATED
+            state._next_automated = True
+            buffer[chips_index] = chips + chips_on_board
+            buffer[card] = player_id + 1
+            buffer[CARD_ON_BOARD] = -1
+            buffer[CHIPS_ON_BOARD] = 0
+            if state.cards_remaining() == 0:
+                state._winner = int(np.argmin(state.scores()))
         elif action == 255:
             # First action in the game
             pass
         else:
             raise ValueError("Invalid action")
-        return self._state
+        state.changed()
+        return state
 
     def non_player_act(self) -> tuple[tuple[int, ...], "NtState"]:
         if self._state.card_on_board is not None:
             return tuple(), self._state
 
         # Draw card
-        card = np.random.choice(np.where(self._state.cards == 0)[0])
-        self.apply_non_player_acts((card,))
-        return ((card,), self._state)
+        drawn = self.sample_non_player_act(self._state)
+        self.apply_non_player_acts(drawn)
+        return (drawn, self._state)
+
+    @classmethod
+    def sample_non_player_act(cls, state: NtState) -> tuple[int]:
+        # About to draw, so the permitted actions are the undrawn cards
+        draws = state.permitted_actions
+        return draws[np.random.randint(len(draws))]
 
     def apply_non_player_acts(self, actions: tuple[int, ...]) -> "NtState":
         assert len(actions) == 1
-        assert self._state.next_automated
-        self._state.next_automated = False
-        self._state.card_on_board = actions[0]
         assert isinstance(actions, tuple)
-        self._state.add_action(actions)
-        return self._state
+        state = self._state
+        assert state.next_automated
+        state._next_automated = False
+        state.buffer[CARD_ON_BOARD] = actions[0]
+        state.zobrist ^= ZOBRIST_NEXT_AUTOMATED ^ ZOBRIST_CARD_ON_BOARD[actions[0]]
+        state.add_action(actions)
+        state.changed()
+        return state
 
     def score_player(self, player_id: int) -> int:
         return self.state.score_player(player_id)
@@ -202,14 +473,5 @@ class NtGame(Game):
             # Draw
             reward = [0] * player_count
         else:
-            # The lower the score, the better
-            # We invert the scores, and normalize them between -1 and 1
-            invert_scores = -1 * np.array(
-                [state.score_player(i) for i in range(player_count)]
-            )
-            reward = (
-                2
-                * (invert_scores - np.min(invert_scores))
-                / (np.max(invert_scores) - np.min(invert_scores))
-            ) - 1
+            reward = normalized_reward(state.scores())
         return list(reward)
@@ -1,10 +1,12 @@
 import random
 import nt.game
 import mcts.tree
+from mcts.ponder import Ponderer
 
 
-def human_play(game: nt.game.NtGame, tree: mcts.tree.Tree):
+def human_play(game: nt.game.NtGame, tree: mcts.tree.Tree, ponder: bool = False):
     done = False
+    ponderer = Ponderer(tree) if ponder else None
     human_player_id = random.randint(0, game.player_count - 1)
     state = game.state
     while not done:
@@ -36,6 +38,8 @@ def human_play(game: nt.game.NtGame, tree: mcts.tree.Tree):
                 print("Must Take")
                 action = nt.game.ACTION_TAKE
             else:
+                if ponderer:
+                    ponderer.start(state)
                 while action == None:
                     proposed_action_raw = input("(N)o Thanks or (T)ake:")
                     proposed_action_cleaned = proposed_action_raw.strip().upper()
@@ -45,6 +49,8 @@ def human_play(game: nt.game.NtGame, tree: mcts.tree.Tree):
                         action = nt.game.ACTION_TAKE
                     else:
                         print("✖️")
+        elif ponderer:
+            action = ponderer.act(state)
         else:
             action = tree.act(state)
 
@@ -52,6 +58,8 @@ def human_play(game: nt.game.NtGame, tree: mcts.tree.Tree):
         state = game.act(action)
         done = state.winner != -1
 
+    if ponderer:
+        ponderer.stop()
     print("Scores")
     rewards = game.reward_model(game.state)
     for player in range(game.player_count):
@@ -0,0 +1,35 @@
+import json
+from benchmarks.suite import main, regressions
+
+
+def test_regressions_flags_cases_past_threshold():
+    baseline = {"fast": {"seconds": 1.0}, "slow": {"seconds": 1.0}}
+    results = {
+        "fast": {"seconds": 1.1},
+        "slow": {"seconds": 1.5},
+        "new": {"seconds": 9.0},
+    }
+    assert regressions(results, baseline, 0.25) == {"slow": 1.5}
+
+
+def test_suite_writes_json_and_compares(tmp_path):
+    output = str(tmp_path / "results.json")
+    args = ["-k", "c4.check_for_win", "nt.state.copy", "-r", "1", "--scale", "0.01"]
+    assert main(args + ["-o", output]) == 0
+    with open(output) as f:
+        saved = json.load(f)
+    assert set(saved["results"]) == {"c4.check_for_win", "nt.state.copy"}
+    assert saved["results"]["nt.state.copy"]["seconds"] > 0
+    # Well inside any threshold, and failing once the baseline is impossibly fast
+    assert main(args + ["--compare", output, "--threshold", "100"]) == 0
+    for result in saved["results"].values():
+        result["seconds"] = 1e-15
+    with open(output, "w") as f:
+        json.dump(saved, f)
+    assert main(args + ["--compare", output]) == 1
+
+
+def test_expansion_has_leaves_past_the_searched_tree(tmp_path):
+    # More calls than the searched tree has leaves
+    args = ["-k", "tree.expansion", "-r", "3", "--scale", "12"]
+    assert main(args + ["-o", str(tmp_path / "results.json")]) == 0
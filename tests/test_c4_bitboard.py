@@ -0,0 +1,66 @@
+import random
+import pytest
+import c4.bitboard
+import c4.game
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_matches_array_engine(seed):
+    rng = random.Random(seed)
+    array_game = c4.game.Game()
+    bitboard_game = c4.bitboard.BitboardGame()
+    while array_game.state.winner == -1:
+        assert list(bitboard_game.state.permitted_actions) == (
+            array_game.state.permitted_actions
+        )
+        action = rng.choice(array_game.state.permitted_actions)
+        array_game.act(action)
+        bitboard_game.act(action)
+        assert bitboard_game.state.winner == array_game.state.winner
+        assert bitboard_game.state.player_id == array_game.state.player_id
+        assert (bitboard_game.state.board == array_game.state.board).all()
+
+
+def test_copy_is_independent():
+    game = c4.bitboard.BitboardGame()
+    game.act(3)
+    copied = game.state.copy()
+    game.act(4)
+    assert copied.previous_actions == [3]
+    assert copied.height(4) == 0
+    assert game.state.height(4) == 1
+
+
+@pytest.mark.parametrize(
+    "moves, winner",
+    [
+        ([0, 1, 0, 1, 0, 1, 0], 1),
+        ([0, 0, 1, 1, 2, 2, 3], 1),
+        ([0, 1, 1, 2, 2, 3, 2, 3, 3, 7, 3], 1),
+        ([3, 2, 2, 1, 1, 0, 1, 0, 0, 7, 0], 1),
+    ],
+    ids=["vertical", "horizontal", "diagonal /", "diagonal \\"],
+)
+def test_lines(moves, winner):
+    game = c4.bitboard.BitboardGame()
+    for move in moves:
+        game.act(move)
+    assert game.state.winner == winner
+
+
+def test_lines_do_not_wrap_between_columns():
+    # Top two cells of column 0 and bottom two of column 1 are adjacent bits
+    board = (1 << 6) | (1 << 7) | (1 << 8) | (1 << 9)
+    assert not c4.bitboard.has_four(board)
+
+
+@pytest.mark.parametrize("game_class", [c4.game.Game, c4.bitboard.BitboardGame])
+def test_random_play_out_is_seeded_mean_reward(game_class):
+    game = game_class()
+    game.act(3)
+    random.seed(1)
+    rewards = game_class.random_play_out(game.state, 100)
+    random.seed(1)
+    assert (game_class.random_play_out(game.state, 100) == rewards).all()
+    assert rewards.sum() == pytest.approx(0)
+    assert -1 <= rewards[0] <= 1
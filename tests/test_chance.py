@@ -0,0 +1,162 @@
+import random
+import numpy as np
+import pytest
+import nt.game
+from mcts.node import FLAG_CHANCE, FLAG_EXPANDED, FLAG_SAMPLED, NO_NODE, NodeStore
+from mcts.tree import Tree
+
+
+def make_tree(state, iterations=500, **kwargs):
+    random.seed(0)
+    np.random.seed(0)
+    return Tree(
+        None,
+        nt.game.NtState,
+        nt.game.NtGame,
+        state,
+        iterations,
+        reward_model=nt.game.NtGame.reward_model,
+        sample_chance=True,
+        **kwargs,
+    )
+
+
+def opening():
+    game = nt.game.NtGame()
+    game.non_player_act()
+    return game
+
+
+def sampled_nodes(store):
+    return [node for node in range(store.size) if store.is_sampled(node)]
+
+
+def test_outcomes_are_only_added_once_drawn():
+    game = opening()
+    tree = make_tree(game.state)
+    tree.act(game.state)
+    store = tree.node_store
+    chance_nodes = sampled_nodes(store)
+    assert chance_nodes
+    every_outcome = 0
+    for node in chance_nodes:
+        children = store.children(node)
+        assert all(store.parent[child] == node for child in children)
+        assert all(store.flags[child] & FLAG_CHANCE for child in children)
+        assert len(set(store.child_actions(node))) == len(children)
+        # A drawn outcome has been searched at least once
+        assert all(store.visits[child] > 0 for child in children)
+        every_outcome += len(store.state(node).permitted_actions)
+    assert sum(store.child_count[chance_nodes]) < every_outcome / 2
+
+
+def test_max_outcomes_caps_drawn_outcomes():
+    game = opening()
+    tree = make_tree(game.state, 2000, max_outcomes=3)
+    tree.act(game.state)
+    store = tree.node_store
+    assert max(store.child_count[sampled_nodes(store)]) == 3
+
+
+def test_played_outcome_is_added_past_the_cap():
+    game = opening()
+    tree = make_tree(game.state, 300, max_outcomes=1)
+    tree.act(game.state)
+    game.act(nt.game.ACTION_TAKE)
+    chance = tree.get_node(game.state)
+    drawn = tree.node_store.child_actions(chance)
+    while True:
+        game_copy = nt.game.NtGame.from_state(game.state)
+        action, _ = game_copy.non_player_act()
+        if action not in drawn:
+            break
+    game = game_copy
+    node = tree.get_node(game.state)
+    assert tree.node_store.action_value(node) == action
+    assert tree.node_store.child_count[chance] == len(drawn) + 1
+    assert tree.act(game.state) in game.state.permitted_actions
+
+
+def test_add_outcome_moves_block_with_descendants():
+    # About to draw the first card
+    store = NodeStore(nt.game.NtGame, nt.game.NtGame().state)
+    chance = store.root
+    store.flags[chance] |= FLAG_EXPANDED | FLAG_SAMPLED
+    first = store.add_outcome(chance, (5,), room=2)
+    # The spare slot takes the next outcome without moving anything
+    assert store.add_outcome(chance, (6,)) == first + 1
+    store.add_children(first, [nt.game.ACTION_NO_THANKS, nt.game.ACTION_TAKE], False)
+    grandchild = store.child(first, nt.game.ACTION_TAKE)
+    state = store.state(grandchild)
+    store.visits[first] = 7
+    third = store.add_outcome(chance, (7,))
+    moved = store.child(chance, (5,))
+    assert moved != first and third == moved + 2
+    assert store.child_actions(chance) == [(5,), (6,), (7,)]
+    assert store.visits[moved] == 7
+    assert store.parent[grandchild] == moved
+    assert store.state(grandchild) is state
+    assert store.child_count[first] == 0 and store.parent[first] == NO_NODE
+
+
+def test_sampled_tree_survives_pruning_and_merging():
+    game = opening()
+    tree = make_tree(game.state, 1000, max_nodes=1500)
+    tree.act(game.state)
+    assert tree.node_count() <= 1500 + nt.game.NtGame.max_action_count()
+    other = make_tree(game.state, 300)
+    other.act(game.state)
+    merged = tree.node_store.subtree(tree.root)
+    merged.merge(other.node_store)
+    assert merged.visits[merged.root] == (
+        tree.node_store.visits[tree.root] + other.node_store.visits[other.root]
+    )
+    for node in sampled_nodes(merged):
+        actions = merged.child_actions(node)
+        assert len(set(actions)) == len(actions)
+
+
+def test_max_outcomes_needs_sampling():
+    with pytest.raises(ValueError):
+        Tree(
+            None,
+            nt.game.NtState,
+            nt.game.NtGame,
+            nt.game.NtGame().state,
+            10,
+            max_outcomes=4,
+        )
+
+
+def test_transpositions_survive_moving_outcomes():
+    game = opening()
+    tree = make_tree(game.state, 200, transposition_size=1 << 12)
+    for _ in range(20):
+        game.act(tree.act(game.state))
+        game.non_player_act()
+    store = tree.node_store
+    table = tree.transpositions
+    for node in table.nodes[table.nodes != NO_NODE].tolist():
+        # Every entry is a live node with its own children
+        assert node == store.root or store.parent[node] != NO_NODE
+        assert store.child_count[node] > 0
+    for node in range(store.size):
+        if store.is_expanded(node) and not store.is_sampled(node):
+            assert store.child_count[node] > 0 or store.state(node).winner != -1
+
+
+def test_act_many_follows_moved_outcomes():
+    # The second position sits under the chance node that taking the card
+    # leads to, whose outcomes move as searching the first draws more
+    game = opening()
+    first = game.state.copy()
+    game.act(nt.game.ACTION_TAKE)
+    game.non_player_act()
+    tree = make_tree(first, 300)
+    actions = tree.act_many([first, game.state])
+    assert actions[0] in first.permitted_actions
+    assert actions[1] in game.state.permitted_actions
+    store = tree.node_store
+    node = tree.get_node(game.state)
+    assert store.parent[node] != NO_NODE
+    assert store.visits[node] >= 300
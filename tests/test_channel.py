@@ -0,0 +1,83 @@
+import random
+import threading
+import numpy as np
+import nt.game
+import mcts.channel
+from mcts.channel import ACT, ACT_SYNC, COMMAND, MESSAGE, SharedChannel
+
+
+def test_acts_send_only_new_actions():
+    random.seed(0)
+    np.random.seed(0)
+    channel = SharedChannel(nt.game.NtGame)
+    try:
+        game = nt.game.NtGame()
+        game.non_player_act()
+        channel.put_act(game.state, 10, None)
+        assert channel.header[COMMAND] == ACT_SYNC
+        _, (state, iterations, move_time) = channel.get()
+        assert (iterations, move_time) == (10, None)
+
+        for _ in range(5):
+            game.act(random.choice(game.state.permitted_actions))
+            game.non_player_act()
+        channel.put_act(game.state, None, 0.5)
+        assert channel.header[COMMAND] == ACT
+        _, (state, iterations, move_time) = channel.get()
+        assert (iterations, move_time) == (None, 0.5)
+        assert state.previous_actions == game.state.previous_actions
+        assert state.hash() == game.state.hash()
+
+        # A new game doesn't follow on, so it's sent whole
+        channel.put_act(nt.game.NtGame().state, 10, None)
+        assert channel.header[COMMAND] == ACT_SYNC
+        channel.get()
+    finally:
+        channel.close()
+
+
+def test_results_come_back_in_permitted_order():
+    channel = SharedChannel(nt.game.NtGame)
+    try:
+        game = nt.game.NtGame()
+        game.non_player_act()
+        keys = list(reversed(game.state.permitted_actions))
+        channel.put_result(
+            game.state,
+            keys,
+            np.array([1.0, 2.0]),
+            np.array([3.0, 4.0]),
+            np.array([5.0, 6.0]),
+            30,
+            10,
+            5,
+        )
+        ucbs, visits, values, *counts = channel.get_result()
+        np.testing.assert_array_equal(ucbs, [2.0, 1.0])
+        np.testing.assert_array_equal(visits, [4.0, 3.0])
+        np.testing.assert_array_equal(values, [6.0, 5.0])
+        assert counts == [30, 10, 5]
+    finally:
+        channel.close()
+
+
+def test_waits_for_the_last_command_to_be_taken(monkeypatch):
+    monkeypatch.setattr(mcts.channel, "CLAIM_TIMEOUT", 0.01)
+    channel = SharedChannel(nt.game.NtGame)
+    try:
+        game = nt.game.NtGame()
+        game.non_player_act()
+        channel.put_act(game.state, 10, None)
+        sender = threading.Thread(target=channel.put, args=(("stop", None),))
+        sender.start()
+        # Still waiting well past the timeout, and the act left as it was
+        sender.join(0.2)
+        assert sender.is_alive()
+        assert channel.header[COMMAND] == ACT_SYNC
+        _, (state, iterations, _) = channel.get()
+        assert iterations == 10
+        sender.join()
+        assert channel.header[COMMAND] == MESSAGE
+        assert channel.get() == ("stop", None)
+    finally:
+        channel.close()
@@ -0,0 +1,37 @@
+import c4.bitboard
+from mcts.node import NodeStore
+from mcts.tree import Tree
+from monty import Checkpointer
+
+
+def make_tree(filename):
+    game = c4.bitboard.BitboardGame()
+    return Tree(
+        filename, c4.bitboard.BitboardState, c4.bitboard.BitboardGame, game.state, 50
+    )
+
+
+def test_background_save_writes_snapshot(tmp_path):
+    filename = str(tmp_path / "tree.nodes")
+    tree = make_tree(filename)
+    tree.act(tree.node_store.state(tree.root))
+    count = tree.node_count()
+    checkpointer = Checkpointer(tree)
+    checkpointer.save()
+    # Search carries on while the snapshot is written
+    tree.act(tree.node_store.state(tree.root))
+    checkpointer.wait()
+    assert checkpointer.saves == 1
+    assert checkpointer.last_pause <= checkpointer.last_duration
+    loaded = NodeStore.from_disk(filename, c4.bitboard.BitboardGame)
+    assert loaded.count() == count
+    assert not (tmp_path / "tree.nodes.tmp").exists()
+
+
+def test_due_by_episode_or_time():
+    checkpointer = Checkpointer(make_tree(None), every_episodes=5)
+    assert checkpointer.due(10)
+    assert not checkpointer.due(11)
+    assert not checkpointer.due()
+    checkpointer = Checkpointer(make_tree(None), every_episodes=None, every_seconds=0)
+    assert checkpointer.due()
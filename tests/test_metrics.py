@@ -0,0 +1,97 @@
+import json
+import pytest
+import c4.bitboard
+import nt.game
+from mcts.metrics import PHASES, MetricsExporter
+from mcts.tree import Tree
+
+
+def test_profiled_search_times_each_phase():
+    game = c4.bitboard.BitboardGame()
+    tree = Tree(
+        None,
+        c4.bitboard.BitboardState,
+        c4.bitboard.BitboardGame,
+        game.state,
+        200,
+        profile=True,
+    )
+    tree.act(game.state)
+    metrics = tree.metrics
+    assert metrics.counts["selection"] == 200
+    assert metrics.counts["backprop"] == 200
+    assert all(metrics.seconds[phase] > 0 for phase in PHASES)
+    assert metrics.mean_selection_depth >= 1
+    # Random c4 games from the opening run well past a handful of moves
+    assert 7 <= metrics.mean_playout_length <= 64
+
+
+class PythonPlayoutGame(nt.game.NtGame):
+    # Leaves Tree to play out in Python rather than in the compiled kernel
+    random_play_out = None
+
+
+def test_python_playouts_count_moves():
+    game = PythonPlayoutGame()
+    game.non_player_act()
+    tree = Tree(
+        None,
+        nt.game.NtState,
+        PythonPlayoutGame,
+        game.state,
+        20,
+        reward_model=nt.game.NtGame.reward_model,
+        profile=True,
+    )
+    tree.act(game.state)
+    assert tree.metrics.playouts > 0
+    assert tree.metrics.mean_playout_length > 1
+
+
+def test_state_counts_only_materializations():
+    game = c4.bitboard.BitboardGame()
+    tree = Tree(
+        None,
+        c4.bitboard.BitboardState,
+        c4.bitboard.BitboardGame,
+        game.state,
+        50,
+        profile=True,
+    )
+    tree.act(game.state)
+    store = tree.node_store
+    built = sum(state is not None for state in store.states[: store.count()]) - 1
+    # Expansion and playout each ask for every leaf's state
+    assert 0 < tree.metrics.counts["state"] <= built
+
+
+def test_unprofiled_tree_keeps_no_metrics():
+    game = c4.bitboard.BitboardGame()
+    tree = Tree(
+        None, c4.bitboard.BitboardState, c4.bitboard.BitboardGame, game.state, 20
+    )
+    assert tree.metrics is None
+    with pytest.raises(ValueError):
+        MetricsExporter(tree, "unused.jsonl")
+
+
+def test_exporter_appends_json_lines(tmp_path):
+    game = c4.bitboard.BitboardGame()
+    tree = Tree(
+        None,
+        c4.bitboard.BitboardState,
+        c4.bitboard.BitboardGame,
+        game.state,
+        50,
+        profile=True,
+    )
+    filename = tmp_path / "metrics.jsonl"
+    exporter = MetricsExporter(tree, str(filename), interval=60)
+    exporter.start()
+    tree.act(game.state)
+    exporter.write()
+    exporter.stop()
+    lines = [json.loads(line) for line in filename.read_text().splitlines()]
+    assert len(lines) == 2
+    assert lines[-1]["iterations"] == tree.total_iterations
+    assert lines[-1]["counts"]["selection"] == 50
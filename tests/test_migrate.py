@@ -0,0 +1,122 @@
+from collections import OrderedDict, deque
+import os
+import pickle
+import numpy as np
+import pytest
+import c4.game
+import nt.game
+import mcts.node
+from mcts.migrate import LegacyNode, LegacyUnpickler, load_pickled
+from mcts.node import NodeStore
+from mcts.tree import Tree
+
+DATA = os.path.join(os.path.dirname(__file__), "data")
+
+
+# Pickles as the original mcts.node.Node would have
+OriginalNode = type("Node", (LegacyNode,), {"__module__": "mcts.node"})
+
+
+def legacy_node(action, state, children=(), visits=None, values=None):
+    node = OriginalNode()
+    node.__dict__.update(
+        action=action,
+        parent=None,
+        _state=state,
+        _parent_state=None,
+        game_class=c4.game.Game,
+        leaf=not children,
+        children=OrderedDict(children),
+        child_visit_count=visits,
+        child_value=values,
+    )
+    return node
+
+
+def test_migrates_original_node_graph(tmp_path, monkeypatch):
+    state = c4.game.Game().state
+    grandchild = legacy_node(4, None)
+    child = legacy_node(3, None, [(4, grandchild)], np.array([2.0]), np.array([1.0]))
+    root = legacy_node(255, state, [(3, child), (5, legacy_node(5, None))])
+    root.__dict__.update(
+        child_visit_count=np.array([3.0, 1.0]),
+        child_value=np.array([2.0, -1.0]),
+        _visit_count=5,
+        _value_estimate=0,
+    )
+    monkeypatch.setattr(mcts.node, "Node", OriginalNode)
+    filename = str(tmp_path / "old.pkl")
+    with open(filename, "wb") as f:
+        pickle.dump(root, f)
+    monkeypatch.undo()
+
+    store = load_pickled(filename)
+    assert store.count() == 4
+    assert store.visits[store.root] == 5
+    assert store.child_actions(store.root) == [3, 5]
+    assert store.value[store.child(store.root, 5)] == -1
+    grandchild_index = store.child(store.child(store.root, 3), 4)
+    assert store.visits[grandchild_index] == 2
+    assert store.state(grandchild_index).previous_actions == [3, 4]
+
+
+def test_migrates_version_1_pickle(tmp_path):
+    store = NodeStore(c4.game.Game, c4.game.Game().state)
+    store.add_children(store.root, list(range(8)), False)
+    store.visits[1:9] = np.arange(8)
+    old = str(tmp_path / "old.pkl")
+    with open(old, "wb") as f:
+        pickle.dump(
+            {
+                "version": 1,
+                "root": store.root,
+                "root_state": store.state(store.root),
+                "action_values": store.action_values,
+                "arrays": {
+                    name: getattr(store, name)[: store.size]
+                    for name in NodeStore.FIELDS
+                },
+            },
+            f,
+        )
+    with pytest.raises(ValueError):
+        NodeStore.from_disk(old, c4.game.Game)
+
+    new = str(tmp_path / "new.nodes")
+    load_pickled(old).to_disk(new)
+    loaded = NodeStore.from_disk(new, c4.game.Game)
+    np.testing.assert_array_equal(loaded.visits[1:9], np.arange(8))
+
+
+# Saved by the baseline Tree.to_disk after a 15 iteration search, from the
+# opening for c4 and from before the first draw for NT
+@pytest.mark.parametrize(
+    "filename, game_class, reward_model",
+    [
+        ("baseline_c4.pkl", c4.game.Game, None),
+        ("baseline_nt.pkl", nt.game.NtGame, nt.game.NtGame.reward_model),
+    ],
+)
+def test_migrates_baseline_checkpoint(tmp_path, filename, game_class, reward_model):
+    old = os.path.join(DATA, filename)
+    with open(old, "rb") as f:
+        root = LegacyUnpickler(f).load()
+    new = str(tmp_path / "new.nodes")
+    load_pickled(old).to_disk(new)
+    store = NodeStore.from_disk(new, game_class)
+    # Every state the old tree had is rebuilt, with the same history
+    pending = deque([(root, store.root)])
+    while pending:
+        node, index = pending.popleft()
+        if node._state is not None:
+            state = store.state(index)
+            assert state.previous_actions == node._state.previous_actions
+        if node.child_visit_count is not None:
+            np.testing.assert_array_equal(
+                store.visits[store.children(index)], node.child_visit_count
+            )
+        pending.extend(zip(node.children.values(), store.children(index)))
+    state = store.state(store.root)
+    tree = Tree(new, type(state), game_class, state, 20, reward_model=reward_model)
+    assert tree.node_count() == store.count()
+    tree.act(state)
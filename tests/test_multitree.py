@@ -1,5 +1,8 @@
 import pytest
-from mcts.multi_tree import MultiTree
+import c4.bitboard
+from mcts.multi_tree import MultiTree, SharedMultiTree
+from mcts.node import NodeStore
+from mcts.tree import Tree
 
 
 @pytest.mark.parametrize(
@@ -62,3 +65,91 @@ from mcts.multi_tree import MultiTree
 )
 def test_best_action(permitted_actions, process_output, expected_result):
     assert MultiTree.best_action(permitted_actions, process_output) == expected_result
+
+
+@pytest.mark.parametrize(
+    "early_stop, expected_result", [(None, 0), ("visits", 1), ("confidence", 2)]
+)
+def test_best_action_follows_early_stop(early_stop, expected_result):
+    # Keys, ucbs, visits, values, then the iteration counts
+    process_output = [
+        ((0, 1, 2), [2.0, 0.5, 0.5], [4, 10, 2], [2.0, 6.0, 1.5], 16, 16, 0),
+        ((2, 1, 0), [0.5, 0.5, 2.0], [2, 10, 4], [1.5, 6.0, 2.0], 16, 16, 0),
+    ]
+    assert (
+        MultiTree.best_action([0, 1, 2], process_output, early_stop) == expected_result
+    )
+
+
+@pytest.mark.parametrize("ipc", ["shared", "queue"])
+def test_act_picks_the_most_merged_visits(tmp_path, ipc):
+    filename = str(tmp_path / "tree.nodes")
+    game = c4.bitboard.BitboardGame()
+    multi_tree = MultiTree(
+        filename,
+        c4.bitboard.BitboardState,
+        c4.bitboard.BitboardGame,
+        game.state,
+        200,
+        early_stop="visits",
+        jobs=2,
+        ipc=ipc,
+    )
+    try:
+        action = multi_tree.act(game.state)
+        store = multi_tree.merged_store()
+    finally:
+        multi_tree.close()
+    visits = [store.visits[child] for child in store.children(store.root)]
+    assert visits[action] == max(visits)
+
+
+def test_to_disk_merges_workers(tmp_path):
+    filename = str(tmp_path / "tree.nodes")
+    game = c4.bitboard.BitboardGame()
+    multi_tree = MultiTree(
+        filename,
+        c4.bitboard.BitboardState,
+        c4.bitboard.BitboardGame,
+        game.state,
+        50,
+        jobs=2,
+    )
+    try:
+        multi_tree.act(game.state)
+        multi_tree.to_disk()
+    finally:
+        multi_tree.close()
+    store = NodeStore.from_disk(filename, c4.bitboard.BitboardGame)
+    # Each worker's root starts on one visit
+    assert store.visits[store.root] == 2 * 51
+    tree = Tree(
+        filename, c4.bitboard.BitboardState, c4.bitboard.BitboardGame, game.state, 50
+    )
+    assert tree.node_count() == store.count()
+
+
+def test_shared_tree_saves_and_loads(tmp_path):
+    filename = str(tmp_path / "tree.nodes")
+    game = c4.bitboard.BitboardGame()
+    for _ in range(2):
+        shared_tree = SharedMultiTree(
+            filename,
+            c4.bitboard.BitboardState,
+            c4.bitboard.BitboardGame,
+            game.state,
+            50,
+            jobs=2,
+            capacity=1 << 12,
+        )
+        try:
+            shared_tree.act(game.state)
+            shared_tree.to_disk()
+        finally:
+            shared_tree.close()
+    store = NodeStore.from_disk(filename, c4.bitboard.BitboardGame)
+    # The second run carried on from the first; the root starts on one visit
+    assert store.visits[store.root] == 1 + 2 * 2 * 50
+    assert store.child_actions(store.root) == list(range(8))
+    grandchild = store.child(store.child(store.root, 3), 4)
+    assert store.state(grandchild).previous_actions == [3, 4]
@@ -0,0 +1,163 @@
+import numpy as np
+import c4.game
+from mcts.node import NO_NODE, NodeStore
+from mcts.tree import Tree
+
+
+def make_tree(iterations=50):
+    game = c4.game.Game()
+    return Tree(None, c4.game.GameState, c4.game.Game, game.state, iterations)
+
+
+def test_children_are_contiguous():
+    store = NodeStore(c4.game.Game, c4.game.Game().state)
+    store.add_children(store.root, list(range(8)), False)
+    assert list(store.children(store.root)) == list(range(1, 9))
+    assert store.child_actions(store.root) == list(range(8))
+    assert store.child(store.root, 5) == 6
+    assert store.child(store.root, 9) == NO_NODE
+
+
+def test_state_is_materialised_from_parent():
+    store = NodeStore(c4.game.Game, c4.game.Game().state)
+    store.add_children(store.root, list(range(8)), False)
+    child = store.child(store.root, 3)
+    store.add_children(child, list(range(8)), False)
+    grandchild = store.child(child, 4)
+    assert store.state(grandchild).previous_actions == [3, 4]
+    assert store.player_id[grandchild] == 0
+
+
+def test_back_propogate_credits_acting_player():
+    store = NodeStore(c4.game.Game, c4.game.Game().state)
+    store.add_children(store.root, list(range(8)), False)
+    child = store.child(store.root, 2)
+    store.state(child)
+    store.back_propogate([store.root, child], [-1, 1])
+    assert store.visits[store.root] == 2
+    assert store.visits[child] == 1
+    assert store.value[child] == 1
+    assert store.value[store.root] == 0
+
+
+def test_subtree_keeps_statistics():
+    tree = make_tree()
+    tree.act(tree.node_store.state(tree.root))
+    store = tree.node_store
+    child = store.child(store.root, 0)
+    subtree = store.subtree(child)
+    assert subtree.root == 0
+    assert subtree.visits[0] == store.visits[child]
+    assert subtree.child_actions(0) == store.child_actions(child)
+    np.testing.assert_array_equal(
+        subtree.child_ucb(0, tree.constant), store.child_ucb(child, tree.constant)
+    )
+
+
+def test_round_trip_to_disk(tmp_path):
+    tree = make_tree()
+    tree.act(tree.node_store.state(tree.root))
+    filename = str(tmp_path / "tree.nodes")
+    tree.node_store.to_disk(filename)
+    loaded = NodeStore.from_disk(filename, c4.game.Game)
+    assert isinstance(loaded.visits, np.memmap)
+    assert loaded.count() == tree.node_count()
+    np.testing.assert_array_equal(
+        loaded.visits[: loaded.size], tree.node_store.visits[: loaded.size]
+    )
+    assert loaded.child_actions(loaded.root) == tree.node_store.child_actions(0)
+    # Loaded stores keep growing, and can be saved over their own file
+    loaded.add_children(loaded.child(loaded.root, 0), list(range(8)), False)
+    loaded.to_disk(filename)
+    assert NodeStore.from_disk(filename, c4.game.Game).count() == loaded.count()
+
+
+def test_prune_collapses_least_visited_keeping_stats():
+    tree = make_tree(iterations=300)
+    tree.act(tree.node_store.state(tree.root))
+    store = tree.node_store
+    line = [store.root, store.child(store.root, 0)]
+    before = store.count()
+    visits = store.visits[store.children(store.root)].copy()
+    pruned, remap = store.prune(before // 2, line)
+    assert pruned.count() <= before // 2 + store.child_count[line[1]]
+    np.testing.assert_array_equal(pruned.visits[pruned.children(0)], visits)
+    assert pruned.is_expanded(remap[line[1]])
+
+
+def test_prune_keeps_every_line_through_shared_children():
+    store = NodeStore(c4.game.Game, c4.game.Game().state)
+    store.add_children(store.root, list(range(8)), False)
+    left, right = store.child(store.root, 0), store.child(store.root, 1)
+    for node in (left, right):
+        store.add_children(node, list(range(8)), False)
+    # 0 then 1 and 1 then 0 reach the same position, so share its children
+    first = store.child(left, 1)
+    store.add_children(first, list(range(8)), False)
+    second = store.child(right, 0)
+    store.share_children(second, first)
+    position = store.child(first, 2)
+    store.add_children(position, list(range(8)), False)
+    store.visits[: store.size] = 1
+    store.visits[[store.root, left, first]] = 10
+    # Parent links only lead back through left, the line that came first
+    assert store.parent[position] == first
+    pruned, remap = store.prune(0, [position])
+    assert pruned.is_expanded(remap[position])
+    assert pruned.first_child[remap[second]] == pruned.first_child[remap[first]]
+    assert pruned.child(pruned.child(pruned.root, 1), 0) == remap[second]
+
+
+def test_subtree_to_depth_leaves_cut_nodes_unexpanded():
+    tree = make_tree(iterations=200)
+    tree.act(tree.node_store.state(tree.root))
+    store = tree.node_store.subtree(tree.root, max_depth=1)
+    assert store.count() == 9
+    assert not any(store.is_expanded(child) for child in store.children(0))
+
+
+def test_merge_sums_matching_paths():
+    first = make_tree(iterations=100)
+    second = make_tree(iterations=300)
+    for tree in (first, second):
+        tree.act(tree.node_store.state(tree.root))
+    merged = first.node_store.subtree(first.root)
+    merged.merge(second.node_store)
+    assert merged.visits[merged.root] == 402
+    for action in range(8):
+        expected = sum(
+            tree.node_store.visits[tree.node_store.child(tree.root, action)]
+            for tree in (first, second)
+        )
+        assert merged.visits[merged.child(merged.root, action)] == expected
+    assert merged.count() >= max(first.node_count(), second.node_count())
+
+
+def test_select_child_takes_unvisited_then_best_ucb():
+    store = NodeStore(c4.game.Game, c4.game.Game().state)
+    store.add_children(store.root, list(range(8)), False)
+    children = np.array(store.children(store.root))
+    store.visits[store.root] = 100
+    store.visits[children] = [10, 20, 0, 10, 0, 5, 5, 5]
+    assert store.select_child(store.root, 1.4) == children[2]
+    store.visits[children[[2, 4]]] = 5
+    store.value[children] = [3, 18, 0, 0, 0, 0, 0, 0]
+    # Exploration picks a little visited child; exploitation the best mean
+    assert store.select_child(store.root, 3) == children[2]
+    assert store.select_child(store.root, 0.1) == children[1]
+    for constant in (0.1, 1.4, 3):
+        assert store.select_child(store.root, constant) == store.best_child(
+            store.root, constant
+        )
+
+
+def test_select_path_stops_at_unexpanded_node():
+    tree = make_tree(iterations=200)
+    tree.act(tree.node_store.state(tree.root))
+    store = tree.node_store
+    path = store.select_path(store.root, tree.constant, 5000)
+    assert path[0] == store.root
+    assert all(store.parent[child] == parent for parent, child in zip(path, path[1:]))
+    assert not store.is_expanded(path[-1])
+    assert all(store.is_expanded(node) for node in path[:-1])
+    assert store.select_path(store.root, tree.constant, 1) == path[:2]
@@ -0,0 +1,131 @@
+import array
+import pickle
+import random
+import numpy as np
+import pytest
+import nt.game
+from game.history import ActionHistory
+
+
+def test_history_shares_prefixes():
+    history = ActionHistory.from_actions([1, 2, 3])
+    longer = history.extended(4)
+    assert longer.parent is history
+    assert len(longer) == 4
+    assert longer == [1, 2, 3, 4]
+    assert longer[2:] == [3, 4]
+    assert longer[-1] == 4
+    assert longer[1] == 2
+    assert history != longer
+    assert history.extended(5) != longer
+    assert history.extended(4) == longer
+
+
+def test_history_pickles_flat():
+    history = ActionHistory.from_actions(range(5000))
+    loaded = pickle.loads(pickle.dumps(history))
+    assert loaded == history
+    assert loaded is not history
+
+
+def test_state_has_no_dict():
+    state = nt.game.NtGame().state
+    with pytest.raises(AttributeError):
+        state.__dict__
+
+
+def test_copy_shares_history_but_not_board():
+    game = nt.game.NtGame()
+    game.non_player_act()
+    state = game.state.copy()
+    assert state.previous_actions is game.state.previous_actions
+    game.act(nt.game.ACTION_TAKE)
+    assert state.card_on_board is not None
+    assert game.state.card_on_board is None
+    assert state.previous_actions == game.state.previous_actions[:-1]
+
+
+def test_views_write_through_to_buffer():
+    state = nt.game.NtGame().state
+    assert state.chips.tolist() == [11] * nt.game.PLAYER_COUNT
+    state.cards[10] = 2
+    assert state.buffer[10] == 2
+    state.chips = [0, 1, 2, 3, 4]
+    assert state.buffer[nt.game.CHIPS] == array.array("b", [0, 1, 2, 3, 4])
+
+
+def test_permitted_actions_follow_the_state():
+    game = nt.game.NtGame()
+    drawing = game.state.permitted_actions
+    assert drawing == tuple((card,) for card in range(3, 36))
+    game.non_player_act()
+    assert game.state.permitted_actions == (
+        nt.game.ACTION_NO_THANKS,
+        nt.game.ACTION_TAKE,
+    )
+    game.state.chips = [0] * nt.game.PLAYER_COUNT
+    assert game.state.permitted_actions == (nt.game.ACTION_TAKE,)
+
+
+def test_game_ends_with_twelve_cards_undrawn():
+    random.seed(0)
+    np.random.seed(0)
+    game = nt.game.NtGame()
+    while game.state.winner == -1:
+        game.non_player_act()
+        game.act(random.choice(game.state.permitted_actions))
+    assert np.count_nonzero(game.state.cards == 0) == 12
+    assert game.state.cards_remaining() == 0
+    scores = [game.score_player(i) for i in range(nt.game.PLAYER_COUNT)]
+    assert game.state.winner == int(np.argmin(scores))
+
+
+def reference_score(state, player_id):
+    held = [card for card, owner in enumerate(state.cards) if owner == player_id + 1]
+    runs = [card for card in held if card - 1 not in held]
+    return sum(runs) - int(state.chips[player_id])
+
+
+def test_scores_count_only_the_first_card_of_each_run():
+    state = nt.game.NtGame().state
+    state.cards[[5, 6, 7, 20, 30]] = 1
+    state.cards[[8, 21]] = 2
+    assert state.score_player(0) == 5 + 20 + 30 - 11
+    assert state.score_player(1) == 8 + 21 - 11
+    assert [state.score_player(i) for i in range(nt.game.PLAYER_COUNT)] == [
+        reference_score(state, i) for i in range(nt.game.PLAYER_COUNT)
+    ]
+
+
+def test_reward_is_normalized_scores():
+    scores = np.array([10, 20, 30, 20, 10])
+    reward = nt.game.normalized_reward(scores)
+    np.testing.assert_allclose(reward, [1, 0, -1, 0, 1])
+    np.testing.assert_array_equal(nt.game.normalized_reward(np.full(5, 7)), 0)
+
+
+def test_compiled_play_out_matches_game_when_forced():
+    # Nobody has chips, so every card is taken and the playout is fixed
+    # but for the order of draws, which doesn't change the scores
+    random.seed(0)
+    np.random.seed(0)
+    game = nt.game.NtGame()
+    game.state.chips = [0] * nt.game.PLAYER_COUNT
+    start = game.state.copy()
+    moves = np.zeros(1, dtype=np.int64)
+    reward = nt.game.NtGame.random_play_out(start, 3, moves)
+    while game.state.winner == -1:
+        game.non_player_act()
+        game.act(nt.game.ACTION_TAKE)
+    assert moves[0] == 3 * 2 * 21
+    np.testing.assert_allclose(reward, nt.game.NtGame.reward_model(game.state))
+
+
+def test_batched_play_outs_give_a_row_per_state():
+    game = nt.game.NtGame()
+    states = [game.state.copy()]
+    game.non_player_act()
+    states.append(game.state.copy())
+    rewards = nt.game.NtGame.random_play_out_batch(states, 4)
+    assert rewards.shape == (2, nt.game.PLAYER_COUNT)
+    assert np.all((rewards >= -1) & (rewards <= 1))
@@ -0,0 +1,27 @@
+import functools
+import c4.bitboard
+from mcts.node import NodeStore
+from mcts.tree import Tree
+from monty import parallel_train
+
+
+def test_parallel_train_merges_workers_trees(tmp_path):
+    filename = str(tmp_path / "tree.nodes")
+    make_tree = functools.partial(
+        Tree,
+        filename,
+        c4.bitboard.BitboardState,
+        c4.bitboard.BitboardGame,
+        c4.bitboard.BitboardGame().state,
+        20,
+    )
+    parallel_train(filename, make_tree, c4.bitboard.BitboardGame, 3, 2, None, 2)
+    first = NodeStore.from_disk(filename, c4.bitboard.BitboardGame)
+    # Every game's first move searched from the root
+    assert first.visits[first.root] > 3 * 20
+    root_visits = int(first.visits[first.root])
+    parallel_train(filename, make_tree, c4.bitboard.BitboardGame, 2, 2, None, 2)
+    second = NodeStore.from_disk(filename, c4.bitboard.BitboardGame)
+    # Carried on from the saved tree, without counting it once per worker
+    assert second.visits[second.root] == root_visits + 2 * 20
+    assert second.count() > first.count()
@@ -0,0 +1,74 @@
+import random
+import time
+import c4.bitboard
+import nt.game
+from mcts.node import NO_NODE
+from mcts.ponder import Ponderer
+from mcts.tree import Tree
+
+
+def make_tree(iterations):
+    game = c4.bitboard.BitboardGame()
+    return Tree(
+        None, c4.bitboard.BitboardState, c4.bitboard.BitboardGame, game.state, iterations
+    )
+
+
+def test_pondered_iterations_come_off_the_budget():
+    tree = make_tree(iterations=3000)
+    ponderer = Ponderer(tree)
+    game = c4.bitboard.BitboardGame()
+    # Load the compiled playouts before the clock starts
+    tree.act(game.state, iterations=10)
+    ponderer.start(game.state)
+    time.sleep(0.2)
+    game.act(3)
+    ponderer.act(game.state)
+    assert ponderer.last_pondered > 0
+    assert 0 < ponderer.last_reused < ponderer.last_pondered
+    assert tree.last_iterations == 3000 - ponderer.last_reused
+    # The reply's node ends up with the same visits as without pondering
+    assert tree.node_store.visits[tree.get_node(game.state)] >= 3000
+
+
+def test_act_without_pondering_uses_whole_budget():
+    tree = make_tree(iterations=50)
+    ponderer = Ponderer(tree)
+    ponderer.act(c4.bitboard.BitboardGame().state)
+    assert ponderer.last_reused == 0
+    assert tree.last_iterations == 50
+
+
+def test_reused_visits_follow_moved_outcomes():
+    random.seed(0)
+    game = nt.game.NtGame()
+    game.non_player_act()
+    tree = Tree(
+        None,
+        nt.game.NtState,
+        nt.game.NtGame,
+        game.state,
+        30,
+        reward_model=nt.game.NtGame.reward_model,
+        sample_chance=True,
+    )
+    tree.act(game.state)
+    game.act(nt.game.ACTION_TAKE)
+    store = tree.node_store
+    chance = tree.get_node(game.state)
+    outcomes = [store.state(child).copy() for child in store.children(chance)]
+    visits = [int(store.visits[child]) for child in store.children(chance)]
+    ponderer = Ponderer(tree)
+    ponderer.start(game.state)
+    ponderer.stop()
+    # Outcomes drawn while pondering move the block to the end of the store
+    first = store.first_child[chance]
+    for outcome in store.state(chance).permitted_actions:
+        if store.first_child[chance] != first:
+            break
+        if store.child(chance, outcome) == NO_NODE:
+            store.add_outcome(chance, outcome)
+    assert store.first_child[chance] != first
+    for state, before in zip(outcomes, visits):
+        after = store.visits[tree.get_node(state)]
+        assert ponderer.reused_visits(state) == after - before
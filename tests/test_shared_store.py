@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+import c4.bitboard
+from mcts.multi_tree import SharedTree
+from mcts.shared_store import SharedNodeStore
+from mcts.tree import Tree
+
+
+def make_store():
+    game = c4.bitboard.BitboardGame()
+    return SharedNodeStore(c4.bitboard.BitboardGame, game.state, capacity=4096)
+
+
+def test_virtual_loss_is_removed_by_back_propogate():
+    store = make_store()
+    try:
+        store.add_children(store.root, list(range(8)), False)
+        child = store.child(store.root, 3)
+        store.state(child)
+        store.add_virtual_loss([store.root, child])
+        assert store.value[child] == -store.virtual_loss
+        store.back_propogate([store.root, child], [-1, 1])
+        assert store.visits[child] == 1
+        assert store.value[child] == 1
+    finally:
+        store.close()
+
+
+def test_shared_tree_search_and_reset():
+    store = make_store()
+    try:
+        game = c4.bitboard.BitboardGame()
+        tree = SharedTree(
+            store, c4.bitboard.BitboardState, c4.bitboard.BitboardGame, game.state, 50
+        )
+        tree.act(game.state)
+        # Virtual loss leaves no trace once every playout has reported
+        assert store.visits[1:9].sum() == 50
+        assert store.child_actions(store.root) == list(range(8))
+        store.reset(game.state)
+        assert store.count() == 1
+    finally:
+        store.close()
+
+
+def test_search_stops_expanding_when_full():
+    game = c4.bitboard.BitboardGame()
+    store = SharedNodeStore(c4.bitboard.BitboardGame, game.state, capacity=20)
+    try:
+        tree = SharedTree(
+            store, c4.bitboard.BitboardState, c4.bitboard.BitboardGame, game.state, 50
+        )
+        tree.act(game.state)
+        assert store.count() <= 20
+    finally:
+        store.close()
+
+
+def searched_tree():
+    game = c4.bitboard.BitboardGame()
+    tree = Tree(
+        None, c4.bitboard.BitboardState, c4.bitboard.BitboardGame, game.state, 50
+    )
+    tree.act(game.state)
+    return tree
+
+
+def test_load_takes_a_saved_tree():
+    tree = searched_tree()
+    store = make_store()
+    try:
+        store.load(tree.node_store)
+        assert store.count() == tree.node_count()
+        assert store.visits[store.root] == tree.node_store.visits[tree.root]
+        snapshot = store.snapshot()
+        assert snapshot.child_actions(snapshot.root) == list(range(8))
+        np.testing.assert_array_equal(
+            snapshot.action[: snapshot.count()],
+            tree.node_store.action[: tree.node_count()],
+        )
+    finally:
+        store.close()
+
+
+def test_load_refuses_a_tree_too_big():
+    tree = searched_tree()
+    store = SharedNodeStore(
+        c4.bitboard.BitboardGame, tree.node_store.state(tree.root), capacity=20
+    )
+    try:
+        with pytest.raises(ValueError):
+            store.load(tree.node_store)
+    finally:
+        store.close()
@@ -0,0 +1,155 @@
+import random
+import pytest
+import c4.bitboard
+import c4.game
+import nt.game
+from mcts.node import (
+    FLAG_EXPANDED,
+    FLAG_PROVEN_LOSS,
+    FLAG_PROVEN_WIN,
+    NO_NODE,
+    NodeStore,
+)
+from mcts.tree import Tree
+
+
+def play(game, actions):
+    for action in actions:
+        game.act(action)
+    return game.state
+
+
+def make_tree(state, game_class=c4.bitboard.BitboardGame, iterations=2000, **kwargs):
+    random.seed(0)
+    return Tree(
+        None,
+        type(state),
+        game_class,
+        state,
+        iterations,
+        solver=True,
+        **kwargs,
+    )
+
+
+def test_solve_follows_the_chooser():
+    store = NodeStore(c4.game.Game, c4.game.Game().state)
+    store.add_children(store.root, [0, 1, 2], False)
+    children = list(store.children(store.root))
+    for child in children:
+        store.state(child)
+    store.flags[children[0]] |= FLAG_PROVEN_LOSS
+    assert not store.solve(store.root)
+    assert store.select_child(store.root, 1.4) == children[1]
+    store.flags[children[1:]] |= FLAG_PROVEN_LOSS
+    # Every reply loses, so the player who moved into the root won
+    assert store.select_child(store.root, 1.4) == NO_NODE
+    assert store.solve(store.root)
+    assert store.flags[store.root] & FLAG_PROVEN_WIN
+
+
+def test_proven_win_is_played_without_more_search():
+    # Three in column 0, and player 0 to move
+    state = play(c4.bitboard.BitboardGame(), [0, 1, 0, 1, 0, 1])
+    tree = make_tree(state)
+    assert tree.act(state) == 0
+    assert tree.last_iterations < tree.iterations
+    assert tree.last_iterations + tree.last_iterations_saved == tree.iterations
+    store = tree.node_store
+    root = tree.get_node(state)
+    assert store.flags[store.child(root, 0)] & FLAG_PROVEN_WIN
+    assert store.flags[root] & FLAG_PROVEN_LOSS
+    # Already solved, so no search at all
+    assert tree.act(state) == 0
+    assert tree.last_iterations == 0
+    assert tree.last_iterations_saved == tree.iterations
+
+
+@pytest.mark.parametrize("game_class", [c4.game.Game, c4.bitboard.BitboardGame])
+def test_blocks_a_forced_loss(game_class):
+    # Player 1 threatens column 0; every other move loses
+    state = play(game_class(), [7, 0, 6, 0, 6, 0])
+    tree = make_tree(state, game_class)
+    assert tree.act(state) == 0
+    root = tree.get_node(state)
+    store = tree.node_store
+    lost = [
+        child for child in store.children(root) if store.flags[child] & FLAG_PROVEN_LOSS
+    ]
+    assert store.child(root, 0) not in lost
+    assert len(lost) == store.child_count[root] - 1
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {},
+        {"unload_after_play": True},
+        {"transposition_size": 256, "symmetry": True},
+        {"early_stop": "visits"},
+    ],
+)
+def test_self_play_stays_legal(kwargs):
+    state = c4.bitboard.BitboardGame().state
+    tree = make_tree(state, iterations=100, **kwargs)
+    game = c4.bitboard.BitboardGame()
+    while game.state.winner == -1:
+        action = tree.act(game.state)
+        assert action in game.state.permitted_actions
+        game.act(action)
+
+
+def test_act_many_drops_solved_positions():
+    game = c4.bitboard.BitboardGame()
+    opening = game.state.copy()
+    winning = play(game, [0, 1, 0, 1, 0, 1])
+    tree = make_tree(opening, iterations=300)
+    actions = tree.act_many([opening, winning])
+    assert actions[1] == 0
+    assert tree.last_iterations < 600
+
+
+def test_act_many_tracks_solved_positions_through_pruning():
+    # The last moves of a random game, some solved quickly and some not
+    random.seed(4)
+    game = c4.bitboard.BitboardGame()
+    line = [game.state.copy()]
+    while game.state.winner == -1:
+        game.act(random.choice(game.state.permitted_actions))
+        line.append(game.state.copy())
+    states = line[-9:-1]
+    tree = make_tree(states[0], iterations=300, max_nodes=400)
+    actions = tree.act_many(states)
+    for state, action in zip(states, actions):
+        assert action in state.permitted_actions
+    store = tree.node_store
+    unsolved = [
+        state for state in states if not store.is_proven(tree.get_node(state))
+    ]
+    # Only solving a position stops its search short
+    assert tree.last_iterations >= 300 * len(unsolved)
+    assert len(unsolved) < len(states)
+
+
+def test_saved_symmetry_isnt_read_as_a_proof(tmp_path):
+    store = NodeStore(c4.bitboard.BitboardGame, c4.bitboard.BitboardGame().state)
+    store.add_children(store.root, list(range(8)), False)
+    # A mirrored node, as stores saved before the solver have it
+    store.flags[store.root] = FLAG_EXPANDED | 1 << 3
+    filename = str(tmp_path / "tree.nodes")
+    store.to_disk(filename)
+    loaded = NodeStore.from_disk(filename, c4.bitboard.BitboardGame)
+    assert loaded.symmetry(loaded.root) == c4.game.MIRROR
+    assert not loaded.is_proven(loaded.root)
+
+
+def test_solver_needs_two_players():
+    with pytest.raises(ValueError):
+        Tree(
+            None,
+            nt.game.NtState,
+            nt.game.NtGame,
+            nt.game.NtGame().state,
+            10,
+            solver=True,
+        )
@@ -0,0 +1,121 @@
+import random
+import pytest
+import c4.bitboard
+import c4.game
+from mcts.tree import Tree
+
+
+def play(game, actions):
+    for action in actions:
+        game.act(action)
+    return game.state
+
+
+def mirrored(actions):
+    return [7 - action for action in actions]
+
+
+def make_tree(game_class=c4.bitboard.BitboardGame, iterations=50, **kwargs):
+    random.seed(0)
+    game = game_class()
+    return Tree(
+        None,
+        type(game.state),
+        game_class,
+        game.state,
+        iterations,
+        transposition_size=256,
+        symmetry=True,
+        **kwargs,
+    )
+
+
+@pytest.mark.parametrize("game_class", [c4.game.Game, c4.bitboard.BitboardGame])
+def test_mirror_images_share_a_canonical_hash(game_class):
+    actions = [0, 3, 3, 6, 1]
+    state = play(game_class(), actions)
+    mirror = play(game_class(), mirrored(actions))
+    assert state.hash() != mirror.hash()
+    assert state.canonical()[0] == mirror.canonical()[0]
+    assert state.canonical()[1] != mirror.canonical()[1]
+    # Symmetric positions are their own canonical form
+    symmetric = play(game_class(), [3, 3, 4, 4])
+    assert symmetric.canonical() == (symmetric.hash(), 0)
+
+
+def test_engines_agree_on_canonical_hash():
+    actions = [6, 1, 1]
+    assert (
+        play(c4.game.Game(), actions).canonical()
+        == play(c4.bitboard.BitboardGame(), actions).canonical()
+    )
+
+
+def test_mirrored_openings_share_children():
+    tree = make_tree()
+    store = tree.node_store
+    left = tree.get_node(play(c4.bitboard.BitboardGame(), [0]))
+    tree.expansion(left)
+    right = tree.get_node(play(c4.bitboard.BitboardGame(), [7]))
+    tree.expansion(right)
+    assert left != right
+    assert store.first_child[left] == store.first_child[right]
+    assert store.symmetry(left) != store.symmetry(right)
+    # The reply in column 1 after 0 is the one in column 6 after 7
+    node, symmetry = tree.locate(play(c4.bitboard.BitboardGame(), [7, 6]))
+    assert node == tree.get_node(play(c4.bitboard.BitboardGame(), [0, 1]))
+    assert symmetry
+
+
+def test_best_action_is_mirrored_back():
+    tree = make_tree(iterations=400)
+    tree.act(tree.node_store.state(tree.root))
+    left = tree.get_node(play(c4.bitboard.BitboardGame(), [1]))
+    right = tree.get_node(play(c4.bitboard.BitboardGame(), [6]))
+    tree.expansion(left)
+    tree.expansion(right)
+    assert tree._best_action(right) == 7 - tree._best_action(left)
+
+
+@pytest.mark.parametrize("game_class", [c4.game.Game, c4.bitboard.BitboardGame])
+@pytest.mark.parametrize("unload", [False, True])
+def test_self_play_stays_legal(game_class, unload):
+    tree = make_tree(game_class, iterations=60, unload_after_play=unload)
+    game = game_class()
+    while game.state.winner == -1:
+        action = tree.act(game.state)
+        assert action in game.state.permitted_actions
+        game.act(action)
+
+
+def test_merge_maps_through_symmetry():
+    trees = []
+    for opening in ([2], [5]):
+        tree = make_tree(iterations=200)
+        tree.act(play(c4.bitboard.BitboardGame(), opening))
+        trees.append(tree)
+    merged = trees[0].node_store.subtree(trees[0].root)
+    merged.merge(trees[1].node_store)
+    assert merged.visits[merged.root] == sum(
+        tree.node_store.visits[tree.root] for tree in trees
+    )
+    # Every node's children are the moves its position permits
+    for index in range(merged.count()):
+        if merged.child_count[index]:
+            state = merged.state(index)
+            actions = merged.child_actions(index)
+            if merged.symmetry(index):
+                actions = [7 - action for action in actions]
+            assert sorted(actions) == sorted(state.permitted_actions)
+
+
+def test_symmetry_needs_transpositions():
+    with pytest.raises(ValueError):
+        Tree(
+            None,
+            c4.bitboard.BitboardState,
+            c4.bitboard.BitboardGame,
+            c4.bitboard.BitboardGame().state,
+            10,
+            symmetry=True,
+        )
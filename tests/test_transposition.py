@@ -0,0 +1,87 @@
+import random
+import numpy as np
+import c4.bitboard
+import c4.game
+import nt.game
+from mcts.node import NO_NODE
+from mcts.transposition import TranspositionTable
+from mcts.tree import Tree
+
+
+def play(game, actions):
+    for action in actions:
+        game.act(action)
+    return game.state
+
+
+def test_move_order_doesnt_change_hash():
+    for game_class in (c4.game.Game, c4.bitboard.BitboardGame):
+        first = play(game_class(), [0, 1, 2])
+        second = play(game_class(), [2, 1, 0])
+        other = play(game_class(), [1, 0, 2])
+        assert first.hash() == second.hash()
+        assert first.hash() != other.hash()
+
+
+def test_engines_hash_alike():
+    assert (
+        play(c4.game.Game(), [3, 3, 4, 5]).hash()
+        == play(c4.bitboard.BitboardGame(), [3, 3, 4, 5]).hash()
+    )
+
+
+def test_nt_hash_is_kept_up_incrementally():
+    random.seed(0)
+    np.random.seed(0)
+    game = nt.game.NtGame()
+    while game.state.winner == -1:
+        game.non_player_act()
+        game.act(random.choice(game.state.permitted_actions))
+        assert game.state.hash() == game.state.full_zobrist()
+
+
+def test_full_bucket_replaces_least_visited():
+    table = TranspositionTable(2)
+    visits = np.array([5, 1, 3])
+    table.store(1, 0, visits)
+    table.store(3, 1, visits)
+    table.store(5, 2, visits)
+    assert table.lookup(1) == 0
+    assert table.lookup(3) == NO_NODE
+    assert table.lookup(5) == 2
+
+
+def make_tree():
+    game = c4.bitboard.BitboardGame()
+    return Tree(
+        None,
+        c4.bitboard.BitboardState,
+        c4.bitboard.BitboardGame,
+        game.state,
+        50,
+        transposition_size=64,
+    )
+
+
+def test_transpositions_share_children():
+    tree = make_tree()
+    first = tree.get_node(play(c4.bitboard.BitboardGame(), [0, 1, 2]))
+    tree.expansion(first)
+    second = tree.get_node(play(c4.bitboard.BitboardGame(), [2, 1, 0]))
+    tree.expansion(second)
+    store = tree.node_store
+    assert first != second
+    assert store.first_child[first] == store.first_child[second]
+
+
+def test_subtree_copies_shared_children_once():
+    tree = make_tree()
+    tree.act(tree.node_store.state(tree.root))
+    for actions in ([0, 1, 2], [2, 1, 0]):
+        tree.expansion(tree.get_node(play(c4.bitboard.BitboardGame(), actions)))
+    store = tree.node_store
+    subtree = store.subtree(store.root)
+    assert subtree.count() == store.count()
+    # Every child's parent lists it among its children
+    for index in range(1, subtree.count()):
+        assert index in subtree.children(subtree.parent[index])
@@ -0,0 +1,149 @@
+import time
+import numpy as np
+import pytest
+import c4.bitboard
+from mcts.tree import Tree
+
+
+def make_tree(iterations=100, move_time=None):
+    game = c4.bitboard.BitboardGame()
+    return Tree(
+        None,
+        c4.bitboard.BitboardState,
+        c4.bitboard.BitboardGame,
+        game.state,
+        iterations,
+        move_time=move_time,
+    )
+
+
+def test_iteration_budget():
+    tree = make_tree(iterations=37)
+    tree.act(tree.node_store.state(tree.root))
+    assert tree.last_iterations == 37
+
+
+def test_move_time_budget_stops_first():
+    tree = make_tree(iterations=None, move_time=0.05)
+    state = tree.node_store.state(tree.root)
+    tree.act(state)
+    started = time.perf_counter()
+    tree.act(state)
+    assert time.perf_counter() - started < 0.5
+    assert tree.last_iterations > 0
+
+
+def test_per_call_budget_overrides_tree():
+    tree = make_tree(iterations=1000)
+    tree.act(tree.node_store.state(tree.root), iterations=5)
+    assert tree.last_iterations == 5
+
+
+def test_needs_a_budget():
+    with pytest.raises(ValueError):
+        make_tree(iterations=None)
+
+
+@pytest.mark.parametrize("rule", ["visits", "confidence"])
+def test_early_stop_accounts_for_whole_budget(rule):
+    game = c4.bitboard.BitboardGame()
+    tree = Tree(
+        None,
+        c4.bitboard.BitboardState,
+        c4.bitboard.BitboardGame,
+        game.state,
+        3000,
+        early_stop=rule,
+    )
+    action = tree.act(game.state)
+    assert tree.last_iterations + tree.last_iterations_saved == 3000
+    assert action == game.state.permitted_actions[tree.settled_child(tree.root)]
+
+
+def test_visits_rule_keeps_most_visited_child():
+    game = c4.bitboard.BitboardGame()
+    tree = Tree(
+        None,
+        c4.bitboard.BitboardState,
+        c4.bitboard.BitboardGame,
+        game.state,
+        3000,
+        early_stop="visits",
+    )
+    tree.act(game.state)
+    leader = tree.settled_child(tree.root)
+    tree.act(game.state, iterations=tree.last_iterations_saved)
+    assert tree.settled_child(tree.root) == leader
+
+
+def test_max_nodes_bounds_tree():
+    game = c4.bitboard.BitboardGame()
+    tree = Tree(
+        None,
+        c4.bitboard.BitboardState,
+        c4.bitboard.BitboardGame,
+        game.state,
+        500,
+        max_nodes=1000,
+    )
+    for _ in range(4):
+        game.act(tree.act(game.state))
+    limit = 1000 + c4.bitboard.BitboardGame.max_action_count()
+    assert tree.node_count() <= limit
+    assert 1000 < tree.node_count(peak=True) <= limit
+    # The game line survives pruning
+    assert tree.get_node(game.state) != tree.root
+
+
+def test_act_many_searches_each_position_once():
+    tree = make_tree(iterations=40)
+    games = [c4.bitboard.BitboardGame() for _ in range(3)]
+    games[1].act(3)
+    games[2].act(3)
+    actions = tree.act_many([game.state for game in games])
+    assert len(actions) == 3
+    assert all(action in range(8) for action in actions)
+    # The repeated position is searched once, and gets the same answer
+    assert actions[1] == actions[2]
+    assert tree.last_iterations == 2 * 40
+    store = tree.node_store
+    assert store.visits[tree.root] == 1 + 40
+    assert store.visits[tree.get_node(games[1].state)] >= 40
+
+
+def test_back_propogate_many_matches_one_at_a_time():
+    tree = make_tree(iterations=50)
+    tree.act(tree.node_store.state(tree.root))
+    batched = tree.node_store
+    single = batched.snapshot()
+    paths = [tree.selection(tree.root) for _ in range(3)]
+    rewards = [[1, -1], [-1, 1], [0, 0]]
+    batched.back_propogate_many(paths, rewards)
+    for path, reward in zip(paths, rewards):
+        single.back_propogate(path, reward)
+    size = batched.size
+    np.testing.assert_array_equal(batched.visits[:size], single.visits[:size])
+    np.testing.assert_array_equal(batched.value[:size], single.value[:size])
+
+
+def test_custom_reward_model_is_used_over_compiled_playouts():
+    calls = []
+
+    def reward_model(state):
+        calls.append(state.winner)
+        return Tree.RewardModels.reward_model_binary(state)
+
+    game = c4.bitboard.BitboardGame()
+    tree = Tree(
+        None,
+        c4.bitboard.BitboardState,
+        c4.bitboard.BitboardGame,
+        game.state,
+        50,
+        reward_model=reward_model,
+    )
+    assert tree.compiled_play_out is None
+    tree.act(game.state)
+    assert len(calls) == 50
+    # The game's own model is what the compiled playouts score with
+    assert make_tree().compiled_play_out is not None